@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2017, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+
+# }}}
+
+
+import csv
+import json
+from datetime import datetime
+from timeit import default_timer
+
+from helpers import format_ts
+
+
+class BalanceProfiler(object):
+    """
+    A BalanceProfiler times the phases of Market.balance() and the calls into
+    each class of model, and keeps a trace of the balance iterations (duality
+    gap, costs, and marginal price change). It is enabled by assigning one to
+    Market.profiler. Its timers use a monotonic, high-resolution clock and no
+    logging, so that its overhead is small compared to the phases it times.
+
+    After each balance, the measurements may be appended to a file, either as
+    one JSON object per line or as CSV rows.
+    """
+
+    def __init__(self, path=None, file_format='json'):
+        # PATH - file that measurements are appended to after each balance.
+        #        Measurements are kept only in memory if None.
+        self.path = path
+
+        # FORMAT - 'json' for one JSON object per balance and line, or 'csv'
+        #          for one row per phase, model operation, and iteration. The
+        #          CSV columns are market, balance start, kind, name,
+        #          iteration, seconds, calls, duality gap, production cost,
+        #          dual cost, marginal price change, and converged.
+        self.format = file_format
+
+        self.balanceStart = None  # datetime when the balance started
+        self.phaseTimes = {}  # {phase: [s]}
+        self.phaseCalls = {}  # {phase: number of calls}
+        self.modelTimes = {}  # {model class.operation: [s]}
+        self.modelCalls = {}  # {model class.operation: number of calls}
+        self.trace = []  # [(iteration, elapsed [s], duality gap, production cost [$], dual cost [$],
+                         #   marginal price change [$/kWh], converged)]
+        self.startTime = None  # clock time when the balance started [s]
+        self.totalTime = 0.0  # [s]
+
+    def start(self):
+        # Start measuring a new balance. Measurements of any prior balance
+        # are discarded.
+        self.balanceStart = datetime.utcnow()
+        self.phaseTimes = {}
+        self.phaseCalls = {}
+        self.modelTimes = {}
+        self.modelCalls = {}
+        self.trace = []
+        self.totalTime = 0.0
+        self.startTime = default_timer()
+
+    @staticmethod
+    def tic():
+        # Read the clock at the start of a timed call.
+        return default_timer()
+
+    def toc(self, phase, t0):
+        # Add the time since t0 to a balance phase.
+        self.phaseTimes[phase] = self.phaseTimes.get(phase, 0.0) + default_timer() - t0
+        self.phaseCalls[phase] = self.phaseCalls.get(phase, 0) + 1
+
+    def toc_model(self, model, operation, t0):
+        # Add the time since t0 to an operation of a model's class.
+        key = type(model).__name__ + '.' + operation
+        self.modelTimes[key] = self.modelTimes.get(key, 0.0) + default_timer() - t0
+        self.modelCalls[key] = self.modelCalls.get(key, 0) + 1
+
+    def record_iteration(self, iteration, duality_gap, production_cost, dual_cost, price_change, converged):
+        # Trace a balance iteration.
+        self.trace.append((iteration, default_timer() - self.startTime, duality_gap, production_cost, dual_cost,
+                           price_change, converged))
+
+    def stop(self, market_name=''):
+        # Finish measuring a balance and export the measurements, if a file is
+        # given.
+        self.totalTime = default_timer() - self.startTime
+
+        if self.path is not None:
+            self.export(market_name)
+
+    def summary(self, market_name=''):
+        # Summarize the measurements of the last balance.
+        return {'market': market_name,
+                'start': format_ts(self.balanceStart),
+                'seconds': self.totalTime,
+                'phases': dict([(x, [self.phaseTimes[x], self.phaseCalls[x]]) for x in self.phaseTimes]),
+                'models': dict([(x, [self.modelTimes[x], self.modelCalls[x]]) for x in self.modelTimes]),
+                'trace': [list(x) for x in self.trace]}
+
+    def export(self, market_name=''):
+        # Append the measurements of the last balance to the file.
+        if self.format == 'csv':
+            start = format_ts(self.balanceStart)
+            rows = [[market_name, start, 'balance', '', '', self.totalTime, 1]]
+            rows.extend([[market_name, start, 'phase', x, '', self.phaseTimes[x], self.phaseCalls[x]]
+                         for x in sorted(self.phaseTimes)])
+            rows.extend([[market_name, start, 'model', x, '', self.modelTimes[x], self.modelCalls[x]]
+                         for x in sorted(self.modelTimes)])
+            rows.extend([[market_name, start, 'iteration', '', x[0], x[1], ''] + list(x[2:]) for x in self.trace])
+
+            with open(self.path, 'a') as f:
+                csv.writer(f).writerows(rows)
+
+        else:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(self.summary(market_name), default=str) + '\n')
@@ -77,6 +77,8 @@ from measurement_type import MeasurementType
 from measurement_unit import MeasurementUnit
 from meter_point import MeterPoint
 from market import Market
+from balance_profiler import BalanceProfiler
+from rebalance_scheduler import RebalanceScheduler
 from market_state import MarketState
 from neighbor import Neighbor
 from local_asset import LocalAsset
@@ -132,6 +134,21 @@ class BuildingAgent(MarketAgent, myTransactiveNode):
 
         self.market_cycle_in_min = int(self.config.get('market_cycle_in_min', 60))
         self.duality_gap_threshold = float(self.config.get('duality_gap_threshold', 0.01))
+        self.market_method = int(self.config.get('market_method', 2))  # {1: subgradient, 2: interpolation, 3: bisection, 4: decomposed}
+        self.retention_window = float(self.config.get('retention_window', 0))  # [h]
+        self.balance_profile = self.config.get('balance_profile')  # file that balance profiles are appended to
+        self.balance_profile_format = self.config.get('balance_profile_format', 'json')  # 'json' or 'csv'
+        self.horizon_schedule = self.config.get('horizon_schedule', [])  # [[span h, interval duration h]]
+        self.signal_snapshot_interval = int(self.config.get('signal_snapshot_interval', 10))  # full signal every n signals
+        self.rebalance_debounce = float(self.config.get('rebalance_debounce', 2))  # [s] coalesces signal bursts
+        self.rebalance_min_interval = float(self.config.get('rebalance_min_interval', 10))  # [s] between rebalances
+        self.blocking_publish = self.config.get('blocking_publish', False)  # wait for database publishes
+        # Hysteresis and damping of the signals exchanged with neighbors
+        self.convergence_hysteresis = float(self.config.get('convergence_hysteresis', 0))  # [0.01 = 1%]
+        self.power_deadband = float(self.config.get('power_deadband', 0))  # [avg.kW]
+        self.price_deadband = float(self.config.get('price_deadband', 0))  # [$/kWh]
+        self.min_send_interval = float(self.config.get('min_send_interval', 0))  # [s] between unforced signals
+        self.price_smoothing = float(self.config.get('price_smoothing', 0))  # weight of previous received prices
 
         self.neighbors = []
         self.max_deliver_capacity = float(self.config.get('max_deliver_capacity'))
@@ -140,6 +157,13 @@ class BuildingAgent(MarketAgent, myTransactiveNode):
 
         self.building_demand_topic = "{}/{}/campus/demand".format(self.db_topic, self.name)
         self.campus_supply_topic = "{}/campus/{}/supply".format(self.db_topic, self.name)
+        self.campus_supply_batch_topic = "{}/campus/supply".format(self.db_topic)
+        self.campus_register_topic = "{}/campus/register".format(self.db_topic)
+
+        # The campus may not have received this building's announcement, e.g.,
+        # if it started later. The building announces itself again with its
+        # demand signals until the campus has sent it a supply signal.
+        self.campus_registered = False
 
         self.mix_market_running = False
         verbose_logging = self.config.get('verbose_logging', True)
@@ -151,6 +175,13 @@ class BuildingAgent(MarketAgent, myTransactiveNode):
 
         self.reschedule_interval = timedelta(minutes=10, seconds=1)
 
+        # Materially different transactive signals trigger rebalances. The
+        # reschedule interval above remains a safety net.
+        self.rebalancer = RebalanceScheduler(self.rebalance, self.schedule,
+                                             timedelta(seconds=self.rebalance_debounce),
+                                             timedelta(seconds=self.rebalance_min_interval),
+                                             Timer.get_schedule_time)
+
         self.simulation = self.config.get('simulation', False)
         try:
             self.simulation_start_time = parser.parse(self.config.get('simulation_start_time'))
@@ -193,6 +224,36 @@ class BuildingAgent(MarketAgent, myTransactiveNode):
         self.vip.pubsub.subscribe(peer='pubsub',
                                   prefix=self.campus_supply_topic,
                                   callback=self.new_supply_signal)
+        self.vip.pubsub.subscribe(peer='pubsub',
+                                  prefix=self.campus_supply_batch_topic,
+                                  callback=self.new_supply_batch)
+
+        self.announce()
+
+    def announce(self):
+        # Announce this building to the campus, which registers it unless it is
+        # already registered or configured there. Loads are negative powers
+        # [avg.kW].
+        self.vip.pubsub.publish(peer='pubsub',
+                                topic=self.campus_register_topic,
+                                message={'name': self.name,
+                                         'powers': [0.0, -self.max_deliver_capacity]})
+
+    def new_supply_batch(self, peer, sender, bus, topic, headers, message):
+        # The campus may publish the signals of all its buildings in one
+        # message, keyed by building name. Only this building's is received.
+        signal = message['signals'].get(self.name)
+
+        if signal is not None:
+            self.new_supply_signal(peer, sender, bus, topic, headers, signal)
+
+    def publish_record(self, topic, headers, message):
+        # Publish a record for the database. The publish is waited upon only
+        # if configured to be blocking.
+        result = self.vip.pubsub.publish("pubsub", topic, headers, message)
+
+        if self.blocking_publish:
+            result.get()
 
     def new_supply_signal(self, peer, sender, bus, topic, headers, message):
         _log.debug("At {}, {} receives new supply records: {}".format(Timer.get_cur_time(),
@@ -200,7 +261,10 @@ class BuildingAgent(MarketAgent, myTransactiveNode):
         supply_curves = message['curves']
         start_of_cycle = message['start_of_cycle']
 
-        self.campus.model.receive_transactive_signal(self, supply_curves)
+        # The campus has registered this building.
+        self.campus_registered = True
+
+        changed = self.campus.model.receive_transactive_signal(self, supply_curves)
         _log.debug("At {}, mixmarket state is {}, start_of_cycle {}".format(Timer.get_cur_time(),
                                                                             self.mix_market_running,
                                                                             start_of_cycle))
@@ -208,7 +272,7 @@ class BuildingAgent(MarketAgent, myTransactiveNode):
         db_topic = "/".join([self.db_topic, self.name, "CampusSupply"])
         message = supply_curves
         headers = {headers_mod.DATE: format_timestamp(Timer.get_cur_time())}
-        self.vip.pubsub.publish("pubsub", db_topic, headers, message).get()
+        self.publish_record(db_topic, headers, message)
 
         if start_of_cycle:
             _log.debug("At {}, start of cycle. "
@@ -220,6 +284,15 @@ class BuildingAgent(MarketAgent, myTransactiveNode):
             # else:
             self.start_mixmarket(start_of_cycle)
 
+        elif changed:
+            # The campus revised its supply within the cycle.
+            self.rebalancer.request()
+
+    def rebalance(self, requests):
+        # Balance once for a burst of coalesced rebalance requests (see
+        # RebalanceScheduler).
+        self.balance_market(1)
+
     def near_end_of_hour(self, now):
         near_end_of_hour = False
         if (now + self.mix_market_duration).hour != now.hour:
@@ -307,10 +380,16 @@ class BuildingAgent(MarketAgent, myTransactiveNode):
 
             # Check to see if it is ok to send signals
             self.campus.model.check_for_convergence(market)
-            if not self.campus.model.converged:
+            if self.campus.model.send_due():
                 _log.debug("Campus model not converged. Sending signal back to campus.")
+                if not self.campus_registered:
+                    self.announce()
                 self.campus.model.prep_transactive_signal(market, self)
                 self.campus.model.send_transactive_signal(self, self.building_demand_topic)
+            elif not self.campus.model.converged:
+                # The deferred signal is sent by a later rebalance.
+                _log.debug("Campus model not converged. Signal deferred due to min_send_interval.")
+                self.rebalancer.request()
 
     def offer_callback(self, timestamp, market_name, buyer_seller):
         if market_name in self.market_names:
@@ -393,11 +472,16 @@ class BuildingAgent(MarketAgent, myTransactiveNode):
         market.converged = False
         market.defaultPrice = 0.0428  # [$/kWh]
         market.dualityGapThreshold = self.duality_gap_threshold  # [0.02 = 2#]
+        market.method = self.market_method
+        market.retentionWindow = timedelta(hours=self.retention_window)
+        if self.balance_profile is not None:
+            market.profiler = BalanceProfiler(self.balance_profile, self.balance_profile_format)
         market.initialMarketState = MarketState.Inactive
         market.marketOrder = 1  # This is first and only market
         market.intervalsToClear = 1  # Only one interval at a time
         market.futureHorizon = timedelta(hours=24)  # Projects 24 hourly future intervals
         market.intervalDuration = timedelta(hours=1)  # [h] Intervals are 1 h long
+        market.horizonSchedule = [(timedelta(hours=x[0]), timedelta(hours=x[1])) for x in self.horizon_schedule]
         market.marketClearingInterval = timedelta(hours=1)  # [h]
         market.marketClearingTime = Timer.get_cur_time().replace(hour=0,
                                                                  minute=0,
@@ -420,7 +504,10 @@ class BuildingAgent(MarketAgent, myTransactiveNode):
         campus_model.defaultVertices = [Vertex(0.045, 25, 0, True), Vertex(0.048, 0, self.max_deliver_capacity, True)]
         campus_model.demand_threshold_coef = self.demand_threshold_coef
         campus_model.demandThreshold = self.demand_threshold_coef * self.monthly_peak_power
+        campus_model.intervalCoupled = True  # demand charges depend on prior scheduled powers
         campus_model.transactive = True
+        campus_model.snapshotInterval = self.signal_snapshot_interval
+        self.damp_signals(campus_model)
 
         # Cross-reference object & model
         campus_model.object = campus
@@ -521,7 +608,7 @@ class BuildingAgent(MarketAgent, myTransactiveNode):
             db_topic = "/".join([self.db_topic, self.name, "AggregateDemand"])
             message = {"Timestamp": format_timestamp(timestamp), "Curves": self.building_demand_curves}
             headers = {headers_mod.DATE: format_timestamp(Timer.get_cur_time())}
-            self.vip.pubsub.publish("pubsub", db_topic, headers, message).get()
+            self.publish_record(db_topic, headers, message)
 
             db_topic = "/".join([self.db_topic, self.name, "Price"])
             price_message = []
@@ -532,7 +619,7 @@ class BuildingAgent(MarketAgent, myTransactiveNode):
                 price_message.append({'timeInterval': ts, 'price': price, 'quantity': quantity})
             message = {"Timestamp": format_timestamp(timestamp), "Price": price_message}
             headers = {headers_mod.DATE: format_timestamp(Timer.get_cur_time())}
-            self.vip.pubsub.publish("pubsub", db_topic, headers, message).get()
+            self.publish_record(db_topic, headers, message)
 
             self.elastive_load_model.set_tcc_curves(self.quantities,
                                                     self.prices,
@@ -86,6 +86,7 @@ class BulkSupplier_dc(NeighborModel):
     def __init__(self):
         super(BulkSupplier_dc, self).__init__()
         self.transactive = False
+        self.intervalCoupled = True  # demand charges depend on prior scheduled powers
         
     def update_dc_threshold(self, mkt):
         # UPDATE_DC_THRESHOLD() - keep track of the month's demand-charge threshold
@@ -112,7 +113,7 @@ class BulkSupplier_dc(NeighborModel):
         
             # Gather the active time intervals ti and find the current (soonest) one.
             ti = mkt.timeIntervals
-            ti.sort(key=lambda x: x.startTime)
+            ti = sorted(ti, key=lambda x: x.startTime)
         
             # Find current demand d that corresponds to the nearest time interval.
             d = find_obj_by_ti(self.scheduledPowers, ti[0])  # [avg.kW]
@@ -156,6 +157,10 @@ class BulkSupplier_dc(NeighborModel):
         
         # Gather active time intervals
         time_intervals = mkt.timeIntervals  # TimeInterval objects
+
+        # Discard active vertices that are not in active time intervals.
+        time_interval_values = set([t.startTime for t in time_intervals])
+        self.activeVertices = [x for x in self.activeVertices if x.timeInterval.startTime in time_interval_values]
         
         # Get the maximum power maxp for this neighbor.
         maximum_power = self.object.maximumPower  # [avg.kW]
@@ -196,7 +201,9 @@ class BulkSupplier_dc(NeighborModel):
         for i in range(len(time_intervals)):
             # Find and delete active vertices in the indexed time interval.
             # These vertices shall be recreated.
-            self.activeVertices = [x for x in self.activeVertices if x != time_intervals[i]]
+            self.activeVertices = [x for x in self.activeVertices
+                                   if x.timeInterval.startTime != time_intervals[i].startTime]
+            invalidate_vertices(self, time_intervals[i])
             
             # Find the month number for the indexed time interval start time.
             # The month is needed for rate lookup tables.
@@ -68,6 +68,8 @@ from measurement_type import MeasurementType
 from measurement_unit import MeasurementUnit
 from meter_point import MeterPoint
 from market import Market
+from balance_profiler import BalanceProfiler
+from rebalance_scheduler import RebalanceScheduler
 from market_state import MarketState
 from neighbor import Neighbor
 from local_asset import LocalAsset
@@ -95,19 +97,44 @@ class CampusAgent(Agent, myTransactiveNode):
         self.name = self.config.get('name')
         self.market_cycle_in_min = int(self.config.get('market_cycle_in_min', 60))
         self.duality_gap_threshold = float(self.config.get('duality_gap_threshold', 0.01))
+        self.market_method = int(self.config.get('market_method', 2))  # {1: subgradient, 2: interpolation, 3: bisection, 4: decomposed}
+        self.retention_window = float(self.config.get('retention_window', 0))  # [h]
+        self.balance_profile = self.config.get('balance_profile')  # file that balance profiles are appended to
+        self.balance_profile_format = self.config.get('balance_profile_format', 'json')  # 'json' or 'csv'
+        self.horizon_schedule = self.config.get('horizon_schedule', [])  # [[span h, interval duration h]]
+        self.signal_snapshot_interval = int(self.config.get('signal_snapshot_interval', 10))  # full signal every n signals
+        self.rebalance_debounce = float(self.config.get('rebalance_debounce', 2))  # [s] coalesces signal bursts
+        self.rebalance_min_interval = float(self.config.get('rebalance_min_interval', 10))  # [s] between rebalances
+        self.batch_supply_signals = self.config.get('batch_supply_signals', False)  # one message to all buildings
+        # Hysteresis and damping of the signals exchanged with neighbors
+        self.convergence_hysteresis = float(self.config.get('convergence_hysteresis', 0))  # [0.01 = 1%]
+        self.power_deadband = float(self.config.get('power_deadband', 0))  # [avg.kW]
+        self.price_deadband = float(self.config.get('price_deadband', 0))  # [$/kWh]
+        self.min_send_interval = float(self.config.get('min_send_interval', 0))  # [s] between unforced signals
+        self.price_smoothing = float(self.config.get('price_smoothing', 0))  # weight of previous received prices
         self.building_names = self.config.get('buildings', [])
         self.building_powers = self.config.get('building_powers')
         self.db_topic = self.config.get("db_topic", "tnc")
 
         self.neighbors = []
+        self.buildings = {}  # {name: Neighbor} of the registered buildings
 
         self.city_supply_topic = "{}/city/campus/supply".format(self.db_topic)
         self.building_demand_topic = "/".join([self.db_topic, "{}/campus/demand"])
         self.campus_demand_topic = "{}/campus/city/demand".format(self.db_topic)
         self.campus_supply_topic = "/".join([self.db_topic, "campus/{}/supply"])
+        self.campus_supply_batch_topic = "{}/campus/supply".format(self.db_topic)
+        self.campus_register_topic = "{}/campus/register".format(self.db_topic)
 
         self.reschedule_interval = timedelta(minutes=10, seconds=1)
 
+        # Materially different transactive signals trigger rebalances. The
+        # reschedule interval above remains a safety net.
+        self.rebalancer = RebalanceScheduler(self.rebalance, self.schedule,
+                                             timedelta(seconds=self.rebalance_debounce),
+                                             timedelta(seconds=self.rebalance_min_interval),
+                                             Timer.get_schedule_time)
+
         self.simulation = self.config.get('simulation', False)
         self.simulation_start_time = parser.parse(self.config.get('simulation_start_time'))
         self.simulation_one_hour_in_seconds = int(self.config.get('simulation_one_hour_in_seconds'))
@@ -132,6 +159,52 @@ class CampusAgent(Agent, myTransactiveNode):
                                       prefix=self.building_demand_topic.format(bldg),
                                       callback=self.new_demand_signal)
 
+        # Buildings that are not configured register when they start.
+        self.vip.pubsub.subscribe(peer='pubsub',
+                                  prefix=self.campus_register_topic,
+                                  callback=self.new_building)
+
+    def new_building(self, peer, sender, bus, topic, headers, message):
+        # Register a building that announced itself. Its configured powers,
+        # if any, take precedence over the announced ones.
+        name = message['name']
+
+        if name in self.buildings:
+            _log.debug("{} is already registered.".format(name))
+            return
+
+        configured_powers = self.building_powers or {}
+        powers = configured_powers.get(name, message.get('powers'))
+        if powers is None:
+            _log.error("{} announced no powers and is not configured. It is not registered.".format(name))
+            return
+
+        bldg = self.register_building(name, powers)
+        self.vip.pubsub.subscribe(peer='pubsub',
+                                  prefix=self.building_demand_topic.format(name),
+                                  callback=self.new_demand_signal)
+        _log.info("{} registered building {}.".format(self.name, name))
+
+        # Balance with the new building, and send it a signal.
+        self.rebalancer.request(neighbor=bldg)
+
+    def register_building(self, name, powers=None):
+        # Create the neighbor of a building, and add it to the neighbors.
+        # INPUTS:
+        # name - building name, as in the building's configuration
+        # powers - [maximum power, minimum power] of the building neighbor
+        #          [avg.kW]. The configured building_powers are used if None.
+        # OUTPUTS:
+        # bldg - Neighbor object of the building
+        bldg = self.buildings.get(name)
+
+        if bldg is None:
+            bldg = self.make_bldg_neighbor(name, powers)
+            self.buildings[name] = bldg
+            self.neighbors.append(bldg)
+
+        return bldg
+
     def new_demand_signal(self, peer, sender, bus, topic, headers, message):
         _log.debug("At {}, {} receives new demand records: {}".format(Timer.get_cur_time(),
                                                                      self.name, message))
@@ -140,14 +213,17 @@ class CampusAgent(Agent, myTransactiveNode):
         start_of_cycle = message['start_of_cycle']
         fail_to_converged = message['fail_to_converged']
 
-        neighbors = [n for n in self.neighbors if n.name == building_name]
-        if len(neighbors) == 1:
-            neighbor = neighbors[0]
-            neighbor.model.receive_transactive_signal(self, demand_curves)
-            self.balance_market(1, start_of_cycle, fail_to_converged, neighbor)
+        neighbor = self.buildings.get(building_name)
+        if neighbor is not None:
+            changed = neighbor.model.receive_transactive_signal(self, demand_curves)
+            if changed or start_of_cycle or fail_to_converged:
+                self.rebalancer.request(start_of_cycle=start_of_cycle, fail_to_converged=fail_to_converged,
+                                        neighbor=neighbor)
+            else:
+                _log.debug("{} signal did not change materially. No rebalance.".format(building_name))
         else:
-            _log.error("{}: There are {} building(s) with name {}."
-                       .format(self.name, len(neighbors), building_name))
+            _log.error("{}: There is no registered building with name {}."
+                       .format(self.name, building_name))
             _log.error("Neighbors are: {}".format([x.name for x in self.neighbors]))
             _log.error("Message is: {}".format(message))
             _log.error("Check value of 'name' key in the config file for building {}.".format(building_name))
@@ -160,12 +236,20 @@ class CampusAgent(Agent, myTransactiveNode):
         start_of_cycle = message['start_of_cycle']
         fail_to_converged = message['fail_to_converged']
 
-        self.city.model.receive_transactive_signal(self, supply_curves)
+        changed = self.city.model.receive_transactive_signal(self, supply_curves)
+
+        if start_of_cycle or changed:
+            self.rebalancer.request(start_of_cycle=start_of_cycle, fail_to_converged=fail_to_converged)
 
-        if start_of_cycle:
-            self.balance_market(1, start_of_cycle, fail_to_converged)
+    def rebalance(self, requests):
+        # Balance once for a burst of coalesced rebalance requests (see
+        # RebalanceScheduler), replying to every building that sent a signal.
+        start_of_cycle = any([x.get('start_of_cycle', False) for x in requests])
+        fail_to_converged = any([x.get('fail_to_converged', False) for x in requests])
+        neighbors = [x['neighbor'] for x in requests if x.get('neighbor') is not None]
+        self.balance_market(1, start_of_cycle, fail_to_converged, neighbors)
 
-    def balance_market(self, run_cnt, start_of_cycle=False, fail_to_converged=False, fail_to_converged_neighbor=None):
+    def balance_market(self, run_cnt, start_of_cycle=False, fail_to_converged=False, fail_to_converged_neighbors=()):
         market = self.markets[0]  # Assume only 1 TNS market per node
         market.signal_new_data = True
         market.balance(self)  # Assume only 1 TNS market per node
@@ -179,14 +263,15 @@ class CampusAgent(Agent, myTransactiveNode):
             # Send only if either of the 2 conditions below occurs:
             # 1) Model balancing did not converge
             # 2) A new cycle (ie. begin of hour)
+            # In batch mode, the buildings' signals are collected in
+            # supply_batch and published together after the loop.
+            supply_batch = {}
+            deferred = False
             for n in self.neighbors:
                 # If the neighbor failed to converge (eg., building1 failed to converge)
-                if n == fail_to_converged_neighbor and n is not None:
+                if n in fail_to_converged_neighbors:
                     n.model.prep_transactive_signal(market, self)
-                    topic = self.campus_demand_topic
-                    if n != self.city:
-                        topic = self.campus_supply_topic.format(n.name)
-                    n.model.send_transactive_signal(self, topic, start_of_cycle)
+                    self.send_signal(n, start_of_cycle, supply_batch)
                     _log.debug("NeighborModel {} sent records.".format(n.model.name))
 
                 else:
@@ -194,40 +279,64 @@ class CampusAgent(Agent, myTransactiveNode):
                     if start_of_cycle:
                         if n != self.city:
                             n.model.prep_transactive_signal(market, self)
-                            topic = self.campus_supply_topic.format(n.name)
-                            n.model.send_transactive_signal(self, topic, start_of_cycle)
+                            self.send_signal(n, start_of_cycle, supply_batch)
                             _log.debug("NeighborModel {} sent records.".format(n.model.name))
                     else:
                         _log.debug("Not start of cycle. Check convergence for neighbor {}.".format(n.model.name))
                         n.model.check_for_convergence(market)
-                        if not n.model.converged:
+                        if n.model.send_due():
                             n.model.prep_transactive_signal(market, self)
-                            topic = self.campus_demand_topic
-                            if n != self.city:
-                                topic = self.campus_supply_topic.format(n.name)
-                            n.model.send_transactive_signal(self, topic, start_of_cycle)
+                            self.send_signal(n, start_of_cycle, supply_batch)
                             _log.debug("NeighborModel {} sent records.".format(n.model.name))
+                        elif not n.model.converged:
+                            deferred = True
+                            _log.debug("{} ({}) deferred records due to min_send_interval."
+                                       .format(n.model.name, self.name))
                         else:
                             _log.debug("{} ({}) did not send records due to check_for_convergence()."
                                        .format(n.model.name, self.name))
 
+            if len(supply_batch) > 0:
+                self.vip.pubsub.publish(peer='pubsub',
+                                        topic=self.campus_supply_batch_topic,
+                                        message={'source': self.name, 'signals': supply_batch})
+
+            # Deferred signals are sent by a later rebalance.
+            if deferred:
+                self.rebalancer.request()
+
             # Schedule rerun balancing if not in simulation mode
             if not self.simulation:
                 # For start_of_cyle=True, the code above always send signal to neighbors so don't need to reschedule
                 # Schedule rerun if any neighbor is not converged
                 if not start_of_cycle:
                     if not all([n.model.converged for n in self.neighbors]):
-                        dt = datetime.now()
+                        dt = Timer.get_schedule_time()
                         # Schedule to rerun after 5 minutes if it is in the same hour and is the first reschedule
                         next_run_dt = dt + self.reschedule_interval
                         if dt.hour == next_run_dt.hour and run_cnt >= 1:
                             _log.debug("{} reschedule to run at {}".format(self.name, next_run_dt))
-                            self.core.schedule(next_run_dt, self.balance_market, run_cnt + 1)
+                            self.schedule(next_run_dt, self.balance_market, run_cnt + 1)
         else:
             _log.debug("Market balancing sub-problem failed.")
             self.city.model.prep_transactive_signal(market, self)
             self.city.model.send_transactive_signal(self, self.campus_demand_topic, start_of_cycle)
 
+    def send_signal(self, n, start_of_cycle, supply_batch):
+        # Send a neighbor its prepared transactive signal. In batch mode, a
+        # building's message is instead added to supply_batch, keyed by the
+        # building's name, to be published with those of other buildings.
+        if n == self.city:
+            n.model.send_transactive_signal(self, self.campus_demand_topic, start_of_cycle)
+
+        elif self.batch_supply_signals:
+            message = n.model.transactive_message(start_of_cycle)
+            if message is not None:
+                supply_batch[n.name] = message
+
+        else:
+            n.model.send_transactive_signal(self, self.campus_supply_topic.format(n.name), start_of_cycle)
+
     def init_objects(self):
         # Add meter
         meter = MeterPoint()
@@ -287,11 +396,16 @@ class CampusAgent(Agent, myTransactiveNode):
         market.converged = False
         market.defaultPrice = 0.04  # [$/kWh]
         market.dualityGapThreshold = self.duality_gap_threshold  # [0.02 = 2#]
+        market.method = self.market_method
+        market.retentionWindow = timedelta(hours=self.retention_window)
+        if self.balance_profile is not None:
+            market.profiler = BalanceProfiler(self.balance_profile, self.balance_profile_format)
         market.initialMarketState = MarketState.Inactive
         market.marketOrder = 1  # This is first and only market
         market.intervalsToClear = 1  # Only one interval at a time
         market.futureHorizon = timedelta(hours=24)  # Projects 24 hourly future intervals
         market.intervalDuration = timedelta(hours=1)  # [h] Intervals are 1 h long
+        market.horizonSchedule = [(timedelta(hours=x[0]), timedelta(hours=x[1])) for x in self.horizon_schedule]
         market.marketClearingInterval = timedelta(hours=1)  # [h]
         market.marketClearingTime = Timer.get_cur_time().replace(hour=0,
                                                                  minute=0,
@@ -312,6 +426,8 @@ class CampusAgent(Agent, myTransactiveNode):
         city_model.name = 'CoR_Model'
         city_model.location = self.name
         city_model.transactive = True
+        city_model.snapshotInterval = self.signal_snapshot_interval
+        self.damp_signals(city_model)
         city_model.defaultPower = 10000  # [avg.kW]
         city_model.defaultVertices = [Vertex(0.046, 160, 0, True),
                                       Vertex(0.048,
@@ -327,13 +443,13 @@ class CampusAgent(Agent, myTransactiveNode):
         # Add city as campus' neighbor
         self.neighbors.append(city)
 
-        # Add buildings
+        # Add the configured buildings. Others may register later.
         for bldg_name in self.building_names:
-            bldg_neighbor = self.make_bldg_neighbor(bldg_name)
-            self.neighbors.append(bldg_neighbor)
+            self.register_building(bldg_name)
 
-    def make_bldg_neighbor(self, name):
-        bldg_powers = self.building_powers[name]
+    def make_bldg_neighbor(self, name, bldg_powers=None):
+        if bldg_powers is None:
+            bldg_powers = self.building_powers[name]
 
         # Create neighbor
         bldg = Neighbor()
@@ -350,6 +466,8 @@ class CampusAgent(Agent, myTransactiveNode):
         bldg_model.convergenceThreshold = 0.02
         bldg_model.friend = True
         bldg_model.transactive = True
+        bldg_model.snapshotInterval = self.signal_snapshot_interval
+        self.damp_signals(bldg_model)
         bldg_model.costParameters = [0, 0, 0]
 
         # This is different building to building
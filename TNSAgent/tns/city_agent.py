@@ -68,6 +68,8 @@ from measurement_type import MeasurementType
 from measurement_unit import MeasurementUnit
 from meter_point import MeterPoint
 from market import Market
+from balance_profiler import BalanceProfiler
+from rebalance_scheduler import RebalanceScheduler
 from market_state import MarketState
 from neighbor import Neighbor
 from local_asset import LocalAsset
@@ -98,6 +100,14 @@ class CityAgent(Agent, myTransactiveNode):
         self.name = self.config.get('name')
         self.market_cycle_in_min = int(self.config.get('market_cycle_in_min', 60))
         self.duality_gap_threshold = float(self.config.get('duality_gap_threshold', 0.01))
+        self.market_method = int(self.config.get('market_method', 2))  # {1: subgradient, 2: interpolation, 3: bisection, 4: decomposed}
+        self.retention_window = float(self.config.get('retention_window', 0))  # [h]
+        self.balance_profile = self.config.get('balance_profile')  # file that balance profiles are appended to
+        self.balance_profile_format = self.config.get('balance_profile_format', 'json')  # 'json' or 'csv'
+        self.horizon_schedule = self.config.get('horizon_schedule', [])  # [[span h, interval duration h]]
+        self.signal_snapshot_interval = int(self.config.get('signal_snapshot_interval', 10))  # full signal every n signals
+        self.rebalance_debounce = float(self.config.get('rebalance_debounce', 2))  # [s] coalesces signal bursts
+        self.rebalance_min_interval = float(self.config.get('rebalance_min_interval', 10))  # [s] between rebalances
         self.neighbors = []
 
         self.db_topic = self.config.get("db_topic", "tnc")
@@ -106,6 +116,13 @@ class CityAgent(Agent, myTransactiveNode):
 
         self.reschedule_interval = timedelta(minutes=10, seconds=1)
 
+        # Materially different transactive signals trigger rebalances. The
+        # reschedule interval above remains a safety net.
+        self.rebalancer = RebalanceScheduler(self.rebalance, self.schedule,
+                                             timedelta(seconds=self.rebalance_debounce),
+                                             timedelta(seconds=self.rebalance_min_interval),
+                                             Timer.get_schedule_time)
+
         self.simulation = self.config.get('simulation', False)
         self.simulation_start_time = parser.parse(self.config.get('simulation_start_time'))
         self.simulation_one_hour_in_seconds = int(self.config.get('simulation_one_hour_in_seconds'))
@@ -118,9 +135,9 @@ class CityAgent(Agent, myTransactiveNode):
     def get_exp_start_time(self):
         one_second = timedelta(seconds=1)
         if self.simulation:
-            next_exp_time = datetime.now() + one_second
+            next_exp_time = Timer.get_schedule_time() + one_second
         else:
-            now = datetime.now()
+            now = Timer.get_schedule_time()
             ten_mins = timedelta(minutes=10)
             next_exp_time = now + ten_mins
             if next_exp_time.hour == now.hour:
@@ -132,6 +149,9 @@ class CityAgent(Agent, myTransactiveNode):
 
     def get_next_exp_time(self, cur_exp_time, cur_analysis_time):
         one_hour_simulation = timedelta(seconds=self.simulation_one_hour_in_seconds)
+        if Timer.clock is not None:
+            # A discrete-event clock schedules in simulated time.
+            one_hour_simulation = timedelta(hours=1)
         one_hour = timedelta(hours=1)
         one_minute = timedelta(minutes=1)
 
@@ -165,9 +185,9 @@ class CityAgent(Agent, myTransactiveNode):
         _log.debug("{} schedule to run at exp_time: {} analysis_time: {}".format(self.name,
                                                                                  next_exp_time,
                                                                                  next_analysis_time))
-        self.core.schedule(next_exp_time, self.schedule_run,
-                           format_timestamp(next_exp_time),
-                           format_timestamp(next_analysis_time), True)
+        self.schedule(next_exp_time, self.schedule_run,
+                      format_timestamp(next_exp_time),
+                      format_timestamp(next_analysis_time), True)
 
     def schedule_run(self, cur_exp_time, cur_analysis_time, start_of_cycle=False):
         """
@@ -185,10 +205,10 @@ class CityAgent(Agent, myTransactiveNode):
         cur_exp_time = parser.parse(cur_exp_time)
         cur_analysis_time = parser.parse(cur_analysis_time)
         next_exp_time, next_analysis_time = self.get_next_exp_time(cur_exp_time, cur_analysis_time)
-        self.core.schedule(next_exp_time, self.schedule_run,
-                           format_timestamp(next_exp_time),
-                           format_timestamp(next_analysis_time),
-                           start_of_cycle=True)
+        self.schedule(next_exp_time, self.schedule_run,
+                      format_timestamp(next_exp_time),
+                      format_timestamp(next_analysis_time),
+                      start_of_cycle=True)
 
     def new_demand_signal(self, peer, sender, bus, topic, headers, message):
         _log.debug("At {}, {} receives new demand records: {}".format(Timer.get_cur_time(),
@@ -196,8 +216,14 @@ class CityAgent(Agent, myTransactiveNode):
         demand_curves = message['curves']
 
         # Should not do anything with start_of_cycle signal
-        self.campus.model.receive_transactive_signal(self, demand_curves)  # atm, only one campus
+        changed = self.campus.model.receive_transactive_signal(self, demand_curves)  # atm, only one campus
+
+        if changed:
+            self.rebalancer.request()
 
+    def rebalance(self, requests):
+        # Balance once for a burst of coalesced rebalance requests (see
+        # RebalanceScheduler).
         self.balance_market(1)
 
     def balance_market(self, run_cnt):
@@ -218,13 +244,13 @@ class CityAgent(Agent, myTransactiveNode):
             else:
                 # Schedule rerun balancing only if not in simulation mode
                 if not self.simulation:
-                    dt = datetime.now()
+                    dt = Timer.get_schedule_time()
                     _log.debug("{} ({}) did not send records due to check_for_convergence()".format(self.name, dt))
                     # Schedule to rerun after 5 minutes if it is in the same hour and is the first reschedule
                     next_run_dt = dt + self.reschedule_interval
                     if dt.hour == next_run_dt.hour and run_cnt >= 1:
                         _log.debug("{} reschedule to run at {}".format(self.name, next_run_dt))
-                        self.core.schedule(next_run_dt, self.balance_market, run_cnt + 1)
+                        self.schedule(next_run_dt, self.balance_market, run_cnt + 1)
         else:
             _log.debug("Market balancing sub-problem failed.")
 
@@ -281,11 +307,16 @@ class CityAgent(Agent, myTransactiveNode):
         market.converged = False
         market.defaultPrice = 0.0428  # [$/kWh]
         market.dualityGapThreshold = self.duality_gap_threshold  # [0.02 = 2#]
+        market.method = self.market_method
+        market.retentionWindow = timedelta(hours=self.retention_window)
+        if self.balance_profile is not None:
+            market.profiler = BalanceProfiler(self.balance_profile, self.balance_profile_format)
         market.initialMarketState = MarketState.Inactive
         market.marketOrder = 1  # This is first and only market
         market.intervalsToClear = 1  # Only one interval at a time
         market.futureHorizon = timedelta(hours=24)  # Projects 24 hourly future intervals
         market.intervalDuration = timedelta(hours=1)  # [h] Intervals are 1 h long
+        market.horizonSchedule = [(timedelta(hours=x[0]), timedelta(hours=x[1])) for x in self.horizon_schedule]
         market.marketClearingInterval = timedelta(hours=1)  # [h]
         market.marketClearingTime = Timer.get_cur_time().replace(hour=0,
                                                                  minute=0,
@@ -316,6 +347,7 @@ class CityAgent(Agent, myTransactiveNode):
         campus_model.defaultVertices = [Vertex(0.045, 0.0, -10000.0)]
         #campus_model.demandThreshold = 0.8 * campus.maximumPower
         campus_model.transactive = True
+        campus_model.snapshotInterval = self.signal_snapshot_interval
 
         # Cross-reference object & model
         campus_model.object = campus
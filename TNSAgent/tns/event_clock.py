@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2017, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+
+# }}}
+
+
+import heapq
+
+
+class ScheduledEvent(object):
+    """
+    A ScheduledEvent is a function call that is due at a simulated time on an
+    EventClock. Like the events scheduled by Agent.core.schedule(), it may be
+    cancelled before it is due.
+    """
+
+    def __init__(self, time, function, args=(), kwargs=None):
+        self.args = args
+        self.cancelled = False
+        self.function = function
+        self.kwargs = kwargs or {}
+        self.time = time  # simulated datetime when the event is due
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class EventClock(object):
+    """
+    An EventClock is the central event queue of a discrete-event simulation.
+    Rather than waiting for (scaled) wall-clock time to pass, it advances
+    simulated time straight to the next scheduled event, e.g., a balance, a
+    transactive signal, or a meter read. A simulation then runs as fast as
+    the events can be computed.
+
+    Install the clock as Timer.clock, so that Timer.get_cur_time(), and so
+    TimeInterval.assign_state(), return simulated time. Functions are
+    scheduled as with Agent.core.schedule(deadline, function, *args, **kwargs).
+    """
+
+    def __init__(self, start_time):
+        self.eventCount = 0  # number of events run
+        self.queue = []  # heap of (time, sequence number, ScheduledEvent)
+        self.sequence = 0  # orders the events that are due at the same time
+        self.time = start_time  # current simulated datetime
+
+    def now(self):
+        return self.time
+
+    def schedule(self, deadline, function, *args, **kwargs):
+        # Schedule a function call at a simulated datetime. Events that are due
+        # at the same time run in the order they were scheduled. Deadlines that
+        # have passed are due now.
+        # OUTPUTS:
+        # event - ScheduledEvent object, which may be cancelled
+        event = ScheduledEvent(max(deadline, self.time), function, args, kwargs)
+        self.sequence = self.sequence + 1
+        heapq.heappush(self.queue, (event.time, self.sequence, event))
+        return event
+
+    def next_time(self):
+        # The simulated datetime of the next event that is not cancelled, or
+        # None if no event is pending.
+        while len(self.queue) > 0 and self.queue[0][2].cancelled:
+            heapq.heappop(self.queue)
+
+        if len(self.queue) == 0:
+            return None
+
+        return self.queue[0][0]
+
+    def step(self):
+        # Advance simulated time to the next event, and run it.
+        # OUTPUTS:
+        # ran - Boolean: false if no event was pending
+        if self.next_time() is None:
+            return False
+
+        time, sequence, event = heapq.heappop(self.queue)
+        self.time = time
+        self.eventCount = self.eventCount + 1
+        event.function(*event.args, **event.kwargs)
+        return True
+
+    def run(self, until=None, max_events=None):
+        # Run events in time order until none is pending, the next one is due
+        # after simulated datetime until, or max_events have run. Events may
+        # schedule further events. If until is given and reached, simulated
+        # time advances to it.
+        # OUTPUTS:
+        # count - number of events run
+        count = 0
+
+        while max_events is None or count < max_events:
+            next_time = self.next_time()
+
+            if next_time is None or (until is not None and next_time > until):
+                if until is not None and self.time < until:
+                    self.time = until
+                break
+
+            self.step()
+            count = count + 1
+
+        return count
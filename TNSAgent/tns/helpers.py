@@ -58,9 +58,12 @@
 
 
 import math
+import calendar
 import logging
 from datetime import datetime, timedelta
 
+import numpy as np
+
 # from volttron.platform.agent import utils
 # utils.setup_logging()
 # _log = logging.getLogger(__name__)
@@ -70,23 +73,57 @@ def format_date(dt):
     return dt.strftime('%Y%m%d')
 
 
+# Time interval names are formatted by strftime(), which is slow compared to
+# the name comparisons that follow. The names are therefore memoized by
+# datetime. The memo is cleared whenever it grows large.
+_ts_names = {}
+_ts_names_max = 10000
+
+
 def format_ts(dt):
-    return dt.strftime('%Y%m%dT%H%M%S')
+    name = _ts_names.get(dt)
+
+    if name is None:
+        if len(_ts_names) >= _ts_names_max:
+            _ts_names.clear()
+        name = dt.strftime('%Y%m%dT%H%M%S')
+        _ts_names[dt] = name
+
+    return name
+
+
+def interval_key(dt):
+    # An integer key of a time interval start time: the minutes since
+    # 1970-01-01 in the time fields of the datetime, as in its format_ts()
+    # name.
+    return calendar.timegm(dt.timetuple()) // 60
 
 
 def json_econder(obj):
     if isinstance(obj, datetime):
         return format_ts(obj)
+    elif hasattr(obj, '__slots__'):
+        # Objects having slots (e.g., TransactiveRecord) have no dictionary.
+        return dict([(x, getattr(obj, x)) for x in obj.__slots__ if hasattr(obj, x)])
     else:
         return obj.__dict__
 
 
 def get_duration_in_hour(dur):
+    # Durations may be shorter than an hour, so they are not truncated to
+    # whole hours.
     if isinstance(dur, timedelta):
-        dur = dur.seconds // 3600
+        dur = dur.total_seconds() / 3600.0
     return dur
 
 
+def floor_time(dt, dur):
+    # Round a datetime down to a multiple of a duration since midnight, e.g.,
+    # to the start of the 15-minute interval that contains it.
+    midnight = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    return dt - timedelta(seconds=(dt - midnight).total_seconds() % dur.total_seconds())
+
+
 def find_objs_by_ti(items, ti):
     found_items = [x for x in items if x.timeInterval.startTime == ti.startTime]
     return found_items
@@ -140,6 +177,138 @@ def is_heavyloadhour(datetime_value):
     return is_hlh
 
 
+def values_by_interval(items):
+    # Index interval values (see class IntervalValue) by the start times of
+    # their time intervals. Where a time interval has several values, the
+    # first is indexed, as found by find_obj_by_ti().
+    index = {}
+
+    for x in reversed(items):
+        index[x.timeInterval.startTime] = x
+
+    return index
+
+
+def aligned_values(items, tis, default=None):
+    # Align the values of interval values with a list of time intervals, e.g.,
+    # to make arrays over the active horizon.
+    #
+    # INPUTS:
+    # items - list of IntervalValue objects
+    # tis - list of time intervals (see class TimeInterval)
+    # default - value of the time intervals that have no interval value. If
+    #           no default is given, a missing interval value is an error.
+    #
+    # OUTPUTS:
+    # values - list of values, one per time interval
+    index = values_by_interval(items)
+
+    values = []
+
+    for ti in tis:
+        if ti.startTime in index:
+            values.append(index[ti.startTime].value)
+
+        elif default is not None:
+            values.append(default)
+
+        else:
+            raise Exception(' '.join(['No interval value was found in time interval', ti.name]))
+
+    return values
+
+
+def assign_values(items, calling_object, tis, mkt, measurement_type, values):
+    # Write values into the interval values of a list of time intervals.
+    # Existing interval values are reassigned. Interval values are created and
+    # appended to the list for the time intervals that have none.
+    #
+    # INPUTS:
+    # items - list of IntervalValue objects that is to be updated in place
+    # calling_object - object that owns the interval values
+    # tis - list of time intervals (see class TimeInterval)
+    # mkt - Market object
+    # measurement_type - see MeasurementType enumeration
+    # values - list of values, one per time interval
+    from interval_value import IntervalValue
+
+    index = values_by_interval(items)
+
+    for ti, value in zip(tis, values):
+        iv = index.get(ti.startTime)
+
+        if iv is None:
+            iv = IntervalValue(calling_object, ti, mkt, measurement_type, value)
+            items.append(iv)
+            index[ti.startTime] = iv
+        else:
+            iv.value = value
+
+
+def records_by_interval(records):
+    # Group transactive records (see class TransactiveRecord) by the names of
+    # their time intervals, so that the records of many time intervals can
+    # each be found without another scan of the records.
+    #
+    # INPUTS:
+    # records - list of TransactiveRecord objects
+    #
+    # OUTPUTS:
+    # groups - {time interval name: [TransactiveRecord]}, records kept in order
+    groups = {}
+
+    for x in records:
+        groups.setdefault(x.timeInterval, []).append(x)
+
+    return groups
+
+
+def records_differ(a, b, threshold):
+    # Returns true if two sets of TransactiveRecord objects in a time
+    # interval differ, record by record, by more than a relative threshold.
+    # Unlike are_different2(), the scheduled point (i.e., Record 0) and the
+    # flexibility records are all compared, since either might be used by the
+    # neighbor that receives them.
+    #
+    # INPUTS:
+    # a, b - lists of TransactiveRecord objects in the same time interval
+    # threshold - relative error, e.g., NeighborModel.convergenceThreshold
+    #
+    # OUTPUTS:
+    # tf - Boolean: true if the records differ
+    if len(a) != len(b):
+        return True
+
+    b = dict([(x.record, x) for x in b])
+
+    for x in a:
+        y = b.get(x.record)
+
+        if y is None:
+            return True
+
+        for u, v in [(x.marginalPrice, y.marginalPrice), (x.power, y.power)]:
+            # Relative difference, safe where both values are zero.
+            if abs(u - v) > threshold * max(abs(u), abs(v)):
+                return True
+
+    return False
+
+
+def retained_values(items, cutoff):
+    # Keep the interval values (see class IntervalValue) whose time intervals
+    # start at or after a cutoff time.
+    return [x for x in items if x.timeInterval.startTime >= cutoff]
+
+
+def retained_records(records, cutoff):
+    # Keep the transactive records (see class TransactiveRecord) whose time
+    # intervals start at or after a cutoff time. Records name their time
+    # intervals by format_ts() text, which orders the same as the start times.
+    cutoff = format_ts(cutoff)
+    return [x for x in records if x.timeInterval >= cutoff]
+
+
 def order_vertices(uv):
     return sorted(uv, key=lambda x: (x.marginalPrice, x.power))
 
@@ -185,8 +354,9 @@ def prod_cost_from_vertices(obj, ti, pwr):
         cost = 0.0
         return cost
 
-    # Find the active vertices for the object in the given time interval
-    v = [x for x in obj.activeVertices if x.timeInterval.startTime == ti.startTime]
+    # Find the active vertices for the object in the given time interval,
+    # ordered by increasing marginal price and power
+    v = ordered_vertices(obj, ti)
 
     # number of active vertices len in the indexed time interval
     v_len = len(v)
@@ -198,8 +368,8 @@ def prod_cost_from_vertices(obj, ti, pwr):
         return
 
     elif v_len == 1:  # One vertex was found in the given time interval
-        # Extract the vertex from the interval value
-        v = v[0].value  # a production vertex
+        # Extract the lone vertex
+        v = v[0]  # a production vertex
 
         # There is no flexibility. Assign the production value from the
         # constant production as indicated by the lone vertex.
@@ -207,12 +377,6 @@ def prod_cost_from_vertices(obj, ti, pwr):
         return cost
 
     else:  # There is more than one vertex
-        # Extract the production vertices from the interval values
-        v = [x.value for x in v]  # vertices
-
-        # Sort the vertices in order of increasing marginal price and power
-        v = order_vertices(v)
-
         # Special case when neighbor is at its minimum power.
         if pwr <= v[0].power:
 
@@ -324,11 +488,10 @@ def production(obj, price, ti):
     # [p1] - economic power production in the given time interval   and at
     # the given price (positive for generation) [avg.kW].
 
-    # Find the active production vertices for this time interval (see class IntervalValue).
-    pv = find_objs_by_ti(obj.activeVertices, ti)
-
-    # Extract the vertices (see struct Vertex) from the interval values (see IntervalValue class).
-    pvv = [x.value for x in pv]  # vertices
+    # Find the active production vertices (see struct Vertex) for this time
+    # interval, ordered by increasing price. Vertices having same price are
+    # ordered by power.
+    pvv = ordered_vertices(obj, ti)  # vertices
 
     # Number len of vertices in the list.
     pvv_len = len(pvv)
@@ -336,10 +499,6 @@ def production(obj, price, ti):
         # _log.debug('Active vertices: %s' % (str(obj.activeVertices)))
         raise Exception(' '.join(['No active vertices were found for', obj.name, 'in time interval', ti.name]))
 
-    # Ensure that the production vertices are ordered by increasing price.
-    # Vertices having same price are ordered by power.
-    pvv = order_vertices(pvv)  # vertices
-
     if pvv_len == 1:  # One active vertices were found in the given time interval
         # Presume that using a single production vertex is shorthand for
         # constant, inelastic production.
@@ -363,7 +522,15 @@ def production(obj, price, ti):
             # Index through the active vertices pvv in the given time
             # interval ti
             for i in range(pvv_len-1):
-                if pvv[i].marginalPrice <= price < pvv[i+1].marginalPrice:
+                if pvv[i].marginalPrice <= price < pvv[i+1].marginalPrice \
+                        and not (pvv[i].continuity and pvv[i+1].continuity):
+                    # The marginal price falls between two vertices, but
+                    # production is disallowed between them. The power
+                    # stays at the lower vertex.
+                    p1 = pvv[i].power  # [avg.kW]
+                    return p1
+
+                elif pvv[i].marginalPrice <= price < pvv[i+1].marginalPrice:
                     # The marginal price falls between two vertices that
                     # are sloping upward to the right. Interpolate
                     # between the vertices to find the power production.
@@ -387,7 +554,341 @@ def production(obj, price, ti):
                     return p1
 
 
-def are_different1(s, r, threshold, calling_neighbor=''):
+def cached_vertices(obj, ti):
+    # Find the cache entry of an object's active vertices in a time interval.
+    #
+    # The ordered vertices of a neighbor or local asset model change only when
+    # the model updates its vertices, but they are looked up many times while
+    # a market is balanced. They are therefore kept in obj.vertexCache, keyed
+    # by interval start time. Whatever writes the active vertices of a time
+    # interval, whether by adding, removing, or revising them in place, must
+    # discard that interval's entry by calling invalidate_vertices().
+    #
+    # INPUTS:
+    # obj - Asset or neighbor model having a set of active vertices
+    # ti - time interval (see class TimeInterval)
+    #
+    # OUTPUTS:
+    # entry - tuple of the ordered vertices (see struct Vertex), arrays of
+    # their marginal prices [$/kWh], powers [avg.kW], and costs [$], and
+    # the continuity of the segments between successive vertices
+    if getattr(obj, 'vertexCache', None) is None:
+        obj.vertexCache = {}
+
+    entry = obj.vertexCache.get(ti.startTime)
+
+    if entry is None:
+        v = order_vertices([x.value for x in find_objs_by_ti(obj.activeVertices, ti)])
+
+        mps = np.array([x.marginalPrice for x in v], dtype=float)  # [$/kWh]
+        powers = np.array([x.power for x in v], dtype=float)  # [avg.kW]
+        costs = np.array([x.cost for x in v], dtype=float)  # [$]
+
+        # A segment is continuous only if neither of its vertices disallows
+        # production next to it (see struct Vertex).
+        continuous = np.array([v[k].continuity and v[k+1].continuity for k in range(len(v) - 1)],
+                              dtype=bool)
+
+        entry = (v, mps, powers, costs, continuous)
+        obj.vertexCache[ti.startTime] = entry
+
+    return entry
+
+
+def invalidate_vertices(obj, ti=None):
+    # Discard the cached vertices of an object in a time interval, or in all
+    # time intervals if no time interval is given (see cached_vertices()).
+    cache = getattr(obj, 'vertexCache', None)
+
+    if cache is None:
+        return
+
+    if ti is None:
+        cache.clear()
+    else:
+        cache.pop(ti.startTime, None)
+
+
+def ordered_vertices(obj, ti):
+    # Gather the active vertices of a neighbor or local asset model in a time
+    # interval, ordered by increasing marginal price and power as by
+    # order_vertices(). The list is cached and must not be modified.
+    return cached_vertices(obj, ti)[0]
+
+
+def vertex_arrays(obj, ti):
+    # Gather the active vertices of a neighbor or local asset model in a time
+    # interval as arrays. The vertices are ordered by increasing marginal price
+    # and power, exactly as by order_vertices(). The arrays are cached and must
+    # not be modified.
+    #
+    # INPUTS:
+    # obj - Asset or neighbor model having a set of active vertices
+    # ti - time interval (see class TimeInterval)
+    #
+    # OUTPUTS:
+    # mps - ordered vertex marginal prices [$/kWh]
+    # powers - vertex powers [avg.kW]
+    # costs - vertex production costs [$]
+    v, mps, powers, costs, continuous = cached_vertices(obj, ti)
+
+    return mps, powers, costs
+
+
+def vertex_continuity(obj, ti):
+    # Find which segments between the ordered active vertices of a neighbor
+    # or local asset model in a time interval are continuous (see
+    # vertex_arrays()). Segment k lies between vertices k and k+1. The array
+    # is cached and must not be modified.
+    return cached_vertices(obj, ti)[4]
+
+
+def production_from_arrays(mps, powers, prices, continuous=None):
+    # Vectorized equivalent of production(). Find economic power production
+    # at many marginal prices from the ordered vertex arrays of one object in
+    # one time interval (see vertex_arrays()).
+    #
+    # INPUTS:
+    # mps - ordered vertex marginal prices [$/kWh]
+    # powers - vertex powers [avg.kW]
+    # prices - marginal prices at which power is to be found [$/kWh]
+    # continuous - continuity of the segments between successive vertices
+    # (see vertex_continuity()). All segments are continuous if omitted.
+    #
+    # OUTPUTS:
+    # p1 - economic power production at each of the prices [avg.kW]
+    prices = np.asarray(prices, dtype=float)
+    v_len = len(mps)
+
+    if v_len == 0:
+        raise Exception('No active vertices were supplied')
+
+    if v_len == 1:
+        # A single vertex is shorthand for constant, inelastic production.
+        return np.full(prices.shape, powers[0])
+
+    # Find the range of vertices that share each price. The segment to
+    # interpolate begins at the last vertex having a marginal price at or
+    # below the price.
+    left = np.searchsorted(mps, prices, side='left')
+    right = np.searchsorted(mps, prices, side='right')
+    k = np.clip(right - 1, 0, v_len - 2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p1 = powers[k] + (prices - mps[k]) * (powers[k + 1] - powers[k]) / (mps[k + 1] - mps[k])  # [avg.kW]
+
+    # Production is disallowed within a discontinuous segment. The power stays
+    # at its lower vertex.
+    if continuous is not None:
+        p1 = np.where(continuous[k], p1, powers[k])
+
+    # The price is the same as for two or more vertices that lie vertically at
+    # the same marginal price. Assign the power of the second of them.
+    p1 = np.where(right - left >= 2, powers[np.minimum(left + 1, v_len - 1)], p1)
+
+    # The marginal price is before the first vertex. The power is at its minimum.
+    p1 = np.where(prices < mps[0], powers[0], p1)
+
+    # The marginal price is at or after the last vertex. The power is at its maximum.
+    p1 = np.where(prices >= mps[-1], powers[-1], p1)
+
+    return p1
+
+
+def vertex_rows(obj, tis):
+    # Gather the active vertices of a neighbor or local asset model in many
+    # time intervals as two-dimensional arrays, one row per time interval (see
+    # vertex_arrays()). Shorter rows are padded by repeating their last vertex,
+    # which does not change the power that the row represents at any price.
+    #
+    # INPUTS:
+    # obj - Asset or neighbor model having a set of active vertices
+    # tis - list of time intervals (see class TimeInterval)
+    #
+    # OUTPUTS:
+    # mps - ordered vertex marginal prices [$/kWh], one row per time interval
+    # powers - vertex powers [avg.kW], one row per time interval
+    # counts - number of actual vertices in each row
+    # costs - vertex production costs [$], one row per time interval
+    # continuous - continuity of the segments between successive vertices,
+    # one row per time interval. Padded segments are continuous.
+    curves = [cached_vertices(obj, ti)[1:] for ti in tis]
+    counts = np.array([len(x[0]) for x in curves], dtype=int)
+
+    if len(curves) == 0 or counts.min() == 0:
+        raise Exception('No active vertices were found for ' + str(obj.name))
+
+    # Fill preallocated rows. Each row is first filled with its last vertex,
+    # which pads it, and then its actual vertices are copied.
+    width = counts.max()
+    mps = np.empty((len(curves), width))  # [$/kWh]
+    powers = np.empty((len(curves), width))  # [avg.kW]
+    costs = np.empty((len(curves), width))  # [$]
+    continuous = np.ones((len(curves), width - 1), dtype=bool)
+
+    for i, x in enumerate(curves):
+        n = counts[i]
+        mps[i, :] = x[0][n - 1]
+        mps[i, 0:n] = x[0]
+        powers[i, :] = x[1][n - 1]
+        powers[i, 0:n] = x[1]
+        costs[i, :] = x[2][n - 1]
+        costs[i, 0:n] = x[2]
+        continuous[i, 0:n - 1] = x[3]
+
+    return mps, powers, counts, costs, continuous
+
+
+def production_from_rows(mps, powers, prices, continuous=None):
+    # Row-wise equivalent of production_from_arrays(). Find economic power
+    # production in many time intervals at once, one marginal price per row
+    # of the ordered vertex arrays (see vertex_rows()).
+    #
+    # INPUTS:
+    # mps - ordered vertex marginal prices [$/kWh], one row per time interval
+    # powers - vertex powers [avg.kW], one row per time interval
+    # prices - a marginal price for each row [$/kWh]
+    # continuous - continuity of the segments between successive vertices,
+    # one row per time interval. All segments are continuous if omitted.
+    #
+    # OUTPUTS:
+    # p1 - economic power production in each row [avg.kW]
+    prices = np.asarray(prices, dtype=float)
+    rows = np.arange(mps.shape[0])
+    v_len = mps.shape[1]
+
+    if v_len == 1:
+        # Every row is a single vertex of constant, inelastic production.
+        return powers[:, 0].copy()
+
+    # Find the range of vertices that share each price, as in
+    # production_from_arrays().
+    left = (mps < prices[:, None]).sum(axis=1)
+    right = (mps <= prices[:, None]).sum(axis=1)
+    k = np.clip(right - 1, 0, v_len - 2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p1 = powers[rows, k] + (prices - mps[rows, k]) * (powers[rows, k + 1] - powers[rows, k]) \
+            / (mps[rows, k + 1] - mps[rows, k])  # [avg.kW]
+
+    # Production is disallowed within a discontinuous segment. The power stays
+    # at its lower vertex.
+    if continuous is not None:
+        p1 = np.where(continuous[rows, k], p1, powers[rows, k])
+
+    # Two or more vertices lie vertically at the price. Assign the power of the second.
+    p1 = np.where(right - left >= 2, powers[rows, np.minimum(left + 1, v_len - 1)], p1)
+
+    # The marginal price is before the first vertex. The power is at its minimum.
+    p1 = np.where(prices < mps[:, 0], powers[:, 0], p1)
+
+    # The marginal price is at or after the last vertex. The power is at its maximum.
+    p1 = np.where(prices >= mps[:, -1], powers[:, -1], p1)
+
+    return p1
+
+
+def prod_cost_from_arrays(mps, powers, costs, pwrs, dur):
+    # Vectorized equivalent of prod_cost_from_vertices(). Infer production
+    # costs at many powers from the ordered vertex arrays of one object in one
+    # time interval (see vertex_arrays()).
+    #
+    # INPUTS:
+    # mps - ordered vertex marginal prices [$/kWh]
+    # powers - vertex powers [avg.kW]
+    # costs - vertex production costs [$]
+    # pwrs - average powers at which production costs are to be found [avg.kW]
+    # dur - duration of the time interval [h]
+    #
+    # OUTPUTS:
+    # cost - production cost at each of the powers [$]. The cost is NaN where
+    # no segment of the supply curve contains the power.
+    pwrs = np.asarray(pwrs, dtype=float)
+    v_len = len(powers)
+
+    if v_len == 0:
+        raise Exception('No active vertices were supplied')
+
+    if v_len == 1:
+        # There is no flexibility. The lone vertex holds the production cost.
+        cost = np.full(pwrs.shape, costs[0])
+
+    else:
+        # Find the first segment of the supply curve that contains each power.
+        segments = (powers[:-1] <= pwrs[..., None]) & (pwrs[..., None] < powers[1:])
+        found = segments.any(axis=-1)
+        k = segments.argmax(axis=-1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Power in excess of the lower vertex of the segment
+            dp = pwrs - powers[k]  # [avg.kW]
+
+            # Constant, first-order, and second-order terms as in prod_cost_from_vertices()
+            a0 = costs[k]  # [$]
+            a1 = mps[k] * dp * dur  # [$]
+            a2 = (mps[k + 1] - mps[k]) / (powers[k + 1] - powers[k]) * dp ** 2 * dur  # [$]
+            cost = np.where(found, a0 + a1 + a2, np.nan)  # production cost [$]
+
+        # Special cases when the object is at its maximum or minimum power.
+        cost = np.where(pwrs >= powers[-1], costs[-1], cost)
+        cost = np.where(pwrs <= powers[0], costs[0], cost)
+
+    # Only generation and importation of electricity contribute to production costs.
+    cost = np.where(pwrs < 0.0, 0.0, cost)
+
+    return cost
+
+
+def prod_cost_from_rows(mps, powers, costs, pwrs, durs):
+    # Row-wise equivalent of prod_cost_from_arrays(). Infer production costs
+    # in many time intervals at once, one power per row of the ordered vertex
+    # arrays (see vertex_rows()).
+    #
+    # INPUTS:
+    # mps - ordered vertex marginal prices [$/kWh], one row per time interval
+    # powers - vertex powers [avg.kW], one row per time interval
+    # costs - vertex production costs [$], one row per time interval
+    # pwrs - an average power for each row [avg.kW]
+    # durs - duration of each row's time interval [h]
+    #
+    # OUTPUTS:
+    # cost - production cost in each row [$]. The cost is NaN where no
+    # segment of the row's supply curve contains the power.
+    pwrs = np.asarray(pwrs, dtype=float)
+    durs = np.asarray(durs, dtype=float)
+    rows = np.arange(mps.shape[0])
+    v_len = mps.shape[1]
+
+    if v_len == 1:
+        # Every row is a lone vertex that holds the production cost.
+        cost = costs[:, 0].copy()
+
+    else:
+        # Find the first segment of each row that contains the row's power.
+        # Padded segments have no width and contain no power.
+        segments = (powers[:, :-1] <= pwrs[:, None]) & (pwrs[:, None] < powers[:, 1:])
+        found = segments.any(axis=1)
+        k = segments.argmax(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dp = pwrs - powers[rows, k]  # [avg.kW]
+            slope = (mps[rows, k + 1] - mps[rows, k]) / (powers[rows, k + 1] - powers[rows, k])  # [$/kWh/kW]
+
+            # Constant, first-order, and second-order terms as in prod_cost_from_vertices()
+            cost = costs[rows, k] + (mps[rows, k] + slope * dp) * dp * durs  # [$]
+            cost = np.where(found, cost, np.nan)
+
+        # Special cases when the object is at its maximum or minimum power.
+        cost = np.where(pwrs >= powers[:, -1], costs[:, -1], cost)
+        cost = np.where(pwrs <= powers[:, 0], costs[:, 0], cost)
+
+    # Only generation and importation of electricity contribute to production costs.
+    cost = np.where(pwrs < 0.0, 0.0, cost)
+
+    return cost
+
+
+def are_different1(s, r, threshold, calling_neighbor='', power_deadband=0.0, price_deadband=0.0):
     # Returns true is two sets of TransactiveRecord objects,
     # representing sent and received messages in a time interval, are
     # significantly different.
@@ -399,6 +900,10 @@ def are_different1(s, r, threshold, calling_neighbor=''):
     # differ significantly if the relative distance between the
     # scheduled points (i.e., Record 0) differ by more than this
     # threshold.
+    # power_deadband - absolute power difference [avg.kW] and
+    # price_deadband - absolute marginal price difference [$/kWh] within
+    # which the scheduled points do not differ, whatever their relative
+    # distance.
     #
     # OUTPUS:
     # tf - Boolean: true if relative distance between scheduled (i.e., Record
@@ -447,7 +952,11 @@ def are_different1(s, r, threshold, calling_neighbor=''):
     else:
         d = 0
 
-    if d > threshold:
+    # Scheduled points that are within the absolute deadbands do not differ.
+    # Prices are not meaningful if either message is a constant.
+    in_deadband = dq <= power_deadband and (len(s) == 1 or len(r) == 1 or dmp <= price_deadband)
+
+    if d > threshold and not in_deadband:
         # The distance, or relative error, between the two scheduled points
         # exceeds the threshold criterion. Return true to indicate that the
         # two messages are significantly different.
@@ -463,7 +972,7 @@ def are_different1(s, r, threshold, calling_neighbor=''):
     return is_diff
 
 
-def are_different2(m, s, threshold, calling_neighbor=''):
+def are_different2(m, s, threshold, calling_neighbor='', power_deadband=0.0, price_deadband=0.0):
     # Assess whether two TransactiveRecord messages,
     # representing the calculated and sent messages in an active time interval
     # are significantly different from one another. If the signals are
@@ -477,6 +986,9 @@ def are_different2(m, s, threshold, calling_neighbor=''):
     # message that was sent to this transactive Neighbor.
     # threshold - a dimensionless, relative error that is used as a convergence
     # criterion.
+    # power_deadband - absolute power difference [avg.kW] and
+    # price_deadband - absolute marginal price difference [$/kWh] within
+    # which records do not differ, whatever their relative distance.
     #
     # OUTPUTS:
     # tf - Boolean: true if the sent and recently calculated transactive
@@ -516,7 +1028,7 @@ def are_different2(m, s, threshold, calling_neighbor=''):
         else:
             d = 0
 
-        if d > threshold:
+        if d > threshold and dq > power_deadband:
             # The difference is greater than the criterion. Return true,
             # meaning that the difference is significant.
             is_diff = True
@@ -570,10 +1082,13 @@ def are_different2(m, s, threshold, calling_neighbor=''):
                 #MUST BE AVOIDED WITH THIS CODE:
                 # Avoid unlikely divide-by-zero case. If the average marginal price is
                 # zero, it is probable they are BOTH zero:
+                # Records within the absolute deadbands are paired, too.
+                in_deadband = dq <= power_deadband and dmp <= price_deadband
+
                 dmp = 0 if avg_mp == 0 else dmp/avg_mp
                 dq = 0 if avg_q == 0 else dq/avg_q
 
-                if math.sqrt(dmp**2 + dq**2) <= threshold:
+                if in_deadband or math.sqrt(dmp**2 + dq**2) <= threshold:
                         # No pairing was found within the relative error criterion
                         # distance. Things must have changed locally since the
                         # transactive message was last sent to the transactive
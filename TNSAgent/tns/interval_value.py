@@ -57,22 +57,33 @@
 # }}}
 
 
-class IntervalValue:
+class IntervalValue(object):
     """
     An IntervalValue instance is used to keep track of a value (measurement, quality, etc.)
     with its corresponding TimeInterval instance.
+
+    Markets create and discard many interval values while they balance, so the
+    instances have slots rather than dictionaries. The version, scheduled, and
+    id properties are constant and shared by all instances.
     """
+    __slots__ = ('associatedClass', 'timeInterval', 'market', 'measurementType', 'value')
+
+    version = 0
+    scheduled = True  # islogical(scheduled)
+    id = None
+
     def __init__(self, calling_object, time_interval, market, measurement_type, value):
-        self.version = 0
-        self.scheduled = True  # islogical(scheduled)
         self.associatedClass = calling_object.__class__
-        self.associatedObject = type(calling_object).__name__
-        self.id = None
         self.timeInterval = time_interval
         self.market = market
         self.measurementType = measurement_type
         self.value = value
 
+    @property
+    def associatedObject(self):
+        # Name of the calling object's class
+        return self.associatedClass.__name__
+
     # Subdivide an IntervalValue into multiple identical IntervalValues.
     def subdivide(self):
         pass
@@ -186,10 +186,10 @@ class LocalAssetModel(Model, object):
 
         # Gather the active time intervals ti
         time_intervals = mkt.timeIntervals
-        time_interval_values = [t.startTime for t in time_intervals]
+        time_interval_values = set([t.startTime for t in time_intervals])
         self.scheduledPowers = [x for x in self.scheduledPowers if x.timeInterval.startTime in time_interval_values]
 
-        time_intervals.sort(key=lambda x: x.startTime)
+        time_intervals = sorted(time_intervals, key=lambda x: x.startTime)
 
         len_powers = len(self.default_powers)
         default_value = self.defaultPower
@@ -234,7 +234,7 @@ class LocalAssetModel(Model, object):
 
         # Gather the active time intervals ti
         time_intervals = mkt.timeIntervals  # active TimeIntervals
-        time_interval_values = [t.startTime for t in time_intervals]
+        time_interval_values = set([t.startTime for t in time_intervals])
         self.engagementSchedule = [x for x in self.engagementSchedule if x.timeInterval.startTime in time_interval_values]
 
         # Index through the active time intervals ti
@@ -288,7 +288,7 @@ class LocalAssetModel(Model, object):
 
         # Gather the active time intervals ti
         time_intervals = mkt.timeIntervals  # active TimeIntervals
-        time_interval_values = [t.startTime for t in time_intervals]
+        time_interval_values = set([t.startTime for t in time_intervals])
         self.reserveMargins = [x for x in self.reserveMargins if x.timeInterval.startTime in time_interval_values]
 
         # Index through active time intervals ti
@@ -403,11 +403,11 @@ class LocalAssetModel(Model, object):
 
         # Gather active time intervals
         time_intervals = mkt.timeIntervals
-        time_interval_values = [t.startTime for t in time_intervals]
+        time_interval_values = set([t.startTime for t in time_intervals])
         self.transitionCosts = [x for x in self.transitionCosts if x.timeInterval.startTime in time_interval_values]
 
         # Ensure that ti is ordered by time interval start times
-        time_intervals.sort(key=lambda x: x.startTime)
+        time_intervals = sorted(time_intervals, key=lambda x: x.startTime)
 
         # Index through all but the first time interval ti
         for i in range(len(time_intervals)):
@@ -456,51 +456,33 @@ class LocalAssetModel(Model, object):
         # Update the dual cost for all active time intervals
         # (NOTE: Choosing not to separate this def from the base class because
         # cost might need to be handled differently and redefined in subclasses.)
+        #
+        # The marginal prices, scheduled powers, and production costs are
+        # aligned as arrays over the active time intervals, and the dual costs
+        # are calculated for all of them at once.
 
         # Gather the active time intervals ti
         time_intervals = mkt.timeIntervals
-        time_interval_values = [t.startTime for t in time_intervals]
+        time_interval_values = set([t.startTime for t in time_intervals])
         self.dualCosts = [x for x in self.dualCosts if x.timeInterval.startTime in time_interval_values]
 
-        # Index through the time intervals ti
-        for i in range(1, len(time_intervals)):
-            # Find the marginal price mp for the indexed time interval ti(i) in
-            # the given market mkt
-            mp = find_obj_by_ti(mkt.marginalPrices, time_intervals[i])
-            mp = mp.value  # a marginal price [$/kWh]
-
-            # Find the scheduled power sp for the asset in the indexed time interval ti(i)
-            sp = find_obj_by_ti(self.scheduledPowers, time_intervals[i])
-            sp = sp.value  # schedule power [avg.kW]
+        # The dual costs of the time intervals after the first are updated.
+        tis = list(time_intervals)[1:]
 
-            # Find the production cost in the indexed time interval
-            pc = find_obj_by_ti(self.productionCosts, time_intervals[i])
-            pc = pc.value  # production cost [$]
+        if len(tis) > 0:
+            # Align the marginal prices mp in the given market mkt, the
+            # scheduled powers sp, and the production costs pc of the asset.
+            mp = np.array(aligned_values(mkt.marginalPrices, tis), dtype=float)  # marginal prices [$/kWh]
+            sp = np.array(aligned_values(self.scheduledPowers, tis), dtype=float)  # scheduled powers [avg.kW]
+            pc = np.array(aligned_values(self.productionCosts, tis), dtype=float)  # production costs [$]
+            dur = np.array([get_duration_in_hour(ti.duration) for ti in tis], dtype=float)  # [h]
 
             # Dual cost in the time interval is calculated as production cost,
             # minus the product of marginal price, scheduled power, and the
             # duration of the time interval.
-            dur = time_intervals[i].duration.seconds // 3600
-            dc = pc - (mp * sp * dur)  # a dual cost [$]
-
-            # Check whether a dual cost exists in the indexed time interval
-            iv = find_obj_by_ti(self.dualCosts, time_intervals[i])
-
-            if iv is None:
-                # No dual cost was found in the indexed time interval. Create an
-                # interval value and assign it the calculated value.
-                iv = IntervalValue(self, time_intervals[i], mkt, MeasurementType.DualCost, dc)
-
-                # Append the new interval value to the list of active interval values
-                self.dualCosts.append(iv)
-
-            else:
-                # The dual cost value was found to already exist in the indexed
-                # time interval. Simply reassign it the new calculated value.
-                iv.value = dc  # a dual cost [$]
+            dc = pc - (mp * sp * dur)  # dual costs [$]
 
-        # Ensure that only active time intervals are in the list of dual costs adc
-        #self.dualCosts = [x for x in self.dualCosts if x.timeInterval in ti]
+            assign_values(self.dualCosts, self, tis, mkt, MeasurementType.DualCost, dc.tolist())
 
         # Sum the total dual cost and save the value
         self.totalDualCost = sum([x.value for x in self.dualCosts])
@@ -508,6 +490,20 @@ class LocalAssetModel(Model, object):
         dc = [(x.timeInterval.name, x.value) for x in self.dualCosts]
         _log.debug("{} asset model dual costs are: {}".format(self.name, dc))
 
+    def production_cost(self, ti, sp):
+        # Calculate the production cost of the asset at a scheduled power in
+        # one time interval, excluding transition costs. Subclasses may
+        # redefine this to calculate costs differently; update_production_costs()
+        # then calls it in each time interval instead of its batched calculation.
+        #
+        # INPUTS:
+        # ti - time interval (see class TimeInterval)
+        # sp - scheduled power [avg.kW]
+        #
+        # OUTPUTS:
+        # pc - production cost [$]
+        return prod_cost_from_vertices(self, ti, sp)
+
     def update_production_costs(self, mkt):
         # Calculate the costs of generated energies.
         # (NOTE: Choosing not to separate this def from the base class because
@@ -515,52 +511,36 @@ class LocalAssetModel(Model, object):
 
         # Gather active time intervals ti
         time_intervals = mkt.timeIntervals
-        time_interval_values = [t.startTime for t in time_intervals]
+        time_interval_values = set([t.startTime for t in time_intervals])
         self.productionCosts = [x for x in self.productionCosts if x.timeInterval.startTime in time_interval_values]
 
-        # Index through the active time interval ti
-        for i in range(1, len(time_intervals)):
-            # Get the scheduled power sp in the indexed time interval
-            sp = find_obj_by_ti(self.scheduledPowers, time_intervals[i])
-            sp = sp.value  # schedule power [avg.kW]
+        # The production costs of the time intervals after the first are updated.
+        tis = list(time_intervals)[1:]
 
-            # Call on def that calculates production cost pc based on the
-            # vertices of the supply or demand curve
-            # NOTE that this def is now stand-alone because it might be
-            # generally useful for a number of models.
-            pc = prod_cost_from_vertices(self, time_intervals[i], sp)  # interval production cost [$]
+        if len(tis) > 0:
+            # Align the scheduled powers sp over the time intervals.
+            sp = aligned_values(self.scheduledPowers, tis)  # schedule powers [avg.kW]
 
-            # Check for a transition cost in the indexed time interval.
-            # (NOTE: this differs from neighbor models, which do not posses the
-            # concept of commitment and engagement. This is a good reason to keep
-            # this method within its base class to allow for subtle differences.)
-            tc = find_obj_by_ti(self.transitionCosts, time_intervals[i])
+            if type(self).production_cost != LocalAssetModel.production_cost:
+                # A subclass calculates its production costs one time interval
+                # at a time.
+                pc = np.array([self.production_cost(ti, p) for ti, p in zip(tis, sp)], dtype=float)
 
-            if tc is None:
-                tc = 0.0  # [$]
             else:
-                tc = tc.value  # [$]
+                # Calculate the production costs pc of all the time intervals
+                # from the vertices of the supply or demand curves.
+                mps, powers, counts, costs, continuous = vertex_rows(self, tis)
+                dur = [get_duration_in_hour(ti.duration) for ti in tis]  # [h]
+                pc = prod_cost_from_rows(mps, powers, costs, sp, dur)  # production costs [$]
 
-            # Add the transition cost to the production cost
+            # Add the transition costs, if any, to the production costs.
+            # (NOTE: this differs from neighbor models, which do not posses the
+            # concept of commitment and engagement. This is a good reason to keep
+            # this method within its base class to allow for subtle differences.)
+            tc = np.array(aligned_values(self.transitionCosts, tis, 0.0), dtype=float)  # [$]
             pc = pc + tc
 
-            # Check to see if the production cost value has been defined for the
-            # indexed time interval
-            iv = find_obj_by_ti(self.productionCosts, time_intervals[i])
-
-            if iv is None:
-                # The production cost value has not been defined in the indexed
-                # time interval. Create it and assign its value pc.
-                iv = IntervalValue(self, time_intervals[i], mkt, MeasurementType.ProductionCost, pc)
-
-                # Append the production cost to the list of active production
-                # cost values
-                self.productionCosts.append(iv)  # IntervalValues
-
-            else:
-                # The production cost value already exists in the indexed time
-                # interval. Simply reassign its value.
-                iv.value = pc  # interval production cost [$]
+            assign_values(self.productionCosts, self, tis, mkt, MeasurementType.ProductionCost, pc.tolist())
 
         # Ensure that only active time intervals are in the list of active
         # production costs apc
@@ -581,7 +561,7 @@ class LocalAssetModel(Model, object):
 
         # Gather active time intervals
         ti = mkt.timeIntervals  # active TimeIntervals
-        time_interval_values = [t.startTime for t in ti]
+        time_interval_values = set([t.startTime for t in ti])
         self.activeVertices = [x for x in self.activeVertices if x.timeInterval.startTime in time_interval_values]
 
         # Index through active time intervals ti
@@ -614,5 +594,26 @@ class LocalAssetModel(Model, object):
                 # assignment may be maintained.
                 iv.value = value
 
+            # Discard the vertices cached for the indexed time interval.
+            invalidate_vertices(self, ti[i])
+
         av = [(x.timeInterval.name, x.value.marginalPrice, x.value.power) for x in self.activeVertices]
         _log.debug("{} asset model active vertices are: {}".format(self.name, av))
+
+    def prune(self, cutoff):
+        # Discard interval values of time intervals that start before a cutoff
+        # time, including the asset's engagement schedule and transition costs.
+        super(LocalAssetModel, self).prune(cutoff)
+
+        self.engagementSchedule = retained_values(self.engagementSchedule, cutoff)
+        self.transitionCosts = retained_values(self.transitionCosts, cutoff)
+
+    def intervals_expired(self, mkt, tis):
+        # Remove the interval values of time intervals that are no longer
+        # active in the market, including the asset's engagement schedule and
+        # transition costs.
+        super(LocalAssetModel, self).intervals_expired(mkt, tis)
+
+        sts = set([x.startTime for x in tis])
+        self.engagementSchedule = [x for x in self.engagementSchedule if x.timeInterval.startTime not in sts]
+        self.transitionCosts = [x for x in self.transitionCosts if x.timeInterval.startTime not in sts]
@@ -58,17 +58,22 @@
 
 
 import gevent
+from collections import deque
 from datetime import datetime, timedelta
 import logging
 
+import numpy as np
+
 from volttron.platform.agent import utils
 
 from vertex import Vertex
+from vertex_set import VertexSet
 from helpers import *
 from measurement_type import MeasurementType
 from interval_value import IntervalValue
 from meter_point import MeterPoint
 from market_state import MarketState
+from model_dependency import ModelDependency
 from time_interval import TimeInterval
 from timer import Timer
 
@@ -90,7 +95,7 @@ class Market:
         self.commitment = False
         self.converged = False
 
-        self.method = 2  # Calculation method {1: subgradient, 2: interpolation}
+        self.method = 2  # Calculation method {1: subgradient, 2: interpolation, 3: bisection, 4: decomposed}
         self.marketOrder = 1  # ordering of sequential markets [pos. integer]
 
         self.activeVertices = []  # IntervalValue.empty  # values are vertices
@@ -98,12 +103,29 @@ class Market:
         self.blendedPrices2 = []  # IntervalValue.empty  # future
 
         self.defaultPrice = 0.05  # [$/kWh]
+        self.bisectionTolerance = 1e-6  # [$/kWh] price bracket width that ends a bisection search
         self.dualCosts = []  # IntervalValue.empty  # values are [$]
         self.dualityGapThreshold = 0.01  # [dimensionless, 0.01 = 1#]
         self.netPowers = []  # IntervalValue.empty  # values are [avg.kW]
         self.marginalPrices = []  # IntervalValue.empty  # values are [$/kWh]
         self.productionCosts = []  # IntervalValue.empty  # values are [$]
 
+        # Converged solutions of prior balances, keyed by interval start time.
+        # These warm-start new time intervals that overlap a prior horizon.
+        self.solutionPrices = {}  # {datetime: marginal price [$/kWh]}
+        self.solutionVertices = {}  # {datetime: [Vertex]} system vertices
+
+        # Data of time intervals that started longer than this before the
+        # first active time interval are discarded after each balance.
+        self.retentionWindow = timedelta(hours=0)
+
+        # Adaptive subgradient step (Method 1). The step is revised from the
+        # trend of the duality gaps of the latest balance iterations.
+        self.dualityGaps = []  # [dimensionless] latest first
+        self.subgradientStep = 0.1  # [dimensionless]
+        self.minSubgradientStep = 0.001  # [dimensionless]
+        self.maxSubgradientStep = 1.0  # [dimensionless]
+
         self.totalDemand = []  # IntervalValue.empty  # [avg.kW]
         self.totalDualCost = 0.0  # [$]
         self.totalGeneration = []  # IntervalValue.empty  # [avg.kW]
@@ -115,7 +137,18 @@ class Market:
         self.futureHorizon = timedelta(hours=24)
         self.intervalDuration = timedelta(hours=1)
         self.intervalsToClear = 1  # postitive integer
-        self.timeIntervals = []  # TimeInterval.empty
+
+        # Spans of a non-uniform horizon and the durations of their intervals,
+        # [(span timedelta, interval duration timedelta)]. The horizon is
+        # uniform if empty. See horizon_steps().
+        self.horizonSchedule = []
+        self.timeIntervals = deque()  # TimeInterval.empty  # rolling horizon ordered by start time
+        self.intervalNames = {}  # {name: TimeInterval} see find_interval()
+        self.intervalNamesSource = None  # the time intervals indexed in intervalNames
+
+        # Instrumentation of the balance phases and iterations. Assign a
+        # BalanceProfiler to enable it.
+        self.profiler = None  # BalanceProfiler
 
         self.new_data_signal = False
 
@@ -133,7 +166,7 @@ class Market:
         # include meaningful, accurate production-cost information.
         # - There is agreement locally and in the network concerning the format
         # and content of transactive records
-        # - Calls method mkt.sum_vertices in each time interval.
+        # - Calls method mkt.sum_vertices_vectorized in each time interval.
         #
         # INPUTS:
         # mtn - myTransactiveNode object
@@ -148,20 +181,16 @@ class Market:
         # - power: system net power at the vertex (The system "clears" where
         #   system net power is zero.)
 
-        time_interval_values = [t.startTime for t in self.timeIntervals]
-        # Delete any active vertices that are not in active time intervals. This
-        # prevents time intervals from accumulating indefinitely.
-        self.activeVertices = [x for x in self.activeVertices if x.timeInterval.startTime in time_interval_values]
+        # Delete the existing aggregate active vertices. Those of the active
+        # time intervals shall be recreated, and those of inactive time
+        # intervals must not accumulate indefinitely.
+        self.activeVertices = []
 
         for ti in self.timeIntervals:
-            # Find and delete existing aggregate active vertices in the indexed
-            # time interval. These shall be recreated.
-            self.activeVertices = [x for x in self.activeVertices if x.timeInterval.startTime != ti.startTime]
-
             # Call the utility method mkt.sum_vertices to recreate the
             # aggregate vertices in the indexed time interval. (This method is
             # separated out because it will be used by other methods.)
-            s_vertices = self.sum_vertices(mtn, ti)
+            s_vertices = self.sum_vertices_vectorized(mtn, ti)
 
             # Create and store interval values for each new aggregate vertex v
             for sv in s_vertices:
@@ -176,17 +205,65 @@ class Market:
         """
         self.new_data_signal = False
 
+        if self.profiler is not None:
+            self.profiler.start()
+
         # Check and update the time intervals at the begining of the process.
         # This should not need to be repeated in process iterations.
-        self.check_intervals()
+        self.run_phase('check_intervals', self.check_intervals, mtn)
 
         # Clean up or initialize marginal prices. This should not be
         # repeated in process iterations.
-        self.check_marginal_prices()
+        self.run_phase('check_marginal_prices', self.check_marginal_prices)
+
+        # Forecasts may have changed since the last balance. Have the models
+        # that depend on them recalculate once in this balance.
+        for x in mtn.neighbors + mtn.localAssets:
+            if x.model.dependency == ModelDependency.ForecastDependent:
+                x.model.mark_dirty()
 
         # Set a flag to indicate an unconverged condition.
         self.converged = False
 
+        # Clear the duality gaps of any prior balance.
+        self.dualityGaps = []
+
+        if self.method == 4 and self.is_decomposable(mtn):
+            # The time intervals are independent. Balance them together.
+            self.balance_decomposed(mtn)
+
+            if not self.converged and not self.new_data_signal:
+                # The duality gap remains above its threshold. Iterate from the
+                # decomposed marginal prices using the bisection of Method 3.
+                _log.debug("{} decomposed balance did not converge (dg: {}). Iterating."
+                           .format(self.name, self.dualityGaps[0]))
+                self.balance_iterations(mtn)
+
+        else:
+            self.balance_iterations(mtn)
+
+        # Keep the solution to warm-start the overlapping time intervals of
+        # the next balance. This is done however the balance ended, even if it
+        # was interrupted by new data.
+        self.save_solution()
+
+        # Discard the data of time intervals that are past retention.
+        self.run_phase('prune', self.prune, mtn)
+
+        self.stop_profiler()
+
+    def balance_iterations(self, mtn):
+        # Iterate the market balance to convergence using the calculation
+        # method mkt.method. The iterations stop early if new data arrives
+        # (see mkt.new_data_signal) or if Method 2 cannot find a balance point.
+        #
+        # INPUTS:
+        # mtn - myTransactiveNode object
+        #
+        # OUTPUTS:
+        # - Updates mkt.marginalPrices, the models' schedules, the market's
+        #   costs, supply and demand, duality gaps, and convergence flag
+
         # Iterate to convergence. "Convergence" here refers to the status of the
         # local convergence of (1) local supply and demand and (2) dual costs.
         # This local convergence says nothing about the additional convergence
@@ -202,25 +279,21 @@ class Market:
 
             # Invite all neighbors and local assets to schedule themselves
             # based on current marginal prices
-            self.schedule(mtn)
+            self.run_phase('schedule', self.schedule, mtn)
 
             # Update the primal and dual costs for each time interval and
             # altogether for the entire time horizon.
-            self.update_costs(mtn)
+            self.run_phase('update_costs', self.update_costs, mtn)
 
             # Update the total supply and demand powers for each time interval.
             # These sums are needed for the sub-gradient search and for the
             # calculation of blended price.
-            self.update_supply_demand(mtn)
+            self.run_phase('update_supply_demand', self.update_supply_demand, mtn)
 
             # Check duality gap for convergence.
             # Calculate the duality gap, defined here as the relative difference
             # between total production and dual costs
-            if self.totalProductionCost == 0:
-                dg = float("inf")
-            else:
-                dg = self.totalProductionCost - self.totalDualCost  # [$]
-                dg = dg / self.totalProductionCost  # [dimensionless. 0.01 is 1#]
+            dg = self.duality_gap()
 
             # Display the iteration counter and duality gap. This may be
             # commented out once we have confidence in the convergence of the
@@ -228,6 +301,10 @@ class Market:
             _log.debug("Market balance iteration %i: (tpc: %f, tdc: %f, dg: %f)" %
                        (k, self.totalProductionCost, self.totalDualCost, dg))
 
+            # Revise the subgradient step from the trend of the duality gaps.
+            self.dualityGaps.insert(0, dg)
+            self.update_subgradient_step()
+
             # Check convergence condition
             if abs(dg) <= self.dualityGapThreshold:  # Converged
                 # 1.3.1 System has converged to an acceptable balance.
@@ -265,12 +342,33 @@ class Market:
             # intervals and scheduling of the individual Neighbors and LocalAssets.
             # This method might fail when many assets do complex scheduling of
             # their flexibilty.
+            #
+            # Method 3: Bisection - Net power is monotonic in marginal price in
+            # each time interval. The marginal price is bracketed by the vertices
+            # of the aggregated net power curve and bisected until the bracket is
+            # narrower than the bisection tolerance (see bisect_marginal_price()).
+            # Convergence is guaranteed within a few tens of cheap evaluations of
+            # the net power curve. The iterations stop once the marginal prices
+            # no longer change by more than the bisection tolerance.
+            #
+            # Method 4: Decomposed - If no model declares that its vertices in
+            # one time interval depend on its schedule in others (see
+            # Model.intervalCoupled), the time intervals are independent once
+            # the models have exposed their vertices. All time intervals are then
+            # bisected together as a batch (see balance_decomposed()). Otherwise,
+            # the coupled iterations of Method 3 are used.
 
             if self.method == 2:
-                self.assign_system_vertices(mtn)
+                self.run_phase('assign_system_vertices', self.assign_system_vertices, mtn)
                 av = [(x.timeInterval.name, x.value.marginalPrice, x.value.power) for x in self.activeVertices]
                 _log.debug("{} market active vertices are: {}".format(self.name, av))
 
+            # Keep track of the largest change in marginal price.
+            max_price_change = 0.0  # [$/kWh]
+
+            if self.profiler is not None:
+                t0 = self.profiler.tic()
+
             # Index through active time intervals.
             for i in range(len(tis)):
                 # Find the marginal price interval value for the
@@ -282,14 +380,14 @@ class Market:
 
                 if self.method == 1:
                     # Find the net power corresponding to the indexed time interval.
-                    np = find_obj_by_ti(self.netPowers, tis[i])
+                    net_power = find_obj_by_ti(self.netPowers, tis[i])
                     tg = find_obj_by_ti(self.totalGeneration, tis[i])
                     td = find_obj_by_ti(self.totalDemand, tis[i])
 
-                    np = np.value / (tg.value - td.value)
+                    net_power = net_power.value / (tg.value - td.value)
 
                     # Update the marginal price using subgradient search.
-                    xlamda = xlamda - (np * 1e-1) / (10 + k)  # [$/kWh]
+                    xlamda = xlamda - (net_power * self.subgradientStep) / (10 + k)  # [$/kWh]
 
                 elif self.method == 2:
                     # Get the indexed active system vertices
@@ -331,11 +429,27 @@ class Market:
                         self.converged = False
                         return
 
+                elif self.method == 3 or self.method == 4:
+                    # Bisect the aggregated net power curve of the indexed
+                    # time interval.
+                    xlamda = self.bisect_marginal_price(mtn, tis[i])
+
                 # Regardless of the method used, variable "xlamda" should now hold
                 # the updated marginal price. Assign it to the marginal price
                 # value for the indexed active time interval.
+                max_price_change = max(max_price_change, abs(xlamda - mp.value))  # [$/kWh]
                 mp.value = xlamda  # [$/kWh]
 
+            # The bisection method has converged when the marginal prices are
+            # no longer being revised.
+            if self.method in (3, 4) and max_price_change <= self.bisectionTolerance:
+                self.converged = True
+
+            if self.profiler is not None:
+                self.profiler.toc('update_prices', t0)
+                self.profiler.record_iteration(k, dg, self.totalProductionCost, self.totalDualCost,
+                                               max_price_change, self.converged)
+
             # Increment the iteration counter.
             k = k + 1
             if k == 100:
@@ -345,6 +459,259 @@ class Market:
                 self.converged = False
                 return
 
+    def run_phase(self, phase, method, *args):
+        # Call a phase of the balance, timing it if the market has a profiler
+        # (see class BalanceProfiler).
+        if self.profiler is None:
+            return method(*args)
+
+        t0 = self.profiler.tic()
+        result = method(*args)
+        self.profiler.toc(phase, t0)
+        return result
+
+    def stop_profiler(self):
+        # Finish the profile of a balance, if the market has a profiler.
+        if self.profiler is not None:
+            self.profiler.stop(self.name)
+
+    def duality_gap(self):
+        # Calculate the duality gap, defined here as the relative difference
+        # between total production and dual costs.
+        #
+        # OUTPUTS:
+        # dg - duality gap [dimensionless. 0.01 is 1#]
+        if self.totalProductionCost == 0:
+            return float("inf")
+
+        dg = self.totalProductionCost - self.totalDualCost  # [$]
+        return dg / self.totalProductionCost  # [dimensionless. 0.01 is 1#]
+
+    def is_decomposable(self, mtn):
+        # Check whether the time intervals may be balanced independently. This
+        # is true if none of the neighbor and local asset models declares that
+        # its vertices couple the time intervals (see Model.intervalCoupled).
+        models = [x.model for x in mtn.neighbors] + [x.model for x in mtn.localAssets]
+        return not any([getattr(x, 'intervalCoupled', False) for x in models])
+
+    def balance_decomposed(self, mtn):
+        # Balance all active time intervals together when they are independent.
+        #
+        # The models schedule themselves once to expose their vertices. The
+        # balance marginal prices of all time intervals are then found by a
+        # single batch bisection (see bisect_marginal_prices()), and the models
+        # are scheduled once more at those prices. The balance has converged
+        # only if the duality gap is then within its threshold. Otherwise,
+        # balance() continues with the iterations of Method 3.
+        #
+        # INPUTS:
+        # mtn - myTransactiveNode object
+        #
+        # OUTPUTS:
+        # - Updates mkt.marginalPrices, the models' schedules, and the market's
+        #   costs, supply and demand, duality gaps, and convergence flag
+
+        tis = list(self.timeIntervals)
+
+        # Have the models expose their vertices at the current marginal prices.
+        self.run_phase('schedule', self.schedule, mtn)
+
+        if self.new_data_signal:
+            self.converged = False
+            return
+
+        prices = self.run_phase('update_prices', self.bisect_marginal_prices, mtn, tis)
+
+        for ti, price in zip(tis, prices):
+            mp = find_obj_by_ti(self.marginalPrices, ti)
+            mp.value = price  # [$/kWh]
+
+        # Have the models schedule themselves at the balance prices.
+        self.run_phase('schedule', self.schedule, mtn)
+
+        if self.new_data_signal:
+            self.converged = False
+            return
+
+        self.run_phase('update_costs', self.update_costs, mtn)
+        self.run_phase('update_supply_demand', self.update_supply_demand, mtn)
+
+        # The balance has converged only if the duality gap is acceptable.
+        dg = self.duality_gap()
+        self.dualityGaps.insert(0, dg)
+        self.converged = abs(dg) <= self.dualityGapThreshold
+
+        _log.debug("Market decomposed balance: (tpc: %f, tdc: %f, dg: %f)" %
+                   (self.totalProductionCost, self.totalDualCost, dg))
+
+        if self.profiler is not None:
+            self.profiler.record_iteration(0, dg, self.totalProductionCost, self.totalDualCost, None,
+                                           self.converged)
+
+    def bisect_marginal_prices(self, mtn, tis):
+        # Batch equivalent of bisect_marginal_price(). Find the balance
+        # marginal prices of many time intervals at once. Each time interval is
+        # bracketed and bisected exactly as by bisect_marginal_price(), but the
+        # net power curves of all the time intervals are evaluated together.
+        #
+        # INPUTS:
+        # mtn - myTransactiveNode object
+        # tis - list of active time intervals
+        #
+        # OUTPUTS:
+        # prices - list of balancing marginal prices [$/kWh], one per time interval
+
+        if len(tis) == 0:
+            return []
+
+        # Gather the ordered vertex arrays of the neighbor and local asset
+        # models, one row per time interval.
+        models = [x.model for x in mtn.neighbors] + [x.model for x in mtn.localAssets]
+        curves = [vertex_rows(x, tis) for x in models]
+
+        def net_power(prices):
+            power = np.zeros(len(tis))  # [avg.kW]
+            for c in curves:
+                power = power + production_from_rows(c[0], c[1], prices, c[4])
+            return power
+
+        # Bracket the balance points with the finite vertex marginal prices.
+        lower_price = np.full(len(tis), np.inf)  # [$/kWh]
+        upper_price = np.full(len(tis), -np.inf)  # [$/kWh]
+        for c in curves:
+            finite = np.isfinite(c[0]) & (c[2] > 1)[:, None]
+            lower_price = np.minimum(lower_price, np.where(finite, c[0], np.inf).min(axis=1))
+            upper_price = np.maximum(upper_price, np.where(finite, c[0], -np.inf).max(axis=1))
+
+        # Time intervals without price-responsive vertices keep their current
+        # marginal prices.
+        responsive = np.isfinite(lower_price)
+        current = np.array([find_obj_by_ti(self.marginalPrices, ti).value for ti in tis], dtype=float)
+        lower_price = np.where(responsive, lower_price, current)
+        upper_price = np.where(responsive, upper_price, current)
+
+        lower_power = net_power(lower_price)  # [avg.kW]
+        upper_power = net_power(upper_price)  # [avg.kW]
+
+        # Time intervals having a surplus at the lowest marginal price or a
+        # deficit at the greatest marginal price need no bisection.
+        surplus = lower_power >= 0
+        deficit = upper_power < 0
+
+        for i in np.flatnonzero(responsive & deficit & ~surplus):
+            _log.warning("At {}, net power is less than zero at all marginal prices.".format(tis[i].name))
+
+        for i in np.flatnonzero(~responsive):
+            _log.warning("At {}, no price-responsive vertices were found. "
+                         "Marginal price was not revised.".format(tis[i].name))
+
+        # Bisect the brackets together. A bracket is frozen once it is narrower
+        # than the bisection tolerance.
+        bisect = responsive & ~surplus & ~deficit
+        k = 0
+        while k < 100:
+            active = bisect & (upper_price - lower_price > self.bisectionTolerance)
+            if not active.any():
+                break
+
+            price = 0.5 * (lower_price + upper_price)  # [$/kWh]
+            power = net_power(price)  # [avg.kW]
+
+            lower = active & (power < 0)
+            upper = active & (power >= 0)
+            lower_price = np.where(lower, price, lower_price)
+            lower_power = np.where(lower, power, lower_power)
+            upper_price = np.where(upper, price, upper_price)
+            upper_power = np.where(upper, power, upper_power)
+
+            k = k + 1
+
+        # Interpolate the balance points within the narrow brackets.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prices = lower_price - lower_power * (upper_price - lower_price) / (upper_power - lower_power)
+        prices = np.where(upper_power == lower_power, upper_price, prices)
+
+        prices = np.where(surplus, lower_price, prices)
+        prices = np.where(deficit & ~surplus, upper_price, prices)
+        prices = np.where(responsive, prices, current)
+
+        return prices.tolist()
+
+    def bisect_marginal_price(self, mtn, ti):
+        # Find the marginal price at which the net power of all neighbor and
+        # local asset models balances in a time interval.
+        #
+        # Net power is a monotonic, piecewise-linear function of marginal price
+        # that is defined by the models' active vertices. The balance price is
+        # bracketed by the least and greatest finite vertex marginal prices and
+        # then bisected until the bracket is narrower than
+        # mkt.bisectionTolerance. Each evaluation of net power is cheap because
+        # the ordered vertex arrays are gathered only once.
+        #
+        # INPUTS:
+        # mtn - myTransactiveNode object
+        # ti - the active time interval
+        #
+        # OUTPUTS:
+        # price - balancing marginal price [$/kWh]. If net power cannot reach
+        # zero, the marginal price at the nearest end of the bracket is used.
+
+        # Gather the ordered vertex arrays of the neighbor and local asset models
+        models = [x.model for x in mtn.neighbors] + [x.model for x in mtn.localAssets]
+        curves = [vertex_arrays(x, ti) + (vertex_continuity(x, ti),) for x in models]
+
+        for model, curve in zip(models, curves):
+            if len(curve[0]) == 0:
+                raise Exception(' '.join(['No active vertices were found for', model.name,
+                                          'in time interval', ti.name]))
+
+        def net_power(price):
+            return sum([float(production_from_arrays(x[0], x[1], price, x[3])) for x in curves])  # [avg.kW]
+
+        # Bracket the balance point with the finite vertex marginal prices.
+        mps = [x for c in curves if len(c[0]) > 1 for x in c[0].tolist() if abs(x) != float("inf")]
+
+        if len(mps) == 0:
+            # No model is price-responsive. Keep the current marginal price.
+            _log.warning("At {}, no price-responsive vertices were found. "
+                         "Marginal price was not revised.".format(ti.name))
+            return find_obj_by_ti(self.marginalPrices, ti).value
+
+        lower_price = min(mps)  # [$/kWh]
+        upper_price = max(mps)  # [$/kWh]
+        lower_power = net_power(lower_price)  # [avg.kW]
+        upper_power = net_power(upper_price)  # [avg.kW]
+
+        if lower_power >= 0:
+            # There is surplus power even at the lowest marginal price.
+            return lower_price
+
+        if upper_power < 0:
+            # There is a power deficit even at the greatest marginal price.
+            _log.warning("At {}, net power is less than zero at all marginal prices.".format(ti.name))
+            return upper_price
+
+        # Bisect the bracket. Net power is below zero at the lower price and at
+        # or above zero at the upper price.
+        k = 0
+        while upper_price - lower_price > self.bisectionTolerance and k < 100:
+            price = 0.5 * (lower_price + upper_price)  # [$/kWh]
+            power = net_power(price)  # [avg.kW]
+
+            if power < 0:
+                lower_price, lower_power = price, power
+            else:
+                upper_price, upper_power = price, power
+
+            k = k + 1
+
+        # Net power is linear within the narrow bracket unless it lies on a
+        # vertical step. Interpolate the balance point.
+        if upper_power == lower_power:
+            return upper_price
+
+        return lower_price - lower_power * (upper_price - lower_price) / (upper_power - lower_power)
+
     def calculate_blended_prices(self):
         # Calculate the blended prices for active time intervals.
         #
@@ -394,7 +761,8 @@ class Market:
 
         elif len(ti) < len(pc):
             _log.warning('Removing primal costs that are not among active time intervals.')
-            self.productionCosts = [x for x in self.productionCosts if x.timeInterval in self.timeIntervals]
+            sts = set([x.startTime for x in self.timeIntervals])
+            self.productionCosts = [x for x in self.productionCosts if x.timeInterval.startTime in sts]
 
         for i in range(len(ti)):
             pc = find_obj_by_ti(self.productionCosts, ti[i])
@@ -413,63 +781,281 @@ class Market:
         self.marketClearingTime = cur_time.replace(minute=0, second=0, microsecond=0)
         self.nextMarketClearingTime = self.marketClearingTime + timedelta(hours=1)
 
-    def check_intervals(self):
+    def horizon_steps(self, cur_time):
+        # Find the start times and durations of the time intervals that
+        # should be active at a time.
+        #
+        # By default, the horizon is uniform: intervals of mkt.intervalDuration
+        # start every mkt.marketClearingInterval from the current interval up
+        # to mkt.futureHorizon. If mkt.horizonSchedule is given, the horizon is
+        # made of its consecutive spans instead, each divided into intervals of
+        # its own duration, e.g., [(timedelta(hours=2), timedelta(minutes=15)),
+        # (timedelta(hours=22), timedelta(hours=1))] for 15-minute intervals
+        # over the first two hours and hourly intervals after that. Each
+        # interval starts at a multiple of its duration since midnight. The
+        # intervals of a span continue until the next span's intervals can
+        # start on such a multiple.
+        #
+        # INPUTS:
+        # cur_time - the current datetime
+        #
+        # OUTPUTS:
+        # steps - list of (start time, duration) of the intervals, ordered by
+        #         start time
+
+        steps = []
+        self.update_market_clearing_time(cur_time)
+
+        if len(self.horizonSchedule) == 0:
+            # steps = datetime(mkt.marketClearingTime): Hours(mkt.marketClearingInterval): datetime + Hours(mkt.futureHorizon)
+            # steps = steps(steps > datetime - Hours(mkt.marketClearingInterval))
+            end_time = cur_time + self.futureHorizon
+            step_time = self.marketClearingTime
+            while step_time < end_time:
+                if step_time > cur_time - self.marketClearingInterval:
+                    steps.append((step_time, self.intervalDuration))
+                step_time = step_time + self.marketClearingInterval
+
+            return steps
+
+        # The horizon begins with the current interval of the first span.
+        step_time = floor_time(cur_time, self.horizonSchedule[0][1])
+        end_time = step_time
+        prior_duration = None
+
+        for span, duration in self.horizonSchedule:
+            end_time = end_time + span
+
+            while step_time < end_time:
+                # Continue the prior span's intervals until this span's
+                # intervals may start.
+                if prior_duration is not None and floor_time(step_time, duration) != step_time:
+                    steps.append((step_time, prior_duration))
+                    step_time = step_time + prior_duration
+                else:
+                    steps.append((step_time, duration))
+                    step_time = step_time + duration
+
+            prior_duration = duration
+
+        return steps
+
+    def check_intervals(self, mtn=None):
         # Check or create the set of instantiated TimeIntervals in this Market
+        #
+        # The active time intervals are a rolling window (a deque ordered by
+        # start time) of the steps of the horizon (see horizon_steps()).
+        # Intervals that start before the horizon expire. So do intervals
+        # that conflict with its steps, e.g., an hourly interval that must be
+        # divided into 15-minute intervals as it nears. New time intervals are
+        # created for the steps that have none. The models of the node's
+        # neighbors and local assets are told of each added and expired time
+        # interval so that they may prune their own per-interval state.
+        #
+        # INPUTS:
+        # mtn - myTransactiveNode object (optional) whose neighbor and local
+        #       asset models receive the interval events
 
         # Create the array "steps" of time intervals that should be active.
-        # steps = datetime(mkt.marketClearingTime): Hours(mkt.marketClearingInterval): datetime + Hours(mkt.futureHorizon)
-        # steps = steps(steps > datetime - Hours(mkt.marketClearingInterval))
-        steps = []
         cur_time = Timer.get_cur_time()
-        end_time = cur_time + self.futureHorizon
-        self.update_market_clearing_time(cur_time)
-        step_time = self.marketClearingTime
-        while step_time < end_time:
-            if step_time > cur_time - self.marketClearingInterval:
-                steps.append(step_time)
-            step_time = step_time + self.marketClearingInterval
-
-        # Keep only time intervals >= steps[0]
-        if len(steps) > 0:
-            self.timeIntervals = [ti for ti in self.timeIntervals if ti.startTime >= steps[0]]
-
-        # Index through the needed TimeIntervals based on their start times.
-        for i in range(len(steps)):
-            # This is a test to semarketClearingTimee whether the interval exists.
-            # Case 0: a new interval must be created
-            # Case 1: There is one match, the TimeInterval exists
-            # Otherwise: Duplicates exists and should be deleted.
-            tis = [x for x in self.timeIntervals if x.startTime == steps[i]]
-            tis_len = len(tis)
-
-            # No match was found. Create a new TimeInterval.
-            if tis_len == 0:
-                # Create a new TimeInterval
-                activation_time = steps[i] - self.futureHorizon
-                duration = self.intervalDuration
-                market_clearing_time = steps[i]
-                st = steps[i]  # startTime
-
-                ti = TimeInterval(activation_time, duration, self, market_clearing_time, st)
-                self.timeIntervals.append(ti)
-
-            # The TimeInterval already exists.
-            elif tis_len == 1:
-                # Find the TimeInterval and check its market state assignment.
-                tis[0].assign_state(self)  # ti.assign_state(mkt)
-
-            # Duplicate time intervals exist. Remove all but one.
-            else:
-                self.timeIntervals = [x for x in self.timeIntervals if x.startTime != steps[i]]
-                self.timeIntervals.append(tis[0])
-                tis[0].assign_state(self)
+        steps = self.horizon_steps(cur_time)
+
+        # The time intervals may have been assigned as a plain list. Order them
+        # by start time into a deque and remove any duplicates.
+        if not isinstance(self.timeIntervals, deque):
+            tis = deque()
+            for ti in sorted(self.timeIntervals, key=lambda x: x.startTime):
+                if len(tis) == 0 or tis[-1].startTime != ti.startTime:
+                    tis.append(ti)
+            self.timeIntervals = tis
+
+        if mtn is None:
+            models = []
+        else:
+            models = [x.model for x in mtn.neighbors] + [x.model for x in mtn.localAssets]
+
+        if len(steps) == 0:
+            for ti in self.timeIntervals:
+                ti.assign_state(self)  # ti.assign_state(mkt)
+            return
+
+        tis = self.timeIntervals
+        horizon_start = steps[0][0]
+        horizon_end = steps[-1][0] + steps[-1][1]
+        expired = []
+        added = []
+
+        # Roll the horizon. The time intervals that start before steps[0]
+        # expire from the left of the deque.
+        while len(tis) > 0 and tis[0].startTime < horizon_start:
+            expired.append(tis.popleft())
+
+        # The remaining time intervals are usually the leading steps of the
+        # horizon. Count those that match.
+        n = 0
+        while n < len(tis) and n < len(steps) and (tis[n].startTime, tis[n].duration) == steps[n]:
+            n = n + 1
+
+        if n == len(tis):
+            # The time intervals of existing steps are kept. Check their
+            # market state assignments, and append new TimeIntervals for the
+            # steps that follow on the right.
+            for ti in tis:
+                ti.assign_state(self)  # ti.assign_state(mkt)
+
+            for st, duration in steps[n:]:
+                ti = self.new_interval(st, duration)
+                tis.append(ti)
+                added.append(ti)
+
+        else:
+            # The steps no longer match the time intervals, e.g., an hourly
+            # interval must be divided into 15-minute intervals as it nears, or
+            # intervals lie beyond the horizon. Expire those within the horizon
+            # that are not among its steps, and rebuild the deque.
+            step_set = set(steps)
+            existing = {}
+
+            for ti in tis:
+                if ti.startTime < horizon_end and (ti.startTime, ti.duration) not in step_set:
+                    expired.append(ti)
+                else:
+                    existing[ti.startTime] = ti
+
+            tis = deque()
+
+            for st, duration in steps:
+                ti = existing.pop(st, None)
+
+                if ti is not None:
+                    # The time interval already exists. Check its market state
+                    # assignment.
+                    ti.assign_state(self)  # ti.assign_state(mkt)
+
+                else:
+                    ti = self.new_interval(st, duration)
+                    added.append(ti)
+
+                tis.append(ti)
+
+            # Time intervals beyond the horizon are kept.
+            for ti in sorted(existing.values(), key=lambda x: x.startTime):
+                ti.assign_state(self)
+                tis.append(ti)
+
+            self.timeIntervals = tis
+
+        # Remove the interval values of the expired time intervals, once for
+        # all of them.
+        if len(expired) > 0:
+            self.intervals_expired(expired)
+            for model in models:
+                model.intervals_expired(self, expired)
+
+        for ti in added:
+            # Restore the system vertices of a prior solution, if any, for
+            # the new time interval.
+            for sv in self.solutionVertices.get(ti.startTime, []):
+                iv = IntervalValue(self, ti, self, MeasurementType.SystemVertex, sv)
+                self.activeVertices.append(iv)
+
+            for model in models:
+                model.interval_added(self, ti)
+
+        # Index the active time intervals by name.
+        self.intervalNames = dict([(x.name, x) for x in self.timeIntervals])
+        self.intervalNamesSource = self.timeIntervals
+
+    def new_interval(self, st, duration):
+        # Create a new TimeInterval of this market.
+        #
+        # INPUTS:
+        # st - start time of the interval [datetime]
+        # duration - duration of the interval [timedelta]
+        #
+        # OUTPUTS:
+        # ti - the new TimeInterval
+        activation_time = st - self.futureHorizon
+        market_clearing_time = st
+
+        return TimeInterval(activation_time, duration, self, market_clearing_time, st)
+
+    def find_interval(self, name):
+        # Find an active time interval by its name (see TimeInterval.name).
+        #
+        # The lookup is kept in mkt.intervalNames. It is rebuilt whenever it
+        # does not cover the active time intervals, e.g., after the time
+        # intervals are assigned directly, even by a list of the same length.
+        #
+        # INPUTS:
+        # name - time interval name, as in TransactiveRecord.timeInterval
+        #
+        # OUTPUTS:
+        # ti - the active TimeInterval having the name, or None
+
+        ti = self.intervalNames.get(name)
+
+        if ti is None or self.intervalNamesSource is not self.timeIntervals \
+                or len(self.intervalNames) != len(self.timeIntervals):
+            self.intervalNames = dict([(x.name, x) for x in self.timeIntervals])
+            self.intervalNamesSource = self.timeIntervals
+            ti = self.intervalNames.get(name)
+
+        return ti
+
+    def prune(self, mtn):
+        # Discard the interval values, vertices, and transactive records of
+        # time intervals that started more than mkt.retentionWindow before the
+        # first active time interval. This bounds the lists that the market
+        # and the node's models otherwise scan in every iteration.
+        #
+        # INPUTS:
+        # mtn - myTransactiveNode object
+
+        if len(self.timeIntervals) == 0:
+            return
+
+        cutoff = min([x.startTime for x in self.timeIntervals]) - self.retentionWindow  # datetime
+
+        self.activeVertices = retained_values(self.activeVertices, cutoff)
+        self.blendedPrices1 = retained_values(self.blendedPrices1, cutoff)
+        self.blendedPrices2 = retained_values(self.blendedPrices2, cutoff)
+        self.dualCosts = retained_values(self.dualCosts, cutoff)
+        self.marginalPrices = retained_values(self.marginalPrices, cutoff)
+        self.netPowers = retained_values(self.netPowers, cutoff)
+        self.productionCosts = retained_values(self.productionCosts, cutoff)
+        self.totalDemand = retained_values(self.totalDemand, cutoff)
+        self.totalGeneration = retained_values(self.totalGeneration, cutoff)
+
+        for x in mtn.neighbors + mtn.localAssets:
+            x.model.prune(cutoff)
+
+    def intervals_expired(self, tis):
+        # Remove the market's interval values of expired time intervals.
+        #
+        # INPUTS:
+        # tis - list of the expired TimeIntervals
+
+        sts = set([x.startTime for x in tis])
+        self.activeVertices = [x for x in self.activeVertices if x.timeInterval.startTime not in sts]
+        self.dualCosts = [x for x in self.dualCosts if x.timeInterval.startTime not in sts]
+        self.marginalPrices = [x for x in self.marginalPrices if x.timeInterval.startTime not in sts]
+        self.netPowers = [x for x in self.netPowers if x.timeInterval.startTime not in sts]
+        self.productionCosts = [x for x in self.productionCosts if x.timeInterval.startTime not in sts]
+        self.totalDemand = [x for x in self.totalDemand if x.timeInterval.startTime not in sts]
+        self.totalGeneration = [x for x in self.totalGeneration if x.timeInterval.startTime not in sts]
 
     def check_marginal_prices(self):
         # Check that marginal prices exist for active time intervals. If they do
         # not exist for a time interval, choose from these alternatives that are
         # ordered from best to worst:
-        # (1) initialize the marginal price from that of the preceding interval.
-        # (2) use the default marginal price.
+        # (1) initialize the marginal price from a prior solution having the
+        # same interval start time, e.g., for an interval that replaces a
+        # divided or merged interval of a variable-resolution horizon.
+        # (2) initialize the marginal price from that of the preceding active
+        # interval. In a rolling horizon, the new interval at its far end is
+        # thus seeded from the latest price of its predecessor.
+        # (3) use the default marginal price.
         # OUTPUTS:
         # populates list of active marginal prices (see class IntervalValue)
 
@@ -477,7 +1063,8 @@ class Market:
 
         # Clean up the list of active marginal prices. Remove any active
         # marginal prices that are not in active time intervals.
-        self.marginalPrices = [x for x in self.marginalPrices if x.timeInterval in ti]
+        sts = set([x.startTime for x in ti])
+        self.marginalPrices = [x for x in self.marginalPrices if x.timeInterval.startTime in sts]
 
         # Index through active time intervals ti
         for i in range(len(ti)):
@@ -491,17 +1078,22 @@ class Market:
                 # Extract the starting time st of the currently indexed time interval
                 st = ti[i].startTime
 
-                # Calculate the starting time st of the previous time interval
-                st = st - ti[i].duration
-
-                # Find the prior active time interval pti that has this
-                # calculated starting time
-                pti = find_obj_by_st(self.timeIntervals, st)  # prior time interval
+                # Find the prior active time interval pti. Durations may
+                # differ across the horizon.
+                pti = None  # prior time interval
+                if i > 0:
+                    pti = ti[i - 1]
 
                 # Initialize previous marginal price value pmp as an empty set
                 pmp = None  # prior marginal prices
 
-                if pti is not None:
+                if st in self.solutionPrices:
+                    # A prior balance solved this time interval. Warm-start
+                    # from its marginal price.
+                    pmp = IntervalValue(self, ti[i], self, MeasurementType.MarginalPrice,
+                                        self.solutionPrices[st])
+
+                elif pti is not None:
                     # There is an active preceding time interval. Check whether
                     # there is an active marginal price in the previous time interval.
                     pmp = find_obj_by_ti(self.marginalPrices, pti)
@@ -526,6 +1118,56 @@ class Market:
                 # Append the marginal price value to the list of active marginal prices
                 self.marginalPrices.append(iv)
 
+    def save_solution(self):
+        # Save the marginal prices and system vertices of the active time
+        # intervals so that they may warm-start the next balance.
+        #
+        # OUTPUTS:
+        # - Updates mkt.solutionPrices and mkt.solutionVertices, keyed by
+        #   interval start time. Solutions of expired intervals are removed.
+
+        sts = [x.startTime for x in self.timeIntervals]
+
+        if len(sts) == 0:
+            return
+
+        # Remove solutions of time intervals that have expired.
+        first_st = min(sts)
+        self.solutionPrices = {k: v for k, v in self.solutionPrices.items() if k >= first_st}
+        self.solutionVertices = {k: v for k, v in self.solutionVertices.items() if k >= first_st}
+
+        for mp in self.marginalPrices:
+            self.solutionPrices[mp.timeInterval.startTime] = mp.value  # [$/kWh]
+
+        for st in sts:
+            svs = [x.value for x in self.activeVertices if x.timeInterval.startTime == st]
+            if len(svs) > 0:
+                self.solutionVertices[st] = svs
+
+    def update_subgradient_step(self):
+        # Adapt the subgradient step size to the trend of the latest duality
+        # gaps (see mkt.dualityGaps). The step is enlarged while the gap
+        # shrinks steadily and reduced when the gap grows or changes sign,
+        # which indicates that the marginal prices overshot the balance.
+
+        if len(self.dualityGaps) < 2:
+            return
+
+        dg = self.dualityGaps[0]  # [dimensionless]
+        pdg = self.dualityGaps[1]  # [dimensionless]
+
+        if abs(dg) == float("inf") or abs(pdg) == float("inf"):
+            return
+
+        if dg * pdg < 0 or abs(dg) > abs(pdg):
+            # Overshoot or divergence. Take smaller steps.
+            step = 0.5 * self.subgradientStep
+        else:
+            # Steady progress. Take larger steps.
+            step = 1.5 * self.subgradientStep
+
+        self.subgradientStep = min(self.maxSubgradientStep, max(self.minSubgradientStep, step))
+
     def schedule(self, mtn):
         # Process called to
         # (1) invoke all models to update the scheduling of their resources, loads, or neighbor
@@ -536,13 +1178,102 @@ class Market:
 
         # 1.2.1 Call resource models to update their schedules
         # Call each local asset model m to schedule itself.
+        # Models whose inputs have not changed since they were last scheduled
+        # are skipped. Those that are scheduled must also update their
+        # production costs (see Model.needs_update()).
         for la in mtn.localAssets:
-            la.model.schedule(self)
+            if la.model.needs_update(self):
+                la.model.mark_dirty()
+                self.run_model(la.model, 'schedule')
 
         # 1.2.2 Call neighbor models to update their schedules
         # Call each neighbor model m to schedule itself
         for n in mtn.neighbors:
-            n.model.schedule(self)
+            if n.model.needs_update(self):
+                n.model.mark_dirty()
+                self.run_model(n.model, 'schedule')
+
+    def run_model(self, model, operation):
+        # Call an operation (e.g., 'schedule') of a model in this market,
+        # timing it by the model's class if the market has a profiler (see
+        # class BalanceProfiler).
+        if self.profiler is None:
+            return getattr(model, operation)(self)
+
+        t0 = self.profiler.tic()
+        result = getattr(model, operation)(self)
+        self.profiler.toc_model(model, operation, t0)
+        return result
+
+    def clean_marginal_prices(self, mps):
+        # Sort a list of vertex marginal prices and clean it so that it can be
+        # used to create system vertices (see sum_vertices()).
+        #
+        # INPUTS:
+        # mps - marginal prices gathered from the active vertices of neighbor
+        # and local asset models [$/kWh]
+        #
+        # OUTPUTS:
+        # mps - sorted, clean marginal prices [$/kWh]
+
+        # Sort the marginal prices from least to greatest
+        mps.sort()  # marginal prices [$/kWh]
+
+        # Ensure that no more than two vertices will be created at the same
+        # marginal price. The third output of function unique() is useful here
+        # because it is the index of unique entries in the original vector.
+        # [~, ~, ind] = unique(mps)  # index of unique vector contents
+
+        # Create a new vector of marginal prices. The first two entries are
+        # accepted because they cannot violate the two-duplicates rule. The
+        # vector is padded with zeros, which should be compuationally efficient.
+        # A counter is used and should be incremented with new vector entries.
+        mps_new = None
+        if len(mps) >= 3:
+            mps_new = [mps[0], mps[1]]
+        else:
+            mps_new = list(mps)
+
+        # Index through the indices and append the new list only when there are
+        # fewer than three duplicates.
+        for i in range(2, len(mps)):
+            if mps[i] != mps[i - 1] or mps[i - 1] != mps[i - 2]:
+                mps_new.append(mps[i])
+
+        # Trim the new list of marginal prices mps_new that had been padded with
+        # zeros and rename it mps
+        # mps = mps_new  # marginal prices [$/kWh]
+
+        # [180907DJH: THIS CONDITIONAL (COMMENTED OUT) WAS NOT QUITE RIGHT. A
+        # MARGINAL PRICE AT INFINITY IS MEANINGFUL ONLY IF THERE IS EXACTLY ONE
+        # VERTEX-NO FLEXIBILTY. OTHERWISE, IT IS SUPERFLUOUS AND SHOULD BE
+        # ELIMINATED. THIS MUCH SIMPLER APPROACH ENSURES THAT INFINITY IS RETAINED
+        # ONLY IF THERE IS A SINGLE MARGINAL PRICE. OTHERWISE, INFINITY MARGINAL
+        # PRICES ARE TRIMMED FROM THE SET.]
+        mps = [mps_new[0]]
+        for i in range(1, len(mps_new)):
+            if mps_new[i] != float('inf'):
+                mps.append(mps_new[i])
+        # if len(mps) >= 2:
+        #     # There are at least two marginal prices. (This is a condition that
+        #     # is unlikely but was found in testing of version 1.1.)
+        #     if mps[-1] == float('inf') and mps[-2] == float('inf'):
+        #         # A duplicate infinite marginal price, which is used to indicate a
+        #         # constant, inelastic power, is not meaningful and must be deleted
+        #         # from the end of the list of marginal prices mps.
+        #         mps.pop()
+
+        # A clean list of marginal prices has been created
+
+        # Correct assignment of vertex power requires a small offset of any
+        # duplicate values. Index through the new list of marginal prices again.
+        for i in range(1, len(mps)):
+            if mps[i] == mps[i - 1]:
+                # A duplicate has been found. Offset the first of the two by a
+                # very small number
+                mps[i - 1] = mps[i - 1] - 1e-10  # marginal prices [$/kWh]
+
+        return mps
 
     def sum_vertices(self, mtn, ti, ote=None):
         # Create system vertices with system information
@@ -619,67 +1350,8 @@ class Market:
 
                 mps.extend(mp)  # marginal prices [$/kWh]
 
-        # Trim mps, which was originally padded with zeros.
-        # mps = mps(1:mps_cnt)  # marginal prices [$/kWh]
-
-        ## A list of vertex marginal prices have been created.
-
-        # Sort the marginal prices from least to greatest
-        mps.sort()  # marginal prices [$/kWh]
-
-        # Ensure that no more than two vertices will be created at the same
-        # marginal price. The third output of function unique() is useful here
-        # because it is the index of unique entries in the original vector.
-        # [~, ~, ind] = unique(mps)  # index of unique vector contents
-
-        # Create a new vector of marginal prices. The first two entries are
-        # accepted because they cannot violate the two-duplicates rule. The
-        # vector is padded with zeros, which should be compuationally efficient.
-        # A counter is used and should be incremented with new vector entries.
-        mps_new = None
-        if len(mps) >= 3:
-            mps_new = [mps[0], mps[1]]
-        else:
-            mps_new = list(mps)
-
-        # Index through the indices and append the new list only when there are
-        # fewer than three duplicates.
-        for i in range(2, len(mps)):
-            if mps[i] != mps[i - 1] or mps[i - 1] != mps[i - 2]:
-                mps_new.append(mps[i])
-
-        # Trim the new list of marginal prices mps_new that had been padded with
-        # zeros and rename it mps
-        # mps = mps_new  # marginal prices [$/kWh]
-
-        # [180907DJH: THIS CONDITIONAL (COMMENTED OUT) WAS NOT QUITE RIGHT. A
-        # MARGINAL PRICE AT INFINITY IS MEANINGFUL ONLY IF THERE IS EXACTLY ONE
-        # VERTEX-NO FLEXIBILTY. OTHERWISE, IT IS SUPERFLUOUS AND SHOULD BE
-        # ELIMINATED. THIS MUCH SIMPLER APPROACH ENSURES THAT INFINITY IS RETAINED
-        # ONLY IF THERE IS A SINGLE MARGINAL PRICE. OTHERWISE, INFINITY MARGINAL
-        # PRICES ARE TRIMMED FROM THE SET.]
-        mps = [mps_new[0]]
-        for i in range(1, len(mps_new)):
-            if mps_new[i] != float('inf'):
-                mps.append(mps_new[i])
-        # if len(mps) >= 2:
-        #     # There are at least two marginal prices. (This is a condition that
-        #     # is unlikely but was found in testing of version 1.1.)
-        #     if mps[-1] == float('inf') and mps[-2] == float('inf'):
-        #         # A duplicate infinite marginal price, which is used to indicate a
-        #         # constant, inelastic power, is not meaningful and must be deleted
-        #         # from the end of the list of marginal prices mps.
-        #         mps.pop()
-
-        # A clean list of marginal prices has been created
-
-        # Correct assignment of vertex power requires a small offset of any
-        # duplicate values. Index through the new list of marginal prices again.
-        for i in range(1, len(mps)):
-            if mps[i] == mps[i - 1]:
-                # A duplicate has been found. Offset the first of the two by a
-                # very small number
-                mps[i - 1] = mps[i - 1] - 1e-10  # marginal prices [$/kWh]
+        # Clean up the list of vertex marginal prices.
+        mps = self.clean_marginal_prices(mps)
 
         # Create vertices at the marginal prices
         # Initialize the list of vertices
@@ -747,6 +1419,77 @@ class Market:
 
         return vertices
 
+    def sum_vertices_vectorized(self, mtn, ti, ote=None):
+        # Vectorized equivalent of sum_vertices(). The active vertices of each
+        # neighbor and local asset model are gathered and ordered only once in
+        # the time interval. Power and production cost are then evaluated at
+        # all the candidate marginal prices at once for each model, instead of
+        # once per model per marginal price.
+        #
+        # INPUTS:
+        # mtn - myTransactiveNode object
+        # ti - the active time interval
+        # ote - optional neighbor or local asset model to exclude
+        #
+        # OUTPUTS:
+        # vertices - the same system vertices as created by sum_vertices()
+
+        # Gather the neighbor and local asset models, excluding the "object to
+        # exclude" ote
+        models = [x.model for x in mtn.neighbors] + [x.model for x in mtn.localAssets]
+        models = [x for x in models if ote is None or x != ote]
+
+        # Gather the ordered vertex arrays (marginal prices, powers, costs) and
+        # segment continuity of each model in this time interval
+        curves = [vertex_arrays(x, ti) + (vertex_continuity(x, ti),) for x in models]
+
+        # Initialize a list of marginal prices mps at which vertices will be created.
+        mps = []
+
+        for curve in curves:
+            if len(curve[0]) == 1:
+                # There is one vertex. Enforce the policy of assigning infinite
+                # marginal price to constant vertices.
+                mps.append(float("inf"))  # marginal price [$/kWh]
+
+            else:
+                # There are multiple vertices (or none). Use the marginal price
+                # values from the vertices themselves.
+                mps.extend(curve[0].tolist())  # marginal prices [$/kWh]
+
+        # Clean up the list of vertex marginal prices.
+        mps = self.clean_marginal_prices(mps)
+        prices = np.array(mps, dtype=float)  # [$/kWh]
+
+        # Initialize the net powers pwr and total production costs pc at the
+        # marginal prices
+        pwr = np.zeros(len(mps))  # net power [avg.kW]
+        pc = np.zeros(len(mps))  # production cost [$]
+
+        dur = get_duration_in_hour(ti.duration)
+
+        # Include power and production costs from neighbor and local asset
+        # models, in the same order as sum_vertices()
+        for model, curve in zip(models, curves):
+            if len(curve[0]) == 0:
+                raise Exception(' '.join(['No active vertices were found for', model.name,
+                                          'in time interval', ti.name]))
+
+            # Calculate the model's powers at all the marginal prices.
+            p = production_from_arrays(curve[0], curve[1], prices, curve[3])  # power [avg.kW]
+
+            # Calculate the model's production costs at those powers, and add
+            # them to the sum production costs.
+            pc = pc + prod_cost_from_arrays(curve[0], curve[1], curve[2], p, dur)  # production cost [$]
+
+            # Add the model's powers to the sum net powers.
+            pwr = pwr + p  # net power [avg.kW]
+
+        # Create a vertex at each of the marginal prices
+        vertices = VertexSet.from_arrays(prices, pc, pwr).to_vertices()
+
+        return vertices
+
     def update_costs(self, mtn):
         # Sum the production and dual costs from all modeled local resources, local
         # loads, and neighbors, and then sum them for the entire duration of the
@@ -773,11 +1516,11 @@ class Market:
 
         # Call each LocalAssetModel to update its costs
         for la in mtn.localAssets:
-            la.model.update_costs(self)
+            self.run_model(la.model, 'update_costs')
 
         # Call each NeighborModel to update its costs
         for n in mtn.neighbors:
-            n.model.update_costs(self)
+            self.run_model(n.model, 'update_costs')
 
         for i in range (1, len(self.timeIntervals)):
             ti = self.timeIntervals[i]
@@ -849,7 +1592,7 @@ class Market:
         # Extract active time intervals
         time_intervals = self.timeIntervals  # active TimeIntervals
 
-        time_interval_values = [t.startTime for t in time_intervals]
+        time_interval_values = set([t.startTime for t in time_intervals])
         # Delete netPowers not in active time intervals
         self.netPowers = [x for x in self.netPowers if x.timeInterval.startTime in time_interval_values]
 
@@ -955,5 +1698,5 @@ class Market:
                 # A net power was found in the indexed time interval. Simply reassign its value.
                 iv.value = tg + td
 
-        np = [(x.timeInterval.name, x.value) for x in self.netPowers]
-        _log.debug("{} market netPowers are: {}".format(self.name, np))
\ No newline at end of file
+        net_powers = [(x.timeInterval.name, x.value) for x in self.netPowers]
+        _log.debug("{} market netPowers are: {}".format(self.name, net_powers))
\ No newline at end of file
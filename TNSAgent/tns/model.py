@@ -58,9 +58,11 @@
 
 
 from vertex import Vertex
+from helpers import *
 from time_interval import TimeInterval
 from local_asset import LocalAsset
 from interval_value import IntervalValue
+from model_dependency import ModelDependency
 
 
 class Model:
@@ -112,6 +114,26 @@ class Model:
         # disengaged, spinning or non-spinning. [avg.kW]
         self.reserveMargins = []  # IntervalValue[]
 
+        # True if the model's vertices in a time interval depend on its
+        # schedule in other time intervals, e.g., through demand charges or
+        # ramping. Such models prevent the time intervals from being balanced
+        # independently of one another. [Boolean]
+        self.intervalCoupled = False
+
+        # The inputs upon which the model's schedule and production costs
+        # depend. [See class ModelDependency.]
+        self.dependency = ModelDependency.PriceDependent
+
+        # True if the model's schedule and production costs must be
+        # recalculated. Models that do not depend on marginal prices are
+        # recalculated only while they are dirty. [Boolean]
+        self.isDirty = True
+
+        # Ordered active vertices and their arrays, cached by interval start
+        # time. An interval's entry is discarded whenever its active vertices
+        # are written. [See helpers.cached_vertices().]
+        self.vertexCache = {}  # {datetime: (Vertex[], mps, powers, costs, continuity)}
+
         # Array of scheduled real power for this resource in each of the
         # active time intervals. Values should be positive for imported
         # power negative for exported. [avg. kW]
@@ -146,10 +168,15 @@ class Model:
         self.totalDualCost = 0.0
 
         # Have object update and store its production and dual costs in
-        # each active time interval
-        self.update_production_costs(mkt)
+        # each active time interval. Production costs change only with the
+        # schedule, but dual costs depend on the marginal prices.
+        if self.needs_update(mkt):
+            self.update_production_costs(mkt)
         self.update_dual_costs(mkt)
 
+        # The model's outputs are now up-to-date.
+        self.isDirty = False
+
         # Sum total production and dual costs through all time intervals
         self.totalProductionCost = sum([x.value for x in self.productionCosts])
         self.totalDualCost = sum([x.value for x in self.dualCosts])
@@ -175,6 +202,75 @@ class Model:
     def schedule_engagement(self, mkt):
         pass
 
+    def needs_update(self, mkt):
+        """
+        Check whether the model's schedule and production costs must be
+        recalculated in the market's active time intervals
+        :param mkt: market object
+        :return: True if the model depends on marginal prices, is dirty, or
+        has yet to be scheduled in all active time intervals
+        """
+        if self.dependency == ModelDependency.PriceDependent:
+            return True
+
+        if self.isDirty:
+            return True
+
+        # Every active time interval must have a scheduled power.
+        return len(self.scheduledPowers) != len(mkt.timeIntervals)
+
+    def mark_dirty(self):
+        """
+        Flag that the model's schedule and production costs must be
+        recalculated in all active time intervals, e.g., after its forecasts
+        or parameters have changed. Models schedule all active time intervals
+        at once, so the whole model is dirty.
+        :return:
+        """
+        self.isDirty = True
+
+    def prune(self, cutoff):
+        """
+        Discard interval values of time intervals that start before a cutoff
+        time (see Market.retentionWindow)
+        :param cutoff: datetime
+        :return:
+        """
+        self.activeVertices = retained_values(self.activeVertices, cutoff)
+        self.vertexCache = dict([(k, v) for k, v in self.vertexCache.items() if k >= cutoff])
+        self.dualCosts = retained_values(self.dualCosts, cutoff)
+        self.productionCosts = retained_values(self.productionCosts, cutoff)
+        self.reserveMargins = retained_values(self.reserveMargins, cutoff)
+        self.scheduledPowers = retained_values(self.scheduledPowers, cutoff)
+
+    def interval_added(self, mkt, ti):
+        """
+        Respond to a new active time interval of the market. The model must be
+        recalculated for it. Models that keep state of their own by time
+        interval may redefine this method.
+        :param mkt: market object
+        :param ti: the added TimeInterval
+        :return:
+        """
+        self.mark_dirty()
+
+    def intervals_expired(self, mkt, tis):
+        """
+        Remove the interval values of time intervals that are no longer
+        active in the market
+        :param mkt: market object
+        :param tis: list of the expired TimeIntervals
+        :return:
+        """
+        sts = set([x.startTime for x in tis])
+        self.activeVertices = [x for x in self.activeVertices if x.timeInterval.startTime not in sts]
+        for st in sts:
+            self.vertexCache.pop(st, None)
+        self.dualCosts = [x for x in self.dualCosts if x.timeInterval.startTime not in sts]
+        self.productionCosts = [x for x in self.productionCosts if x.timeInterval.startTime not in sts]
+        self.reserveMargins = [x for x in self.reserveMargins if x.timeInterval.startTime not in sts]
+        self.scheduledPowers = [x for x in self.scheduledPowers if x.timeInterval.startTime not in sts]
+
 
 if __name__ == '__main__':
     model = Model()
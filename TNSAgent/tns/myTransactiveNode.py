@@ -56,6 +56,10 @@
 
 # }}}
 
+from datetime import timedelta
+
+from timer import Timer
+
 
 class myTransactiveNode(object):
     """
@@ -76,3 +80,33 @@ class myTransactiveNode(object):
         self.markets = []  # Market.empty
         self.meterPoints = []  # MeterPoint.empty
         self.neighbors = []  # Neighbor.empty
+
+        # Hysteresis and damping of the transactive signals, see damp_signals().
+        # The agents read these from their configurations. The defaults do not
+        # damp the signals.
+        self.convergence_hysteresis = 0.0  # [0.01 = 1%]
+        self.power_deadband = 0.0  # [avg.kW]
+        self.price_deadband = 0.0  # [$/kWh]
+        self.min_send_interval = 0.0  # [s] between unforced signals
+        self.price_smoothing = 0.0  # weight of previous received prices
+
+    def schedule(self, deadline, function, *args, **kwargs):
+        # Schedule a function call. In a discrete-event simulation, the
+        # deadline is a simulated time on the event clock (see Timer.clock).
+        # Otherwise, the agent's core schedules it.
+        if Timer.clock is not None:
+            return Timer.clock.schedule(deadline, function, *args, **kwargs)
+
+        return self.core.schedule(deadline, function, *args, **kwargs)
+
+    def damp_signals(self, model):
+        # Apply the configured hysteresis and damping to a transactive
+        # neighbor model, so that small oscillations near equilibrium do not
+        # keep triggering new signals. The agents read convergence_hysteresis,
+        # power_deadband, price_deadband, min_send_interval, and
+        # price_smoothing from their configurations.
+        model.hysteresis = self.convergence_hysteresis
+        model.powerDeadband = self.power_deadband
+        model.priceDeadband = self.price_deadband
+        model.minimumSendInterval = timedelta(seconds=self.min_send_interval)
+        model.priceSmoothing = self.price_smoothing
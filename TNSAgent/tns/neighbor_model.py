@@ -59,15 +59,16 @@
 
 from datetime import datetime, timedelta, date, time
 import csv
+from copy import copy
+import numpy as np
 
 import logging
-import json
 
 from model import Model
 from helpers import *
 from measurement_type import MeasurementType
 from interval_value import IntervalValue
-from transactive_record import TransactiveRecord
+from transactive_record import TransactiveRecord, encode_signal, decode_signal, is_delta_signal, merge_signal
 from vertex import Vertex
 from timer import Timer
 
@@ -101,8 +102,37 @@ class NeighborModel(Model, object):
         # between a recent calculation (mySignal) and the last calculation
         # that was revealed to the Neighbor (sentSignal).
         self.sentSignal = []  # TransactiveRecord.empty  # last records sent
+        # Signals are sent as deltas of the time intervals that changed, with
+        # a full snapshot every snapshotInterval signals (0 = always full).
+        self.deliveredSignal = {}  # {time interval name: [TransactiveRecord]} as the neighbor holds them
+        self.receivedSequence = None  # sequence number of the last signal received
+        self.signalGaps = 0  # count of received signals that followed a gap
+        self.signalSequence = 0  # sequence number of the last signal sent
+        self.snapshotInterval = 10  # [signals]
         self.transactive = False
 
+        # Near equilibrium, small oscillations between neighbors would keep
+        # triggering new signals. These settings damp them. The defaults
+        # leave the convergence criteria undamped.
+        self.hysteresis = 0.0  # added to convergenceThreshold once a time interval has converged [0.01 = 1#]
+        self.powerDeadband = 0.0  # power differences that are never significant [avg.kW]
+        self.priceDeadband = 0.0  # marginal price differences that are never significant [$/kWh]
+        self.minimumSendInterval = timedelta(0)  # least time between signals that are not forced
+        self.priceSmoothing = 0.0  # weight [0, 1) of the previous price in received marginal prices
+        self.lastSendTime = None  # time the last signal was sent
+        self.deferredSends = 0  # count of signals deferred by minimumSendInterval
+        self.suppressedIntervals = set()  # names of time intervals converged only by damping
+        self.suppressedSends = 0  # count of signals suppressed by hysteresis and deadbands
+
+        # Signals are indexed {time interval name: {record number: TransactiveRecord}}
+        # as they change, so that convergence flags are evaluated again only in
+        # the time intervals that changed. See check_for_convergence().
+        self.changedIntervals = set()  # names of time intervals whose signals changed
+        self.checkedCriteria = self.convergence_criteria()
+        self.indexedSignals = {'my': None, 'sent': None, 'received': None}  # signal lists last indexed
+        self.signalIndex = {'my': {}, 'sent': {}, 'received': {}}
+        self.unconvergedIntervals = set()  # names of time intervals whose convergence flags are false
+
     def calculate_reserve_margin(self, mkt):
         # CALCULATE_RESERVE_MARGIN() - Estimate the spinning reserve margin
         # in each active time interval
@@ -131,7 +161,7 @@ class NeighborModel(Model, object):
 
         # Gather active time intervals ti
         time_intervals = mkt.timeIntervals
-        time_interval_values = [t.startTime for t in time_intervals]
+        time_interval_values = set([t.startTime for t in time_intervals])
         self.reserveMargins = [x for x in self.reserveMargins if x.timeInterval.startTime in time_interval_values]
 
         # Index through active time intervals ti
@@ -181,8 +211,13 @@ class NeighborModel(Model, object):
                 interval_value.value = value  # [avg.kW]
 
     def find_last_message_ts(self, signals, ti_name, fallback_value):
-        # Create a logical array: true if the received TransactiveRecord is in the indexed active time interval
-        ti_signals = [s for s in signals if s.timeInterval == ti_name]
+        # Find the TransactiveRecord objects in the indexed active time
+        # interval. Signals may be given already grouped by time interval name
+        # (see records_by_interval()).
+        if isinstance(signals, dict):
+            ti_signals = signals.get(ti_name, [])
+        else:
+            ti_signals = [s for s in signals if s.timeInterval == ti_name]
 
         # If a signal message was found in the indexed time interval,
         # its timestamp ts is the last time a message was sent. Otherwise,
@@ -225,71 +260,45 @@ class NeighborModel(Model, object):
         # and all the scheduling sub-problems have been calculated and have
         # converged.
 
-        # Gather active time intervals.
-        time_intervals = mkt.timeIntervals
-
-        # Index through active time intervals to assess their convergence status.
-        t_threshold = timedelta(minutes=5)
-        for i in range(len(time_intervals)):
-            # Capture the current datetime in the same format as for the TransactiveRecord messages.
-            dt = Timer.get_cur_time()
-
-            # Initialize a flag true (converged) in this time interval until proven otherwise.
-            flag = True
-
-            # Find the TransactiveRecord objects sent from the transactive
-            # Neighbor in this indexed active time interval.
-            ss_ts, ss = self.find_last_message_ts(self.sentSignal, time_intervals[i].name, dt-t_threshold)
-            rs_ts, rs = self.find_last_message_ts(self.receivedSignal, time_intervals[i].name, dt)
-            ms_ts, ms = self.find_last_message_ts(self.mySignal, time_intervals[i].name, dt)
-
-            # Now, work through the convergence criteria.
-            if len(ss) == 0:
-                # No signal has been sent in this time interval. This is the
-                # first convergence requirement. Set the convergence flag false.
-                _log.debug("Signal for time interval {} ({}). Enable send flag.".format(i, time_intervals[i].name))
-                flag = False
-
-            # received and received AFTER last sent and there is a big diff b/w ss and rs
-            elif len(rs) > 0 and rs_ts > ss_ts and are_different1(ss, rs, self.convergenceThreshold, self.name):
-                # One or more TransactiveRecord objects has been received in the
-                # indexed time interval and it has been received AFTER the last
-                # time a message was sent. These are preconditions for the second
-                # convergence requirement. Function are_different1() checks
-                # whether the sent and received signals differ significantly. If
-                # all these conditions are true, the Neighbor is not converged.
-                _log.debug("TCC for {} are_different1 returned True? Check: rs={}, ss={}, "
-                           "rs_ts={}, ss_ts={}, threshold={}".format(
-                    self.name,
-                    [(x.timeInterval, x.record, x.power, x.marginalPrice) for x in rs],
-                    [(x.timeInterval, x.record, x.power, x.marginalPrice) for x in ss],
-                    rs_ts, ss_ts, self.convergenceThreshold))
-                flag = False
-
-            #elif dt - ss_ts >= t_threshold and are_different2(ms, ss, self.convergenceThreshold, self.name):
-            elif are_different2(ms, ss, self.convergenceThreshold, self.name):
-                # Delay 5 min after last send AND
-                # More than 5 minutes have passed since the last time a signal
-                # was sent. This is a precondition to the third convergence
-                # criterion. Function are_different2() returns true if mySignal
-                # (ms) and the sentSignal (ss) differ significantly, meaning that
-                # local conditions have changed enough that a new, revised signal
-                # should be sent.
-                _log.debug("TCC for {} are_different2 returned True? Check: ms={}, ss={}, "
-                           "rs_ts={}, ss_ts={}, threshold={}".format(
-                    self.name,
-                    [(x.timeInterval, x.record, x.power, x.marginalPrice) for x in ms],
-                    [(x.timeInterval, x.record, x.power, x.marginalPrice) for x in ss],
-                    rs_ts, ss_ts, self.convergenceThreshold))
-                flag = False
+        # The signals are indexed as they are prepared, sent, and received
+        # (see index_signal()). Signals that were reassigned otherwise are
+        # indexed now.
+        for kind in ['my', 'sent', 'received']:
+            if getattr(self, kind + 'Signal') is not self.indexedSignals[kind]:
+                self.index_signal(kind)
+
+        # New convergence criteria invalidate all the convergence flags.
+        if self.convergence_criteria() != self.checkedCriteria:
+            self.checkedCriteria = self.convergence_criteria()
+            self.changedIntervals.update([x.timeInterval.name for x in self.convergenceFlags])
+
+        flags = dict([(x.timeInterval.name, x) for x in self.convergenceFlags])
+
+        # Only the flags of time intervals whose signals changed since they were
+        # last checked, or that have no flag yet, are evaluated again.
+        for ti in mkt.timeIntervals:
+            iv = flags.get(ti.name)
+
+            if iv is not None and ti.name not in self.changedIntervals:
+                continue
+
+            # Once converged, a time interval stays converged until its signals
+            # differ by more than the threshold plus the hysteresis.
+            was_converged = iv is not None and iv.value
+            flag = self.interval_converged(ti, was_converged)
+
+            # Note the time intervals that would not have converged without
+            # the damping, i.e., whose signals are suppressed.
+            if flag and self.damped() and not self.interval_converged(ti, undamped=True):
+                self.suppressedIntervals.add(ti.name)
+            else:
+                self.suppressedIntervals.discard(ti.name)
 
             # Check whether a convergence flag exists in the indexed time interval.
-            iv = find_obj_by_ti(self.convergenceFlags, time_intervals[i])
-
             if iv is None:
                 # No convergence flag was found in the indexed time interval.
                 # Create one and append it to the list.
-                iv = IntervalValue(self, time_intervals[i], mkt, MeasurementType.ConvergenceFlag, flag)
+                iv = IntervalValue(self, ti, mkt, MeasurementType.ConvergenceFlag, flag)
                 self.convergenceFlags.append(iv)
 
             else:
@@ -297,16 +306,136 @@ class NeighborModel(Model, object):
                 # interval. Simply reassign it.
                 iv.value = flag
 
-        # If any of the convergence flags in active time intervals is false, the
-        # overall convergence flag should be set false, too. Otherwise, true,
-        # meaning the coordination sub-problem is converged with this Neighbor.
-        if any([not x.value for x in self.convergenceFlags]):
-            self.converged = False
+            if flag:
+                self.unconvergedIntervals.discard(ti.name)
+            else:
+                self.unconvergedIntervals.add(ti.name)
+
+            self.changedIntervals.discard(ti.name)
+
+        # If any of the convergence flags is false, the overall convergence
+        # flag should be set false, too. Otherwise, true, meaning the
+        # coordination sub-problem is converged with this Neighbor.
+        self.converged = len(self.unconvergedIntervals) == 0
+
+        if self.converged and len(self.suppressedIntervals) > 0:
+            self.suppressedSends = self.suppressedSends + 1
+
+        if _log.isEnabledFor(logging.DEBUG):
+            _log.debug("TCC convergence flags for {} are {}".format(
+                self.name, [(format_ts(f.timeInterval.startTime), f.value) for f in self.convergenceFlags]))
+            _log.debug("TCC convergence flag for {} is {}.".format(self.name, self.converged))
+
+    def interval_converged(self, ti, was_converged=False, undamped=False):
+        # Evaluate the convergence criteria of check_for_convergence() in a
+        # time interval.
+        # INPUTS:
+        # ti - TimeInterval object
+        # was_converged - true if the time interval had converged, so that the
+        #                 hysteresis applies
+        # undamped - true to ignore the hysteresis and deadbands
+        # OUTPUTS:
+        # flag - Boolean: true if converged in the time interval
+
+        # Find the TransactiveRecord objects sent, received, and prepared in
+        # this time interval.
+        ss = self.interval_records('sent', ti.name)
+        rs = self.interval_records('received', ti.name)
+        ms = self.interval_records('my', ti.name)
+
+        if undamped:
+            threshold, power_deadband, price_deadband = self.convergenceThreshold, 0.0, 0.0
         else:
-            self.converged = True
-        _log.debug("TCC convergence flags for {} are {}".format(
-            self.name, [(format_ts(f.timeInterval.startTime), f.value) for f in self.convergenceFlags]))
-        _log.debug("TCC convergence flag for {} is {}.".format(self.name, self.converged))
+            threshold = self.convergenceThreshold + (self.hysteresis if was_converged else 0.0)
+            power_deadband, price_deadband = self.powerDeadband, self.priceDeadband
+
+        # Now, work through the convergence criteria.
+        if len(ss) == 0:
+            # No signal has been sent in this time interval. This is the
+            # first convergence requirement. Set the convergence flag false.
+            _log.debug("Signal for time interval {}. Enable send flag.".format(ti.name))
+            return False
+
+        # The record timestamps are those of the scheduled points (Record 0).
+        ss_ts = self.signalIndex['sent'][ti.name].get(0, ss[0]).timeStamp
+
+        # received and received AFTER last sent and there is a big diff b/w ss and rs
+        if len(rs) > 0 and self.signalIndex['received'][ti.name].get(0, rs[0]).timeStamp > ss_ts \
+                and are_different1(ss, rs, threshold, self.name, power_deadband, price_deadband):
+            # One or more TransactiveRecord objects has been received in the
+            # indexed time interval and it has been received AFTER the last
+            # time a message was sent. These are preconditions for the second
+            # convergence requirement. Function are_different1() checks
+            # whether the sent and received signals differ significantly. If
+            # all these conditions are true, the Neighbor is not converged.
+            _log.debug("TCC for {} are_different1 returned True in {}.".format(self.name, ti.name))
+            return False
+
+        if are_different2(ms, ss, threshold, self.name, power_deadband, price_deadband):
+            # mySignal (ms) and the sentSignal (ss) differ significantly,
+            # meaning that local conditions have changed enough that a new,
+            # revised signal should be sent.
+            _log.debug("TCC for {} are_different2 returned True in {}.".format(self.name, ti.name))
+            return False
+
+        return True
+
+    def convergence_criteria(self):
+        # The settings that the convergence flags depend upon.
+        return (self.convergenceThreshold, self.hysteresis, self.powerDeadband, self.priceDeadband)
+
+    def damped(self):
+        # Returns true if hysteresis or deadbands damp the convergence criteria.
+        return self.hysteresis > 0 or self.powerDeadband > 0 or self.priceDeadband > 0
+
+    def send_due(self):
+        # Returns true if a signal that is not forced, e.g., by the start of a
+        # cycle, should be sent now, i.e., if the neighbor is not converged
+        # and minimumSendInterval has elapsed since the last signal was sent.
+        # Counts the signals that are deferred.
+        if self.converged:
+            return False
+
+        if self.lastSendTime is not None \
+                and Timer.get_cur_time() < self.lastSendTime + self.minimumSendInterval:
+            self.deferredSends = self.deferredSends + 1
+            return False
+
+        return True
+
+    def interval_records(self, kind, ti_name):
+        # The indexed records of a signal in a time interval, ordered by
+        # record number.
+        records = self.signalIndex[kind].get(ti_name, {})
+        return [records[x] for x in sorted(records)]
+
+    def index_signal(self, kind):
+        # Index the records of a signal by time interval name and record number,
+        # and note the time intervals whose records changed, so that only their
+        # convergence flags are evaluated again (see check_for_convergence()).
+        # INPUTS:
+        # kind - 'my', 'sent', or 'received', i.e., the signal mySignal,
+        #        sentSignal, or receivedSignal
+        #
+        # NOTE: Records are compared by identity. A record that is changed in
+        # place is not noticed until its signal is reassigned.
+        records = getattr(self, kind + 'Signal')
+        index = {}
+
+        for x in records:
+            index.setdefault(x.timeInterval, {})[x.record] = x
+
+        old_index = self.signalIndex[kind]
+
+        for name in set(old_index) | set(index):
+            old = old_index.get(name, {})
+            new = index.get(name, {})
+
+            if len(old) != len(new) or any([old.get(x) is not new[x] for x in new]):
+                self.changedIntervals.add(name)
+
+        self.signalIndex[kind] = index
+        self.indexedSignals[kind] = records
 
     def marginal_price_from_vertices(self, power, vertices):
         # Given a power, determine the corresponding marginal price from a set of supply- or demand-curve vertices.
@@ -396,7 +525,7 @@ class NeighborModel(Model, object):
 
         # Gather the active time intervals ti
         time_intervals = mkt.timeIntervals  # TimeInterval objects
-        time_interval_values = [t.startTime for t in time_intervals]
+        time_interval_values = set([t.startTime for t in time_intervals])
         self.scheduledPowers = [x for x in self.scheduledPowers if x.timeInterval.startTime in time_interval_values]
 
         # Index through active time intervals ti
@@ -464,7 +593,7 @@ class NeighborModel(Model, object):
 
             # Gather the active time intervals ti and find the current (soonest) one.
             time_intervals = mkt.timeIntervals
-            time_intervals.sort(key=lambda x: x.startTime)
+            time_intervals = sorted(time_intervals, key=lambda x: x.startTime)
 
             # Find current demand d that corresponds to the nearest time interval.
             d = find_obj_by_ti(self.scheduledPowers, time_intervals[0])
@@ -492,44 +621,27 @@ class NeighborModel(Model, object):
     def update_dual_costs(self, mkt):
         # Gather the active time intervals.
         time_intervals = mkt.timeIntervals
-        time_interval_values = [t.startTime for t in time_intervals]
+        time_interval_values = set([t.startTime for t in time_intervals])
         self.dualCosts = [x for x in self.dualCosts if x.timeInterval.startTime in time_interval_values]
 
-        for i in range(1, len(time_intervals)):
-            # Find the marginal price mp for the indexed time interval in the given market
-            marginal_price = find_obj_by_ti(mkt.marginalPrices, time_intervals[i])
-            marginal_price = marginal_price.value
-
-            # Find the scheduled power for the neighbor in the indexed time interval.
-            scheduled_power = find_obj_by_ti(self.scheduledPowers, time_intervals[i])
-            scheduled_power = scheduled_power.value
-
-            # Find the production cost in the indexed time interval.
-            production_cost = find_obj_by_ti(self.productionCosts, time_intervals[i])
-            production_cost = production_cost.value
+        # The dual costs of the time intervals after the first are calculated
+        # together, looking up the interval values by time interval once.
+        tis = list(time_intervals)[1:]
 
-            # Dual cost in the time interval is calculated as production cost,
-            # minus the product of marginal price, scheduled power, and the
-            # duration of the time interval.
-            interval_duration = get_duration_in_hour(time_intervals[i].duration)
+        # Find the marginal prices, and the neighbor's scheduled powers and
+        # production costs, in the time intervals.
+        marginal_prices = np.array(aligned_values(mkt.marginalPrices, tis), dtype=float)  # [$/kWh]
+        scheduled_powers = np.array(aligned_values(self.scheduledPowers, tis), dtype=float)  # [avg.kW]
+        production_costs = np.array(aligned_values(self.productionCosts, tis), dtype=float)  # [$]
+        durs = np.array([get_duration_in_hour(ti.duration) for ti in tis], dtype=float)  # [h]
 
-            dual_cost = production_cost - (marginal_price * scheduled_power * interval_duration)  # a dual cost [$]
+        # Dual cost in the time interval is calculated as production cost,
+        # minus the product of marginal price, scheduled power, and the
+        # duration of the time interval.
+        dual_costs = production_costs - (marginal_prices * scheduled_powers * durs)  # dual costs [$]
 
-            # Check whether a dual cost exists in the indexed time interval
-            # interval_value = findobj(self.dualCosts, 'timeInterval', time_intervals[i])  # an IntervalValue
-            interval_value = find_obj_by_ti(self.dualCosts, time_intervals[i])
-
-            if interval_value is None:
-                # No dual cost was found in the indexed time interval. Create an
-                # interval value and assign it the calculated value.
-                interval_value = IntervalValue(self, time_intervals[i], mkt, MeasurementType.DualCost, dual_cost)
-
-                # Append the new interval value to the list of active interval values.
-                self.dualCosts.append(interval_value)
-            else:
-                # The dual cost value was found to already exist in the indexed
-                # time interval. Simply reassign it the new calculated value.
-                interval_value.value = dual_cost  # a dual cost [$]
+        # Reassign the dual costs of the time intervals, or create them.
+        assign_values(self.dualCosts, self, tis, mkt, MeasurementType.DualCost, dual_costs.tolist())
 
         # Ensure that only active time intervals are in the list of dual costs.
         #self.dualCosts = [x for x in self.dualCosts if x.timeInterval in time_intervals]
@@ -542,37 +654,26 @@ class NeighborModel(Model, object):
 
     def update_production_costs(self, mkt):
         time_intervals = mkt.timeIntervals
-        time_interval_values = [t.startTime for t in time_intervals]
+        time_interval_values = set([t.startTime for t in time_intervals])
         self.productionCosts = [x for x in self.productionCosts if x.timeInterval.startTime in time_interval_values]
 
-        for i in range(1, len(time_intervals)):
-            # Get the scheduled power in the indexed time interval.
-            scheduled_power = find_obj_by_ti(self.scheduledPowers, time_intervals[i])
-            scheduled_power = scheduled_power.value
+        # The production costs of the time intervals after the first are
+        # calculated together from the rows of the models' vertex arrays.
+        tis = list(time_intervals)[1:]
 
-            # Call on function that calculates production cost pc based on the
-            # vertices of the supply or demand curve.
-            production_cost = prod_cost_from_vertices(self, time_intervals[i], scheduled_power)  # prod cost [$]
+        if len(tis) > 0:
+            # Get the scheduled powers and durations of the time intervals.
+            scheduled_powers = aligned_values(self.scheduledPowers, tis)  # [avg.kW]
+            durs = [get_duration_in_hour(ti.duration) for ti in tis]  # [h]
 
-            # Check to see if the production cost value has been defined for the
-            # indexed time interval.
-            # interval_value = findobj(self.productionCosts, 'timeInterval', time_intervals[i])  # an IntervalValue
-            interval_value = find_obj_by_ti(self.productionCosts, time_intervals[i])
+            # Call on function that calculates production costs based on the
+            # vertices of the supply or demand curves.
+            mps, powers, counts, costs, continuous = vertex_rows(self, tis)
+            production_costs = prod_cost_from_rows(mps, powers, costs, scheduled_powers, durs)  # prod cost [$]
 
-            if interval_value is None:
-                # The production cost value has not been defined in the indexed
-                # time interval. Create it and assign its value pc.
-                interval_value = IntervalValue(self, time_intervals[i], mkt,
-                                               MeasurementType.ProductionCost,
-                                               production_cost)
-
-                # Append the production cost to the list of active production cost values.
-                self.productionCosts.append(interval_value)
-            else:
-
-                # The production cost value already exists in the indexed time
-                # interval. Simply reassign its value.
-                interval_value.value = production_cost  # production cost [$]
+            # Reassign the production costs of the time intervals, or create them.
+            assign_values(self.productionCosts, self, tis, mkt, MeasurementType.ProductionCost,
+                          production_costs.tolist())
 
         # Ensure that only active time intervals are in the list of active
         # production costs.
@@ -586,6 +687,161 @@ class NeighborModel(Model, object):
         _log.debug("{} neighbor model production costs are: {}".format(self.name, pc))
 
     def update_vertices(self, mkt):
+        # Update the active vertices that define Neighbors' residual
+        # flexibility. See update_vertices_scalar(), which the array-based
+        # update_vertices_vectorized() reproduces.
+        self.update_vertices_vectorized(mkt)
+
+    def update_vertices_vectorized(self, mkt):
+        # Array-based equivalent of update_vertices_scalar(). The received
+        # transactive records of all the active time intervals are ordered,
+        # adjusted for losses, and checked against the demand-charge
+        # thresholds as columns, rather than one record at a time.
+        #
+        # INPUTS:
+        # mkt - Market object
+        #
+        # OUTPUTS:
+        # Updates self.activeVertices - the same IntervalValues of Vertex()
+        # structs, in the same order, as update_vertices_scalar()
+
+        # Extract active time intervals
+        time_intervals = mkt.timeIntervals
+        time_interval_values = set([t.startTime for t in time_intervals])
+
+        # Delete any active vertices that are not in active time intervals.
+        self.activeVertices = [x for x in self.activeVertices if x.timeInterval.startTime in time_interval_values]
+
+        if len(time_intervals) == 0:
+            return
+
+        default_vertices = self.defaultVertices
+
+        if len(default_vertices) == 0:
+            # No default vertices are found. As update_vertices_scalar() does,
+            # discard the vertices of the first time interval, warn, and return.
+            self.activeVertices = [x for x in self.activeVertices if
+                                   x.timeInterval.startTime != time_intervals[0].startTime]
+            invalidate_vertices(self, time_intervals[0])
+            _log.warning('At least one default vertex must be defined for neighbor model object %s. '
+                         'Scheduling was not performed' % (self.name))
+            return
+
+        # Received records as columns: time interval index, record number,
+        # marginal price, cost, and power. Records of inactive time intervals
+        # are ignored.
+        columns = []
+
+        if self.transactive:
+            indices = dict([(ti.name, i) for i, ti in enumerate(time_intervals)])
+            columns = [(indices[x.timeInterval], x.record, x.marginalPrice, x.cost, x.power)
+                       for x in self.receivedSignal if x.timeInterval in indices]
+
+        columns = np.array(columns, dtype=float).reshape(-1, 5)
+        n = len(time_intervals)
+
+        # Order the records by time interval, and then by increasing price and
+        # power, as order_vertices() does. The sort is stable.
+        order = np.lexsort((columns[:, 4], columns[:, 2], columns[:, 0]))
+        columns = columns[order]
+        interval = columns[:, 0].astype(int)
+        record = columns[:, 1]
+        marginal_price = columns[:, 2]  # [$/kWh]
+        cost = columns[:, 3]  # [$]
+        power = columns[:, 4]  # [avg.kW]
+
+        # Count the records in each time interval, and find each record's
+        # position k within its time interval.
+        counts = np.bincount(interval, minlength=n)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        k = np.arange(len(interval)) - starts[interval]
+
+        # Record #0 is the balance point. It is not made a vertex if there are
+        # multiple other records in the time interval.
+        keep = ~((counts[interval] >= 3) & (record == 0))
+
+        # Imported power (p > 0) is diminished by losses, and its effective
+        # marginal price is increased.
+        importing = keep & (power > 0)
+
+        if np.any(importing):
+            try:
+                with np.errstate(divide='raise', invalid='raise'):
+                    factor2 = 1 + (power[importing] / self.object.maximumPower) ** 2 * self.object.lossFactor
+            except FloatingPointError:
+                _log.error("{} has power {} AND object ({}) maxPower {} and minPower {}"
+                           .format(self.name, power[importing].tolist(),
+                                   self.object.name,
+                                   self.object.maximumPower,
+                                   self.object.minimumPower))
+                raise
+
+            power[importing] = power[importing] / factor2
+            marginal_price[importing] = marginal_price[importing] * factor2
+
+        # The demand-charge threshold of each time interval is the larger of
+        # the metered threshold and the peak of the scheduled powers up to and
+        # including the time interval, where they are all available.
+        thresholds = np.full(n, float(self.demandThreshold))  # [avg.kW]
+        prior_power = np.array([x.value for x in self.scheduledPowers[0:n]], dtype=float)
+
+        if len(prior_power) > 0:
+            peaks = np.maximum.accumulate(prior_power)
+            thresholds[0:len(peaks)] = np.maximum(thresholds[0:len(peaks)], peaks)
+
+        # Demand charges are in play in a time interval if an imported power,
+        # other than at the first ordered position, exceeds its threshold.
+        exceeding = importing & (power > thresholds[interval]) & (k != 0)
+        demand_charged = np.bincount(interval[exceeding], minlength=n) > 0
+
+        # Vertices whose powers exceed the thresholds of demand-charged time
+        # intervals reflect the demand rate.
+        charged = keep & demand_charged[interval] & (power > thresholds[interval])
+        charged_price = np.where(charged, marginal_price + self.demandRate, marginal_price)  # [$/kWh]
+
+        # Create the vertices of each time interval, in order.
+        kept = np.flatnonzero(keep)
+        kept_intervals = interval[kept]
+        kept_bounds = np.searchsorted(kept_intervals, np.arange(n + 1))
+        marginal_price = marginal_price.tolist()
+        charged_price = charged_price.tolist()
+        cost = cost.tolist()
+        power = power.tolist()
+
+        active_vertices = []
+
+        for i in range(n):
+            ti = time_intervals[i]
+
+            if counts[i] == 0:
+                # No received transactive records address the time interval.
+                # Default value(s) must be used.
+                active_vertices.extend([IntervalValue(self, ti, mkt, MeasurementType.ActiveVertex, x)
+                                        for x in default_vertices])
+                continue
+
+            rows = kept[kept_bounds[i]:kept_bounds[i + 1]]
+            vertices = [Vertex(charged_price[j], cost[j], power[j], None) for j in rows]
+
+            if demand_charged[i]:
+                # Create two vertices at the intersection of the threshold and
+                # the supply or demand curve from prior to the application of
+                # demand charges.
+                threshold = float(thresholds[i])  # [avg.kW]
+                mp = self.marginal_price_from_vertices(
+                    threshold, [Vertex(marginal_price[j], cost[j], power[j], None) for j in rows])  # [$/kWh]
+                vertices.append(Vertex(mp, 0, threshold))
+                vertices.append(Vertex(mp + self.demandRate, 0, threshold))
+
+            active_vertices.extend([IntervalValue(self, ti, mkt, MeasurementType.ActiveVertex, x)
+                                    for x in vertices])
+
+        self.activeVertices = active_vertices
+
+        # The vertices of every active time interval were recreated.
+        invalidate_vertices(self)
+
+    def update_vertices_scalar(self, mkt):
         # Update the active vertices that define Neighbors'
         # residual flexibility in the form of supply or demand curves.
         #
@@ -613,19 +869,23 @@ class NeighborModel(Model, object):
 
         # Extract active time intervals
         time_intervals = mkt.timeIntervals
-        time_interval_values = [t.startTime for t in time_intervals]
+        time_interval_values = set([t.startTime for t in time_intervals])
 
         # Delete any active vertices that are not in active time intervals. This
         # prevents time intervals from accumulating indefinitely.
         self.activeVertices = [x for x in self.activeVertices if x.timeInterval.startTime in time_interval_values]
 
+        # Group the received transactive records by time interval name.
+        received_signal = records_by_interval(self.receivedSignal)
+
         # Index through active time intervals
         for i in range(len(time_intervals)):
             # Keep active vertices that are not in the indexed time interval, but
             # discard the one(s) in the indexed time interval. These shall be
             # recreated in this iteration.
             self.activeVertices = [x for x in self.activeVertices if
-                                   x.timeInterval.startTime != time_interval_values[i]]
+                                   x.timeInterval.startTime != time_intervals[i].startTime]
+            invalidate_vertices(self, time_intervals[i])
 
             # Get the default vertices.
             default_vertices = self.defaultVertices
@@ -651,7 +911,7 @@ class NeighborModel(Model, object):
 
             elif self.transactive:  # a transactive neighbor
                 # Check for transactive records in the indexed time interval.
-                received_vertices = [x for x in self.receivedSignal if x.timeInterval == time_intervals[i].name]
+                received_vertices = received_signal.get(time_intervals[i].name, [])
 
                 if len(received_vertices) == 0:
                     # No received transactive records address the indexed time
@@ -857,6 +1117,10 @@ class NeighborModel(Model, object):
 
                                 # ... and re-store the vertex in its IntervalValue
                                 interval_values[k].value = vertex  # an IntervalValue object
+
+                        # The vertices were revised in place. Discard any that
+                        # were cached in the indexed time interval.
+                        invalidate_vertices(self, time_intervals[i])
                     else:
                         _log.debug("NO DEMAND CHARGE 1")
 
@@ -867,6 +1131,26 @@ class NeighborModel(Model, object):
         av = [(x.timeInterval.name, x.value.marginalPrice, x.value.power) for x in self.activeVertices]
         _log.debug("{} neighbor model active vertices are: {}".format(self.name, av))
 
+    def prune(self, cutoff):
+        # Discard interval values and transactive records of time intervals
+        # that start before a cutoff time.
+        super(NeighborModel, self).prune(cutoff)
+
+        self.convergenceFlags = retained_values(self.convergenceFlags, cutoff)
+        self.unconvergedIntervals = set([x.timeInterval.name for x in self.convergenceFlags if not x.value])
+        self.mySignal = retained_records(self.mySignal, cutoff)
+        self.receivedSignal = retained_records(self.receivedSignal, cutoff)
+        self.sentSignal = retained_records(self.sentSignal, cutoff)
+
+    def intervals_expired(self, mkt, tis):
+        # Remove the interval values of time intervals that are no longer
+        # active in the market, including their convergence flags.
+        super(NeighborModel, self).intervals_expired(mkt, tis)
+
+        sts = set([x.startTime for x in tis])
+        self.convergenceFlags = [x for x in self.convergenceFlags if x.timeInterval.startTime not in sts]
+        self.unconvergedIntervals.difference_update([x.name for x in tis])
+
     def prep_transactive_signal(self, mkt, mtn):
         # Prepare transactive records to send
         # to a transactive neighbor. The prepared transactive signal should
@@ -903,11 +1187,10 @@ class NeighborModel(Model, object):
 
         # Gather active time intervals.
         time_intervals = mkt.timeIntervals  # active TimeInterval objects
-        time_interval_names = [x.name for x in time_intervals]
 
         #[180830DJH: ENSURE THAT mySignal PROPERTY IS TRIMMED TO CONTAIN SIGNALS
         #FROM ONLY THE ACTIVE TIME INTERVALS USING THIS NEXT LINE.]
-        self.mySignal = [x for x in self.mySignal if x.timeInterval in time_interval_names]
+        self.mySignal = [x for x in self.mySignal if mkt.find_interval(x.timeInterval) is not None]
 
         # Index through active time intervals.
         for i in range(len(time_intervals)):
@@ -919,7 +1202,7 @@ class NeighborModel(Model, object):
             # Create the vertices of the net supply or demand curve, EXCLUDING
             # this transactive neighbor (i.e., "tnm"). NOTE: It is important that
             # the transactive neighbor is excluded.
-            vertices = mkt.sum_vertices(mtn, time_intervals[i], self)  # Vertices
+            vertices = mkt.sum_vertices_vectorized(mtn, time_intervals[i], self)  # Vertices
 
             # Find the minimum and maximum powers from the vertices. These are
             # soft constraints that represent a range of flexibility. The range
@@ -1032,6 +1315,8 @@ class NeighborModel(Model, object):
                         # records that are ready to send.
                         self.mySignal.append(transactive_record)
 
+        self.index_signal('my')
+
     def send_transactive_signal(self, mtn, topic, start_of_cycle=False, fail_to_converged=False):
         # Send transactive records to a transactive neighbor.
         #
@@ -1049,36 +1334,59 @@ class NeighborModel(Model, object):
         # similarly prepares and sends transactive signals to this location.
         # mtn - myTransactiveNode object
 
+        message = self.transactive_message(start_of_cycle, fail_to_converged)
+
+        if message is None:
+            return
+
+        _log.debug("At {}, {} sends signal from {} on topic {} message {}"
+                   .format(Timer.get_cur_time(),
+                           self.name,
+                           self.location, topic, message['curves']))
+
+        # The publish is not waited upon.
+        mtn.vip.pubsub.publish(peer='pubsub',
+                               topic=topic,
+                               message=message)
+
+    def transactive_message(self, start_of_cycle=False, fail_to_converged=False):
+        # Build the message that sends the current transactive records to the
+        # transactive neighbor, and save them as sent. The message may be
+        # published by itself (see send_transactive_signal()) or together with
+        # the messages of other neighbors.
+        #
+        # OUTPUTS:
+        # message - dictionary of the source, the encoded records (curves),
+        #           and the start_of_cycle and fail_to_converged flags, or None
+        #           if no signal can be sent
+
         # If neighbor is non-transactive, warn and return. Non-transactive
         # neighbors do not communicate transactive signals.
         if not self.transactive:
             _log.warning(
                 'Non-transactive neighbors do not send transactive signals. No signal is sent to %s.' % self.name)
-            return
+            return None
 
         # Collect current transactive records concerning myTransactiveNode.
         transactive_records = self.mySignal
 
         if len(transactive_records) == 0:  # No signal records are ready to send
             _log.warning("No transactive records were found. No transactive signal can be sent to %s." % self.name)
-            return
+            return None
 
-        msg = json.dumps(transactive_records, default=json_econder)
-        msg = json.loads(msg)
-        _log.debug("At {}, {} sends signal from {} on topic {} message {}"
-                   .format(Timer.get_cur_time(),
-                           self.name,
-                           self.location, topic, msg))
-        mtn.vip.pubsub.publish(peer='pubsub',
-                               topic=topic,
-                               message={'source': self.location,
-                                        'curves': msg,
-                                        'start_of_cycle': start_of_cycle,
-                                        'fail_to_converged': fail_to_converged})
+        # Encode the records directly; VIP serializes the message itself.
+        msg = self.encode_delta(transactive_records, full=start_of_cycle)
 
         # Save the sent TransactiveRecord messages (i.e., sentSignal) as a copy
         # of the calculated set that was drawn upon by this method (i.e., mySignal).
         self.sentSignal = self.mySignal
+        self.index_signal('sent')
+        self.lastSendTime = Timer.get_cur_time()
+
+        return {'source': self.location,
+                'curves': msg,
+                'start_of_cycle': start_of_cycle,
+                'fail_to_converged': fail_to_converged}
 
     def receive_transactive_signal(self, mtn, curves):
         # Receive and save transactive records from a transactive Neighbor object.
@@ -1088,29 +1396,149 @@ class NeighborModel(Model, object):
         # available text table that is presumed to have been created by the
         # transactive neighbor. This process may change in field settings and using
         # Python and other code environments.
+        #
+        # OUTPUTS:
+        # changed - Boolean: true if the received signal differs materially from
+        #           the one received before (see signal_changed())
 
         # If trying to receive a transactive signal from a non-transactive neighbor,
         # create a warning and return.
         if not self.transactive:
             _log.warning('Transactive signals are not expected to be received from non-transactive neighbors. '
                          'No signal is read.')
-            return
+            return False
+
+        # Decode the versioned (or legacy) signal and save its records. A
+        # malformed signal or one of an unknown version is discarded.
+        try:
+            records = decode_signal(curves)
+        except (KeyError, ValueError) as e:
+            _log.error('{} could not decode a received signal: {}'.format(self.name, e))
+            return False
+
+        previous = self.receivedSignal
+
+        if not isinstance(curves, dict) or curves.get('sequence') is None:
+            # The signal is not sequenced, so it is a full signal.
+            self.receivedSignal = records
+
+        else:
+            # A gap means that a delta was missed. The records of the time
+            # intervals that it changed stay stale until the next full snapshot.
+            sequence = curves['sequence']
+
+            if self.receivedSequence is not None and sequence != self.receivedSequence + 1:
+                self.signalGaps = self.signalGaps + 1
+                _log.warning('{} expected signal {} but received signal {}.'.format(
+                    self.name, self.receivedSequence + 1, sequence))
 
-        self.receivedSignal = []
-        for curve in curves:
-            transative_record = TransactiveRecord(ti=curve['timeInterval'],
-                                                  rn=int(curve['record']),
-                                                  mp=float(curve['marginalPrice']),
-                                                  p=float(curve['power']),
-                                                  cost=float(curve['cost']))
-                                                  # pu=float(curve['powerUncertainty']),
-                                                  # rp=float(curve['reactivePower']),
-                                                  # rpu=float(curve['reactivePowerUncertainty']),
-                                                  # v=float(curve['voltage']),
-                                                  # vu=float(curve['voltageUncertainty']))
-
-            # Save each transactive record
-            self.receivedSignal.append(transative_record)
+            self.receivedSequence = sequence
+
+            if is_delta_signal(curves):
+                # Rebuild the full signal from the previous records.
+                self.receivedSignal = merge_signal(self.receivedSignal, records, curves['intervals'])
+            else:
+                self.receivedSignal = records
+
+        if self.priceSmoothing > 0:
+            self.receivedSignal = self.smoothed_prices(previous, self.receivedSignal)
+
+        self.index_signal('received')
+
+        # Tell whether the signal differs materially from the previous one,
+        # e.g., so that the node rebalances only if it does.
+        return self.signal_changed(previous, self.receivedSignal)
+
+    def smoothed_prices(self, previous, records):
+        # Exponentially smooth the marginal prices of received records, given
+        # the previously received records. A record that was not received
+        # before keeps its price.
+        # INPUTS:
+        # previous, records - lists of TransactiveRecord objects
+        # OUTPUTS:
+        # smoothed - list of TransactiveRecord objects
+        #
+        # Uses property priceSmoothing, the weight of the previous price.
+        # Smoothed records are copies, so that the records of the previous
+        # signal keep their prices.
+        previous = dict([((x.timeInterval, x.record), x) for x in previous])
+        a = self.priceSmoothing
+        smoothed = []
+
+        for x in records:
+            y = previous.get((x.timeInterval, x.record))
+
+            if y is None or y is x or y.marginalPrice == x.marginalPrice \
+                    or not np.isfinite(y.marginalPrice) or not np.isfinite(x.marginalPrice):
+                smoothed.append(x)
+                continue
+
+            z = copy(x)
+            z.marginalPrice = a * y.marginalPrice + (1 - a) * x.marginalPrice  # [$/kWh]
+            smoothed.append(z)
+
+        return smoothed
+
+    def signal_changed(self, previous, records):
+        # Returns true if two signals have different time intervals, or if
+        # their records in any time interval differ by more than the
+        # convergence threshold.
+        # INPUTS:
+        # previous, records - lists of TransactiveRecord objects
+        previous = records_by_interval(previous)
+        records = records_by_interval(records)
+
+        if set(previous) != set(records):
+            return True
+
+        return any([records_differ(records[x], previous[x], self.convergenceThreshold) for x in records])
+
+    def encode_delta(self, records, full=False):
+        # Encode the next sequenced signal, a delta of the time intervals
+        # whose records changed since they were last delivered to the neighbor.
+        # INPUTS:
+        # records - list of TransactiveRecord objects of the full signal
+        # full - true to send a full snapshot regardless of the sequence
+        # OUTPUTS:
+        # signal - versioned signal (see transactive_record.encode_signal())
+        #
+        # Uses property convergenceThreshold to decide whether the records of a
+        # time interval changed. Updates properties signalSequence and
+        # deliveredSignal.
+        self.signalSequence = self.signalSequence + 1
+
+        # Full snapshots are sent periodically, so a receiver that missed a
+        # delta recovers.
+        full = full or self.snapshotInterval <= 1 \
+            or (self.signalSequence - 1) % self.snapshotInterval == 0
+
+        groups = records_by_interval(records)
+        # Time interval names, in the order of the records.
+        intervals = []
+        for x in records:
+            if x.timeInterval not in intervals:
+                intervals.append(x.timeInterval)
+
+        if full:
+            changed = intervals
+        else:
+            changed = [x for x in intervals if x not in self.deliveredSignal
+                       or records_differ(groups[x], self.deliveredSignal[x], self.convergenceThreshold)]
+
+        # Keep what the neighbor holds. Time intervals whose changes were too
+        # small to send keep their previously delivered records, so small
+        # changes cannot accumulate unsent.
+        delivered = {}
+        for x in intervals:
+            delivered[x] = groups[x] if x in changed else self.deliveredSignal[x]
+        self.deliveredSignal = delivered
+
+        changed_records = [y for x in changed for y in groups[x]]
+
+        if full:
+            return encode_signal(changed_records, self.signalSequence)
+        else:
+            return encode_signal(changed_records, self.signalSequence, intervals)
 
 
 if __name__ == '__main__':
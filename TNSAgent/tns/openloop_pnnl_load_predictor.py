@@ -65,6 +65,7 @@ _log = logging.getLogger(__name__)
 
 from helpers import *
 from measurement_type import MeasurementType
+from model_dependency import ModelDependency
 from interval_value import IntervalValue
 from market import Market
 from time_interval import TimeInterval
@@ -272,6 +273,7 @@ class OpenLoopPnnlLoadPredictor(LocalAssetModel, object):
 
     def __init__(self, temperature_forecaster):
         super(OpenLoopPnnlLoadPredictor, self).__init__()
+        self.dependency = ModelDependency.ForecastDependent
         self.temperature_forecaster = temperature_forecaster
         self.model_2017_consumption = 42350128.
         self.campus_2017_consumption = 91116072.
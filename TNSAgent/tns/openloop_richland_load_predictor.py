@@ -65,6 +65,7 @@ _log = logging.getLogger(__name__)
 
 from helpers import *
 from measurement_type import MeasurementType
+from model_dependency import ModelDependency
 from interval_value import IntervalValue
 from market import Market
 from time_interval import TimeInterval
@@ -270,6 +271,7 @@ class OpenLoopRichlandLoadPredictor(LocalAssetModel, object):
 
     def __init__(self, temperature_forecaster):
         super(OpenLoopRichlandLoadPredictor, self).__init__()
+        self.dependency = ModelDependency.ForecastDependent
         self.temperature_forecaster = temperature_forecaster
 
     def schedule_power(self, mkt):
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2017, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+
+# }}}
+
+
+
+from datetime import datetime, timedelta
+
+
+class RebalanceScheduler(object):
+    """
+    A RebalanceScheduler runs a node's market rebalance when transactive
+    signals arrive, rather than only on a fixed timer. Requests that arrive
+    while a rebalance is pending are coalesced into that rebalance: it runs
+    a short debounce after the first request, and no sooner than a minimum
+    interval after the previous rebalance.
+
+    The rebalance is called with the list of coalesced requests, each a
+    dictionary of the keyword arguments of request().
+    """
+
+    def __init__(self, callback, schedule, debounce=timedelta(seconds=2), min_interval=timedelta(seconds=10),
+                 clock=datetime.now):
+        # CALLBACK - function that rebalances, given the coalesced requests
+        self.callback = callback
+
+        # SCHEDULE - function that calls a function at a datetime, e.g.,
+        #            Agent.core.schedule(deadline, function)
+        self.schedule = schedule
+
+        self.clock = clock  # function that returns the current datetime
+        self.debounce = debounce  # delay that coalesces a burst of requests [timedelta]
+        self.lastRun = None  # datetime when the last rebalance started
+        self.minInterval = min_interval  # least time between rebalances [timedelta]
+        self.pending = None  # coalesced requests of the scheduled rebalance, if any
+        self.requestCount = 0  # number of requests
+        self.runCount = 0  # number of rebalances
+
+    def request(self, **kwargs):
+        # Request a rebalance. The rebalance runs immediately if neither the
+        # debounce nor the minimum interval delays it. Otherwise, it is
+        # scheduled, unless one is already pending.
+        self.requestCount = self.requestCount + 1
+
+        if self.pending is not None:
+            self.pending.append(kwargs)
+            return
+
+        self.pending = [kwargs]
+
+        now = self.clock()
+        deadline = now + self.debounce
+
+        if self.lastRun is not None:
+            deadline = max(deadline, self.lastRun + self.minInterval)
+
+        if deadline <= now:
+            self.run()
+        else:
+            self.schedule(deadline, self.run)
+
+    def run(self):
+        # Run the pending rebalance with its coalesced requests.
+        requests = self.pending
+        self.pending = None
+
+        if requests is None:
+            return
+
+        self.lastRun = self.clock()
+        self.runCount = self.runCount + 1
+        self.callback(requests)
@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2017, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+
+# }}}
+
+
+import logging
+import time
+from datetime import datetime, timedelta
+
+from bulk_supplier_dc import BulkSupplier_dc
+from event_clock import EventClock
+from local_asset import LocalAsset
+from local_asset_model import LocalAssetModel
+from market import Market
+from market_state import MarketState
+from myTransactiveNode import myTransactiveNode
+from neighbor import Neighbor
+from neighbor_model import NeighborModel
+from rebalance_scheduler import RebalanceScheduler
+from timer import Timer
+from vertex import Vertex
+
+_log = logging.getLogger(__name__)
+
+
+class MemoryBus(object):
+    """
+    A MemoryBus carries the messages of simulated nodes in one process, in
+    place of the VOLTTRON message bus. It has the publish() and subscribe()
+    methods of Agent.vip.pubsub, so a node can be passed as myTransactiveNode
+    to NeighborModel.send_transactive_signal(). A message is delivered to the
+    callbacks subscribed to a prefix of its topic after a latency on the
+    event clock, and messages are delivered in the order they were published.
+    """
+
+    def __init__(self, clock, latency=timedelta(seconds=1)):
+        self.clock = clock  # EventClock
+        self.latency = latency  # delay from publish to delivery [timedelta]
+        self.messageCount = 0  # number of messages published
+        self.subscriptions = []  # [(topic prefix, callback)]
+
+    def subscribe(self, peer='pubsub', prefix='', callback=None):
+        self.subscriptions.append((prefix, callback))
+
+    def publish(self, peer='pubsub', topic='', headers=None, message=None):
+        self.messageCount = self.messageCount + 1
+
+        for prefix, callback in self.subscriptions:
+            if topic.startswith(prefix):
+                self.clock.schedule(self.clock.now() + self.latency, callback,
+                                    peer, 'memory_bus', 'pubsub', topic, headers or {}, message)
+
+
+class MemoryVip(object):
+    # The part of Agent.vip that transactive signals are sent through.
+    def __init__(self, bus):
+        self.pubsub = bus
+
+
+class SimulatedNode(myTransactiveNode):
+    """
+    A SimulatedNode is a myTransactiveNode that balances its market and
+    exchanges transactive signals with its neighbors the way the city, campus,
+    and building agents do, but on a MemoryBus and an EventClock rather than
+    a VOLTTRON platform.
+
+    The Neighbor objects of transactive neighbors are named for the nodes
+    they represent. A node receives signals on topic "tns/<its name>/".
+    """
+
+    def __init__(self, name, bus, debounce=timedelta(seconds=2), min_interval=timedelta(seconds=10)):
+        super(SimulatedNode, self).__init__()
+        self.name = name
+        self.bus = bus
+        self.vip = MemoryVip(bus)
+        self.upstream = None  # Neighbor that supplies this node, if any
+
+        self.rebalancer = RebalanceScheduler(self.rebalance, bus.clock.schedule, debounce, min_interval,
+                                             bus.clock.now)
+
+        # Timing and message counts, see Simulation.report()
+        self.balanceCount = 0
+        self.balanceIterations = 0  # balance iterations, as counted by Market.dualityGaps
+        self.balanceSeconds = 0.0  # wall-clock time spent balancing [s]
+        self.signalsReceived = 0
+        self.signalsSent = 0
+
+        bus.subscribe(prefix=self.topic(name), callback=self.new_signal)
+
+    @staticmethod
+    def topic(name):
+        # The topic on which the named node receives transactive signals.
+        return "tns/{}/".format(name)
+
+    def transactive_neighbors(self):
+        return [x for x in self.neighbors if x.model.transactive]
+
+    def start_cycle(self):
+        # Start a market cycle, e.g., at the top of an hour, by balancing and
+        # sending signals to all the downstream neighbors.
+        self.balance(start_of_cycle=True)
+
+    def new_signal(self, peer, sender, bus, topic, headers, message):
+        neighbor = [x for x in self.neighbors if x.name == message['source']]
+
+        if len(neighbor) == 0:
+            _log.warning("{} received a signal from unknown node {}.".format(self.name, message['source']))
+            return
+
+        neighbor = neighbor[0]
+        self.signalsReceived = self.signalsReceived + 1
+
+        changed = neighbor.model.receive_transactive_signal(self, message['curves'])
+        start_of_cycle = message['start_of_cycle']
+        fail_to_converged = message['fail_to_converged']
+
+        if changed or start_of_cycle or fail_to_converged:
+            self.rebalancer.request(start_of_cycle=start_of_cycle,
+                                    neighbor=neighbor if fail_to_converged else None)
+
+    def rebalance(self, requests):
+        # Balance once for the coalesced requests (see RebalanceScheduler).
+        start_of_cycle = any([x.get('start_of_cycle', False) for x in requests])
+        neighbors = [x['neighbor'] for x in requests if x.get('neighbor') is not None]
+        self.balance(start_of_cycle, neighbors)
+
+    def balance(self, start_of_cycle=False, fail_to_converged_neighbors=()):
+        market = self.markets[0]  # Assume only 1 TNS market per node
+
+        t0 = time.time()
+        market.balance(self)
+        self.balanceSeconds = self.balanceSeconds + time.time() - t0
+        self.balanceCount = self.balanceCount + 1
+        self.balanceIterations = self.balanceIterations + len(market.dualityGaps)
+
+        if not market.converged:
+            _log.debug("{} market balancing sub-problem failed.".format(self.name))
+            if self.upstream is not None:
+                self.send_signal(self.upstream, start_of_cycle)
+            return
+
+        # Sum all the powers as will be needed by the net supply/demand curve.
+        market.assign_system_vertices(self)
+
+        # Downstream neighbors are always sent signals at the start of a
+        # cycle, and others only if they are not converged.
+        deferred = False
+        for n in self.transactive_neighbors():
+            if n in fail_to_converged_neighbors or (start_of_cycle and n != self.upstream):
+                self.send_signal(n, start_of_cycle)
+            else:
+                n.model.check_for_convergence(market)
+                if n.model.send_due():
+                    self.send_signal(n, start_of_cycle)
+                elif not n.model.converged:
+                    deferred = True
+
+        # Deferred signals are sent by a later rebalance.
+        if deferred:
+            self.rebalancer.request()
+
+    def send_signal(self, n, start_of_cycle=False):
+        n.model.prep_transactive_signal(self.markets[0], self)
+        n.model.send_transactive_signal(self, self.topic(n.name), start_of_cycle)
+        self.signalsSent = self.signalsSent + 1
+
+
+class Simulation(object):
+    """
+    A Simulation runs several SimulatedNode objects, e.g., a city, a campus,
+    and its buildings, in one process. Market cycles are driven on a
+    discrete-event clock, so they are deterministic and take only the time
+    the balances take. Timing reports benchmark the convergence speed and
+    balance costs (see report()).
+
+    The markets are balanced by the agents' default interpolation method (2)
+    unless another is assigned to marketMethod. The report counts the balance
+    iterations, so that methods may be compared.
+
+    The simulation installs its clock as Timer.clock while it is open. Use it
+    as a context manager, or call close() to restore the Timer.
+    """
+
+    def __init__(self, start_time=datetime(2018, 1, 1), latency=timedelta(seconds=1),
+                 debounce=timedelta(seconds=2), min_interval=timedelta(seconds=10)):
+        self.clock = EventClock(start_time)
+        self.bus = MemoryBus(self.clock, latency)
+        self.cycleDuration = timedelta(hours=1)
+        self.cycles = []  # [dictionary of the report of each cycle run]
+        self.debounce = debounce
+        self.marketMethod = 2  # see Market.balance()
+        self.maxEvents = 100000  # events per cycle, a guard against endless signal exchanges
+        self.minInterval = min_interval
+        self.nodes = []  # [SimulatedNode]
+        self.roots = []  # nodes that start the market cycles
+        self.startTime = start_time
+
+        self.previousClock = Timer.clock
+        Timer.clock = self.clock
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        Timer.clock = self.previousClock
+
+    def add_node(self, name, market=None):
+        # Add a node having one market. The first node added starts the
+        # market cycles, unless roots are assigned otherwise.
+        node = SimulatedNode(name, self.bus, self.debounce, self.minInterval)
+        node.markets.append(market if market is not None else make_market(method=self.marketMethod))
+        self.nodes.append(node)
+
+        if len(self.roots) == 0:
+            self.roots.append(node)
+
+        return node
+
+    def connect(self, upstream, downstream, capacity, prices=(0.045, 0.048), threshold=0.02):
+        # Connect two nodes as transactive neighbors. The upstream node may
+        # supply the downstream node up to a capacity [avg.kW] at marginal
+        # prices [$/kWh] that rise with the power, until signals say otherwise.
+        # OUTPUTS:
+        # up, down - the Neighbor objects of the upstream node in the
+        #            downstream node, and of the downstream node in the
+        #            upstream node
+        up = Neighbor()
+        up.name = upstream.name
+        up.maximumPower = capacity  # [avg.kW]
+        up.minimumPower = 0.0  # [avg.kW]
+
+        up_model = NeighborModel()
+        up_model.name = upstream.name + '_Model'
+        up_model.location = downstream.name
+        up_model.transactive = True
+        up_model.defaultVertices = [Vertex(prices[0], 0, 0, True), Vertex(prices[1], 0, capacity, True)]
+        up_model.costParameters = [0, 0, 0]
+        up_model.object = up
+        up.model = up_model
+
+        down = Neighbor()
+        down.name = downstream.name
+        down.maximumPower = 0.0  # Remember loads have negative power [avg.kW]
+        down.minimumPower = -capacity  # [avg.kW]
+
+        down_model = NeighborModel()
+        down_model.name = downstream.name + '_Model'
+        down_model.location = upstream.name
+        down_model.convergenceThreshold = threshold
+        down_model.friend = True
+        down_model.transactive = True
+        down_model.defaultPower = -capacity / 2  # [avg.kW]
+        down_model.defaultVertices = [Vertex(float("inf"), 0, down_model.defaultPower, True)]
+        down_model.costParameters = [0, 0, 0]
+        down_model.object = down
+        down.model = down_model
+
+        downstream.neighbors.append(up)
+        downstream.upstream = up
+        upstream.neighbors.append(down)
+
+        return up, down
+
+    def run(self, cycles=1):
+        # Run market cycles. In each, the roots balance and send signals at
+        # the start of the cycle, and the nodes exchange signals until none
+        # is pending, the cycle ends, or maxEvents have run.
+        # OUTPUTS:
+        # reports - list of the reports of the cycles run
+        reports = []
+
+        for i in range(cycles):
+            start = self.startTime + len(self.cycles) * self.cycleDuration
+
+            # Let simulated time pass to the start of the cycle.
+            self.clock.run(until=start)
+
+            counts = self.counts()
+            events = self.clock.eventCount
+            t0 = time.time()
+
+            for x in self.roots:
+                self.clock.schedule(start, x.start_cycle)
+
+            # Run the events of the cycle. The clock stays at the time of
+            # the last one.
+            end = start + self.cycleDuration
+            while self.clock.eventCount - events < self.maxEvents \
+                    and self.clock.next_time() is not None and self.clock.next_time() < end:
+                self.clock.step()
+
+            report = self.difference(self.counts(), counts)
+            report['cycle'] = len(self.cycles)
+            report['start'] = start
+            report['wall_seconds'] = time.time() - t0
+            report['events'] = self.clock.eventCount - events
+            report['settled'] = self.clock.next_time() is None or self.clock.next_time() >= end
+            # The nodes are converged when their markets are balanced, and no
+            # node has a signal to send or a rebalance pending.
+            report['converged'] = report['settled'] and all([x.markets[0].converged for x in self.nodes])
+            report['converge_seconds'] = (self.clock.now() - start).total_seconds()  # simulated [s]
+
+            self.cycles.append(report)
+            reports.append(report)
+
+        return reports
+
+    def counts(self):
+        # The cumulative timing and message counts of the nodes and the bus.
+        nodes = {}
+        for x in self.nodes:
+            nodes[x.name] = {'balances': x.balanceCount,
+                             'iterations': x.balanceIterations,
+                             'balance_seconds': x.balanceSeconds,
+                             'signals_sent': x.signalsSent,
+                             'signals_received': x.signalsReceived}
+
+        return {'messages': self.bus.messageCount, 'nodes': nodes}
+
+    @staticmethod
+    def difference(counts, before):
+        # The counts since earlier counts.
+        nodes = {}
+        for name in counts['nodes']:
+            b = before['nodes'].get(name, {})
+            nodes[name] = dict([(k, v - b.get(k, 0)) for k, v in counts['nodes'][name].items()])
+
+        return {'messages': counts['messages'] - before['messages'], 'nodes': nodes}
+
+    def report(self):
+        # Summarize the cycles run: convergence speed, message counts, and the
+        # balance costs of the nodes.
+        lines = ['{:>5} {:>9} {:>8} {:>9} {:>10} {:>10} {:>11} {:>9}'.format(
+            'cycle', 'converged', 'messages', 'balances', 'iterations', 'balance s', 'converge s', 'wall s')]
+
+        for x in self.cycles:
+            balances = sum([y['balances'] for y in x['nodes'].values()])
+            iterations = sum([y['iterations'] for y in x['nodes'].values()])
+            balance_seconds = sum([y['balance_seconds'] for y in x['nodes'].values()])
+            lines.append('{:>5} {:>9} {:>8} {:>9} {:>10} {:>10.3f} {:>11.1f} {:>9.3f}'.format(
+                x['cycle'], str(x['converged']), x['messages'], balances, iterations, balance_seconds,
+                x['converge_seconds'], x['wall_seconds']))
+
+        return '\n'.join(lines)
+
+
+def make_market(name='dayAhead', method=2, default_price=0.0428):
+    # A market configured as in the city, campus, and building agents: 24
+    # hourly time intervals, cleared hourly.
+    market = Market()
+    market.name = name
+    market.commitment = False
+    market.converged = False
+    market.defaultPrice = default_price  # [$/kWh]
+    market.dualityGapThreshold = 0.01  # [0.02 = 2#]
+    market.method = method
+    market.initialMarketState = MarketState.Inactive
+    market.marketOrder = 1  # This is first and only market
+    market.intervalsToClear = 1  # Only one interval at a time
+    market.futureHorizon = timedelta(hours=24)  # Projects 24 hourly future intervals
+    market.intervalDuration = timedelta(hours=1)  # [h] Intervals are 1 h long
+    market.marketClearingInterval = timedelta(hours=1)  # [h]
+    market.marketClearingTime = Timer.get_cur_time().replace(hour=0,
+                                                             minute=0,
+                                                             second=0,
+                                                             microsecond=0)  # Aligns with top of hour
+    market.nextMarketClearingTime = market.marketClearingTime + timedelta(hours=1)
+    return market
+
+
+def make_load(name, power):
+    # An inelastic load [avg.kW], a negative power.
+    load = LocalAsset()
+    load.name = name
+    load.maximumPower = 0.0  # [avg.kW]
+    load.minimumPower = 2 * power  # [avg.kW]
+
+    load_model = LocalAssetModel()
+    load_model.name = name + 'Model'
+    load_model.defaultPower = power  # [avg.kW]
+    load_model.defaultVertices = [Vertex(float("inf"), 0.0, power, True)]
+
+    load_model.object = load
+    load.model = load_model
+    return load
+
+
+def make_supplier(name, maximum_power, loss_factor=0.02):
+    # A non-transactive bulk supplier, as the city agent's.
+    supplier = Neighbor()
+    supplier.name = name
+    supplier.lossFactor = loss_factor
+    supplier.maximumPower = maximum_power  # [avg.kW]
+    supplier.minimumPower = 0.0  # [avg.kW, will not export]
+
+    supplier_model = BulkSupplier_dc()
+    supplier_model.name = name + 'Model'
+    supplier_model.transactive = False
+    d1 = Vertex(0.04196, 2000.0, 0.0)  # [$/kWh, $/h, avg.kW]
+    d2 = Vertex(d1.marginalPrice / (1 - loss_factor), 0, (1 - loss_factor) * maximum_power)
+    d2.cost = d1.cost + d2.power * (d1.marginalPrice + 0.5 * (d2.marginalPrice - d1.marginalPrice))  # [$/h]
+    supplier_model.defaultVertices = [d1, d2]
+    supplier_model.costParameters[0] = 2000.0  # [$/h]
+
+    supplier_model.object = supplier
+    supplier.model = supplier_model
+    return supplier
+
+
+def make_hierarchy(simulation, building_count, building_load=-60.0, campus_load=-6000.0, city_load=-100420.0):
+    # Build a city that supplies a campus, which supplies a number of
+    # buildings, each with an inelastic load [avg.kW].
+    # OUTPUTS:
+    # city, campus, buildings - SimulatedNode objects
+    city = simulation.add_node('city')
+    campus = simulation.add_node('campus')
+    buildings = [simulation.add_node('building{}'.format(i)) for i in range(building_count)]
+
+    campus_capacity = -2 * (campus_load + building_count * building_load)  # [avg.kW]
+
+    city.localAssets.append(make_load('InelasticLoad', city_load))
+    city.neighbors.append(make_supplier('BPA', -2 * city_load + campus_capacity))
+    simulation.connect(city, campus, campus_capacity)
+
+    campus.localAssets.append(make_load('InelasticBuildings', campus_load))
+
+    for x in buildings:
+        x.localAssets.append(make_load('BuildingLoad', building_load))
+        simulation.connect(campus, x, -2 * building_load)
+
+    return city, campus, buildings
+
+
+if __name__ == '__main__':
+    import sys
+
+    # Benchmark a hierarchy, e.g., "python simulation_harness.py 100 3" for
+    # three cycles of a campus of 100 buildings. It is balanced by the agents'
+    # default method (2) and by the decomposed method (4).
+    building_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    cycle_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+    for method in [2, 4]:
+        with Simulation() as simulation:
+            simulation.marketMethod = method
+            make_hierarchy(simulation, building_count)
+            simulation.run(cycle_count)
+            print('Market method {}:'.format(method))
+            print(simulation.report())
@@ -59,6 +59,7 @@
 
 from helpers import *
 from measurement_type import MeasurementType
+from model_dependency import ModelDependency
 from local_asset import LocalAsset
 from local_asset_model import LocalAssetModel
 from interval_value import IntervalValue
@@ -76,6 +77,7 @@ class SolarPvResourceModel(LocalAssetModel, object):
 
     def __init__(self):
         super(SolarPvResourceModel, self).__init__()
+        self.dependency = ModelDependency.ForecastDependent
         self.cloudFactor = 1.0
 
     def schedule_power(self, mkt):
@@ -155,10 +157,11 @@ class SolarPvResourceModel(LocalAssetModel, object):
                 iv.value = val  # [$]
 
         # Remove any extra scheduled powers
-        self.scheduledPowers = [x for x in self.scheduledPowers if x.timeInterval in tis]
+        sts = set([x.startTime for x in tis])
+        self.scheduledPowers = [x for x in self.scheduledPowers if x.timeInterval.startTime in sts]
 
         # Remove any extra engagement schedule values
-        self.engagementSchedule = [x for x in self.engagementSchedule if x.timeInterval in tis]
+        self.engagementSchedule = [x for x in self.engagementSchedule if x.timeInterval.startTime in sts]
 
 
 if __name__ == '__main__':
@@ -61,9 +61,10 @@ import logging
 
 from volttron.platform.agent import utils
 
-from vertex import Vertex
+from vertex_set import VertexSet
 from interval_value import IntervalValue
 from measurement_type import MeasurementType
+from model_dependency import ModelDependency
 from helpers import *
 from market import Market
 from time_interval import TimeInterval
@@ -94,6 +95,7 @@ class TccModel(LocalAssetModel):
 
     def __init__(self):
         super(TccModel, self).__init__()
+        self.dependency = ModelDependency.PriceDependent
         self.buildingRecords = None
         self.quantities = None
         self.tcc_curves = None
@@ -116,18 +118,19 @@ class TccModel(LocalAssetModel):
             # Curves existed, update vertices first
             self.update_vertices(mkt)
 
+        values = [self.defaultPower] * len(time_intervals)
+
+        if self.tcc_curves is not None and len(time_intervals) > 0:
+            # Update powers at the marginal prices of all time intervals at once
+            marginal_prices = [find_obj_by_ti(mkt.marginalPrices, ti).value for ti in time_intervals]
+            mps, powers, counts, costs, continuous = vertex_rows(self, time_intervals)
+            values = production_from_rows(mps, powers, marginal_prices, continuous).tolist()  # [avg. kW]
+
         for i in range(len(time_intervals)):
-            value = self.defaultPower
             # if self.quantities is not None and len(self.quantities) > i and self.quantities[i] is not None:
-            #     value = -self.quantities[i]
+            #     values[i] = -self.quantities[i]
 
-            if self.tcc_curves is not None:
-                # Update power at this marginal_price
-                marginal_price = find_obj_by_ti(mkt.marginalPrices, time_intervals[i])
-                marginal_price = marginal_price.value
-                value = production(self, marginal_price, time_intervals[i])  # [avg. kW]
-
-            iv = IntervalValue(self, time_intervals[i], mkt, MeasurementType.ScheduledPower, value)
+            iv = IntervalValue(self, time_intervals[i], mkt, MeasurementType.ScheduledPower, values[i])
             self.scheduledPowers.append(iv)
 
         sp = [(x.timeInterval.name, x.value) for x in self.scheduledPowers]
@@ -151,24 +154,27 @@ class TccModel(LocalAssetModel):
             else:
                 self.activeVertices = []
 
-            for i in range(len(time_intervals)):
-                if self.tcc_curves[i] is None:
-                    continue
-                point1 = self.tcc_curves[i][0].tuppleize()
-                q1 = -point1[0]
-                p1 = point1[1]
-                point2 = self.tcc_curves[i][1].tuppleize()
-                q2 = -point2[0]
-                p2 = point2[1]
-
-                v1 = Vertex(p1, 0, q1)
-                iv1 = IntervalValue(self, time_intervals[i], mkt, MeasurementType.ActiveVertex, v1)
-                self.activeVertices.append(iv1)
-
-                if q2 != q1:
-                    v2 = Vertex(p2, 0, q2)
-                    iv2 = IntervalValue(self, time_intervals[i], mkt, MeasurementType.ActiveVertex, v2)
-                    self.activeVertices.append(iv2)
+            # The vertices of every time interval are replaced.
+            invalidate_vertices(self)
+
+            # Gather the two points of the curve in each time interval that has one.
+            tis = [time_intervals[i] for i in range(len(time_intervals)) if self.tcc_curves[i] is not None]
+            points = [(self.tcc_curves[i][0].tuppleize(), self.tcc_curves[i][1].tuppleize())
+                      for i in range(len(time_intervals)) if self.tcc_curves[i] is not None]
+
+            if len(tis) > 0:
+                keys = [ti.key for ti in tis]
+                q1 = np.array([-x[0][0] for x in points], dtype=float)
+                p1 = np.array([x[0][1] for x in points], dtype=float)
+                q2 = np.array([-x[1][0] for x in points], dtype=float)
+                p2 = np.array([x[1][1] for x in points], dtype=float)
+
+                # The second point makes a vertex only where its power differs.
+                first = VertexSet.from_arrays(p1, 0.0, q1, keys=keys)
+                second = VertexSet.from_arrays(p2, 0.0, q2, keys=keys)[q2 != q1]
+
+                vertices = VertexSet.merge([first, second]).sorted()
+                self.activeVertices.extend(vertices.to_interval_values(self, tis, mkt, MeasurementType.ActiveVertex))
 
         av = [(x.timeInterval.name, x.value.marginalPrice, x.value.power) for x in self.activeVertices]
         _log.debug("TCC active vertices are: {}".format(av))
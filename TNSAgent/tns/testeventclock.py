@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2017, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+
+# }}}
+
+
+import time
+from datetime import datetime, timedelta
+
+from event_clock import EventClock
+from market import Market
+from market_state import MarketState
+from myTransactiveNode import myTransactiveNode
+from time_interval import TimeInterval
+from timer import Timer
+
+
+def test_all():
+    print('Running EventClock.test_all()')
+    test_event_order()
+    test_run_until()
+    test_timer()
+    test_study_speed()
+
+
+def test_event_order():
+    print('Running EventClock.test_event_order()')
+    pf = 'pass'
+
+    start = datetime(2018, 1, 1)
+    test_clock = EventClock(start)
+    calls = []
+
+    def call(name):
+        calls.append((name, test_clock.now()))
+
+    ## CASE: Events run in time order, and in the order scheduled at the same time
+    test_clock.schedule(start + timedelta(hours=2), call, 'meter')
+    test_clock.schedule(start + timedelta(hours=1), call, 'balance')
+    test_clock.schedule(start + timedelta(hours=1), call, name='signal')
+    cancelled = test_clock.schedule(start + timedelta(minutes=30), call, 'cancelled')
+    cancelled.cancel()
+
+    count = test_clock.run()
+
+    if count != 3 or [x[0] for x in calls] != ['balance', 'signal', 'meter']:
+        pf = 'fail'
+        raise Exception('- the events did not run in order')
+    else:
+        print('- the events ran in order, and the cancelled event did not run')
+
+    if calls[0][1] != start + timedelta(hours=1) or test_clock.now() != start + timedelta(hours=2):
+        pf = 'fail'
+        raise Exception('- the simulated time did not advance to the events')
+    else:
+        print('- the simulated time advanced straight to the events')
+
+    ## CASE: A deadline that has passed is due now
+    test_clock.schedule(start, call, 'late')
+    test_clock.step()
+
+    if calls[-1] != ('late', start + timedelta(hours=2)):
+        pf = 'fail'
+        raise Exception('- the late event did not run at the current time')
+    else:
+        print('- the late event ran at the current time')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_run_until():
+    print('Running EventClock.test_run_until()')
+    pf = 'pass'
+
+    start = datetime(2018, 1, 1)
+    test_clock = EventClock(start)
+    calls = []
+
+    # An hourly event that schedules the next one.
+    def hourly():
+        calls.append(test_clock.now())
+        test_clock.schedule(test_clock.now() + timedelta(hours=1), hourly)
+
+    test_clock.schedule(start, hourly)
+
+    ## CASE: Run to a simulated time
+    count = test_clock.run(until=start + timedelta(hours=5, minutes=30))
+
+    if count != 6 or test_clock.now() != start + timedelta(hours=5, minutes=30) \
+            or test_clock.next_time() != start + timedelta(hours=6):
+        pf = 'fail'
+        raise Exception('- the clock did not run to the simulated time')
+    else:
+        print('- the clock ran to the simulated time')
+
+    ## CASE: Run a number of events
+    count = test_clock.run(max_events=2)
+
+    if count != 2 or calls[-1] != start + timedelta(hours=7) or test_clock.eventCount != 8:
+        pf = 'fail'
+        raise Exception('- the clock did not run the number of events')
+    else:
+        print('- the clock ran the number of events')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_timer():
+    print('Running EventClock.test_timer()')
+    pf = 'pass'
+
+    start = datetime(2018, 1, 1)
+    test_clock = EventClock(start)
+
+    test_market = Market()
+    test_interval = TimeInterval(start, timedelta(hours=1), test_market, start, start + timedelta(hours=1))
+    states = []
+
+    test_clock.schedule(start + timedelta(minutes=30), test_interval.assign_state, test_market)
+    test_clock.schedule(start + timedelta(minutes=30), lambda: states.append(test_interval.marketState))
+    test_clock.schedule(start + timedelta(hours=1, minutes=30), test_interval.assign_state, test_market)
+    test_clock.schedule(start + timedelta(hours=1, minutes=30), lambda: states.append(test_interval.marketState))
+
+    Timer.clock = test_clock
+
+    try:
+        ## CASE: The timer and the market states follow the simulated time
+        test_clock.run()
+
+        if Timer.get_cur_time() != test_clock.now() or Timer.get_schedule_time() != test_clock.now():
+            pf = 'fail'
+            raise Exception('- the timer did not return the simulated time')
+        else:
+            print('- the timer returned the simulated time')
+
+        if states != [MarketState.Transaction, MarketState.Delivery]:
+            pf = 'fail'
+            raise Exception('- the market states did not follow the simulated time')
+        else:
+            print('- the market states followed the simulated time')
+
+        ## CASE: A node schedules its calls on the event clock
+        test_node = myTransactiveNode()
+        calls = []
+        test_node.schedule(test_clock.now() + timedelta(hours=1), calls.append, 'balance')
+        test_clock.run()
+
+        if calls != ['balance'] or test_clock.now() != start + timedelta(hours=2, minutes=30):
+            pf = 'fail'
+            raise Exception('- the node did not schedule on the event clock')
+        else:
+            print('- the node scheduled on the event clock')
+
+    finally:
+        Timer.clock = None
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_study_speed():
+    print('Running EventClock.test_study_speed()')
+    pf = 'pass'
+
+    start = datetime(2018, 1, 1)
+    test_clock = EventClock(start)
+    weeks = 4
+    balances = []
+
+    # Every simulated hour, a node balances and its signals cause two more
+    # balances a few simulated minutes later.
+    def balance(start_of_cycle):
+        balances.append(test_clock.now())
+        if start_of_cycle:
+            test_clock.schedule(test_clock.now() + timedelta(minutes=2), balance, False)
+            test_clock.schedule(test_clock.now() + timedelta(minutes=5), balance, False)
+            test_clock.schedule(test_clock.now() + timedelta(hours=1), balance, True)
+
+    test_clock.schedule(start, balance, True)
+
+    ## CASE: Weeks of simulated time pass without waiting
+    t0 = time.time()
+    test_clock.run(until=start + timedelta(weeks=weeks) - timedelta(seconds=1))
+    seconds = time.time() - t0
+
+    if len(balances) != 3 * 24 * 7 * weeks or seconds > 5:
+        pf = 'fail'
+        raise Exception('- the simulated weeks did not run as fast as they were computed')
+    else:
+        print('- {} simulated weeks ran in {:.3f} s'.format(weeks, seconds))
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+if __name__ == '__main__':
+    test_all()
@@ -189,6 +189,7 @@ def test_production():
 
     ## CASE: One vertex (inelastic case, a constant)
     test_object.activeVertices = [IntervalValue(test_object, ti, test_market, MeasurementType.ActiveVertex, av[2])]
+    invalidate_vertices(test_object, ti)
 
     for i in range(5):
         p[i] = production(test_object, test_prices[i], ti)
@@ -202,6 +203,7 @@ def test_production():
 
     ## CASE: No active vertices (error case):
     test_object.activeVertices = []
+    invalidate_vertices(test_object, ti)
 
     try:
         p = production(test_object, test_prices[4], ti)
@@ -215,6 +217,187 @@ def test_production():
     print('Result: #s\n\n', pf)
 
 
+def test_cached_vertices():
+    from local_asset_model import LocalAssetModel
+    from market import Market
+
+    print('Running test_cached_vertices()')
+    pf = 'pass'
+
+    test_object = LocalAssetModel()
+    test_market = Market()
+
+    dt = datetime.now()
+    dur = timedelta(hours=1)
+    ti = [TimeInterval(dt, dur, test_market, dt, dt + i * dur) for i in range(2)]
+
+    av = [Vertex(0.0250, 9.25, 200.0),
+          Vertex(0.0200, 5.00, 0.0)]
+    test_object.activeVertices = [IntervalValue(test_object, ti[0], test_market, MeasurementType.ActiveVertex, x)
+                                  for x in av]
+
+    ## CASE: The vertices are ordered and cached
+    v = ordered_vertices(test_object, ti[0])
+
+    if [x.power for x in v] != [0.0, 200.0]:
+        pf = 'fail'
+        raise Exception('- the vertices were not ordered')
+
+    if ordered_vertices(test_object, ti[0]) is not v:
+        pf = 'fail'
+        raise Exception('- the ordered vertices were not cached')
+    else:
+        print('- the ordered vertices were cached')
+
+    mps, powers, costs = vertex_arrays(test_object, ti[0])
+    if list(mps) != [0.02, 0.025] or list(powers) != [0.0, 200.0] or list(costs) != [5.0, 9.25]:
+        pf = 'fail'
+        raise Exception('- the vertex arrays were not as expected')
+
+    ## CASE: A vertex is revised in place and the interval is invalidated
+    av[0].power = 100.0
+    invalidate_vertices(test_object, ti[0])
+
+    if production(test_object, 0.03, ti[0]) != 100.0:
+        pf = 'fail'
+        raise Exception('- the invalidated vertices were not gathered again')
+    else:
+        print('- the invalidated vertices were gathered again')
+
+    ## CASE: Active vertices are added
+    test_object.activeVertices.append(
+        IntervalValue(test_object, ti[1], test_market, MeasurementType.ActiveVertex, Vertex(0.03, 0.0, 50.0)))
+
+    if len(ordered_vertices(test_object, ti[1])) != 1:
+        pf = 'fail'
+        raise Exception('- the added vertex was not found')
+    else:
+        print('- the added vertex was found')
+
+    ## CASE: Only the written time interval is invalidated
+    v = ordered_vertices(test_object, ti[0])
+    test_object.activeVertices.append(
+        IntervalValue(test_object, ti[1], test_market, MeasurementType.ActiveVertex, Vertex(0.04, 0.0, 80.0)))
+    invalidate_vertices(test_object, ti[1])
+
+    if ordered_vertices(test_object, ti[0]) is not v or len(ordered_vertices(test_object, ti[1])) != 2:
+        pf = 'fail'
+        raise Exception('- the cache was not invalidated by time interval')
+    else:
+        print('- only the written time interval was invalidated')
+
+    ## CASE: The model updates its vertices
+    test_market.timeIntervals = ti
+    test_object.scheduledPowers = [
+        IntervalValue(test_object, ti[i], test_market, MeasurementType.ScheduledPower, -30.0 - 10 * i)
+        for i in range(2)]
+    test_object.activeVertices = []
+    test_object.update_vertices(test_market)
+
+    if [x.power for x in ordered_vertices(test_object, ti[0])] != [-30.0] \
+            or [x.power for x in ordered_vertices(test_object, ti[1])] != [-40.0]:
+        pf = 'fail'
+        raise Exception('- the updated vertices were not gathered again')
+    else:
+        print('- the updated vertices were gathered again')
+
+    #   Success
+    print('- the test function ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_aligned_values():
+    from local_asset_model import LocalAssetModel
+    from market import Market
+
+    print('Running test_aligned_values()')
+    pf = 'pass'
+
+    test_object = LocalAssetModel()
+    test_market = Market()
+    dt = datetime(2018, 7, 4, 13, 0)
+    dur = timedelta(hours=1)
+    ti = [TimeInterval(dt, dur, test_market, dt, dt + i * dur) for i in range(3)]
+
+    test_object.scheduledPowers = [IntervalValue(test_object, ti[i], test_market, MeasurementType.ScheduledPower,
+                                                 10.0 * (i + 1)) for i in [0, 2]]
+
+    ## CASE: Values are aligned with the time intervals
+    values = aligned_values(test_object.scheduledPowers, [ti[2], ti[0]])
+
+    if values != [30.0, 10.0]:
+        pf = 'fail'
+        raise Exception('- the values were not aligned with the time intervals')
+    else:
+        print('- the values were aligned with the time intervals')
+
+    ## CASE: A missing value takes the default
+    values = aligned_values(test_object.scheduledPowers, ti, 0.0)
+
+    if values != [10.0, 0.0, 30.0]:
+        pf = 'fail'
+        raise Exception('- the missing value did not take the default')
+    else:
+        print('- the missing value took the default')
+
+    ## CASE: A missing value without a default is an error
+    try:
+        aligned_values(test_object.scheduledPowers, ti)
+        pf = 'fail'
+        raise Exception('- the missing value was not reported')
+    except Exception as e:
+        if ti[1].name not in str(e):
+            raise
+        print('- the missing value was reported')
+
+    #   Success
+    print('- the test function ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_interval_key():
+    from market import Market
+    from transactive_record import TransactiveRecord
+
+    print('Running test_interval_key()')
+    pf = 'pass'
+
+    test_market = Market()
+    dt = datetime(2018, 7, 4, 13, 0)
+    dur = timedelta(hours=1)
+    ti = [TimeInterval(dt, dur, test_market, dt, dt + i * dur) for i in range(2)]
+
+    ## CASE: Names are memoized and keys count minutes
+    if format_ts(dt) != '20180704T130000' or format_ts(dt) is not ti[0].name:
+        pf = 'fail'
+        raise Exception('- the time interval name was not memoized')
+    else:
+        print('- the time interval name was memoized')
+
+    if ti[1].key - ti[0].key != 60 or ti[0].key != interval_key(dt):
+        pf = 'fail'
+        raise Exception('- the time interval keys were not as expected')
+    else:
+        print('- the time interval keys were as expected')
+
+    ## CASE: Records are grouped by time interval name
+    records = [TransactiveRecord(ti[1], 0, 0.05, 10.0),
+               TransactiveRecord(ti[0], 0, 0.04, 20.0),
+               TransactiveRecord(ti[1].name, 1, 0.06, 5.0)]
+    groups = records_by_interval(records)
+
+    if sorted(groups.keys()) != [ti[0].name, ti[1].name] \
+            or [x.record for x in groups[ti[1].name]] != [0, 1]:
+        pf = 'fail'
+        raise Exception('- the records were not grouped by time interval')
+    else:
+        print('- the records were grouped by time interval')
+
+    #   Success
+    print('- the test function ran to completion')
+    print('Result: #s\n\n', pf)
+
+
 def test_prod_cost_from_formula():
     from local_asset_model import LocalAssetModel
     from market import Market
@@ -278,8 +461,65 @@ def test_prod_cost_from_formula():
     print('Result: #s\n\n', pf)
 
 
+def test_prod_cost_from_rows():
+    from local_asset_model import LocalAssetModel
+    from market import Market
+
+    print('Running test_prod_cost_from_rows()')
+    pf = 'pass'
+
+    test_object = LocalAssetModel()
+    test_market = Market()
+
+    dt = datetime.now()
+    dur = timedelta(hours=1)
+    ti = [TimeInterval(dt, dur, test_market, dt, dt + i * dur) for i in range(3)]
+
+    # Three supply curves: a lone vertex, a curve with a vertical segment, and
+    # a curve whose middle vertex disallows production next to it.
+    av = [[Vertex(0.03, 4.0, 50.0)],
+          [Vertex(0.02, 5.0, 0.0), Vertex(0.02, 7.0, 100.0), Vertex(0.025, 9.25, 200.0)],
+          [Vertex(0.01, 0.0, 0.0), Vertex(0.02, 1.0, 100.0, continuity=False), Vertex(0.03, 3.5, 200.0)]]
+    test_object.activeVertices = [IntervalValue(test_object, ti[i], test_market, MeasurementType.ActiveVertex, x)
+                                  for i in range(3) for x in av[i]]
+
+    mps, powers, counts, costs, continuous = vertex_rows(test_object, ti)
+
+    if list(counts) != [1, 3, 3] or continuous.tolist() != [[True, True], [True, True], [False, False]]:
+        pf = 'fail'
+        raise Exception('- the vertex rows were not as expected')
+
+    ## CASE: Powers at many prices equal those of the scalar function
+    prices = [0.0, 0.01, 0.015, 0.02, 0.0225, 0.025, 0.03, 0.04]
+    for price in prices:
+        p1 = production_from_rows(mps, powers, [price] * 3, continuous)
+        p2 = [production(test_object, price, x) for x in ti]
+        if p1.tolist() != p2:
+            pf = 'fail'
+            raise Exception('- the powers differed at %f $/kWh: %s, %s' % (price, p1.tolist(), p2))
+    print('- the row powers equaled the scalar powers')
+
+    if production(test_object, 0.015, ti[2]) != 0.0:
+        pf = 'fail'
+        raise Exception('- production occurred within a discontinuous segment')
+
+    ## CASE: Costs at many powers equal those of the scalar function
+    for pwr in [-50.0, 0.0, 50.0, 100.0, 150.0, 200.0, 250.0]:
+        pc1 = prod_cost_from_rows(mps, powers, costs, [pwr] * 3, [1] * 3)
+        pc2 = [prod_cost_from_vertices(test_object, x, pwr) for x in ti]
+        if not np.allclose(pc1, pc2):
+            pf = 'fail'
+            raise Exception('- the costs differed at %f kW: %s, %s' % (pwr, pc1.tolist(), pc2))
+    print('- the row costs equaled the scalar costs')
+
+    #   Success
+    print('- the test function ran to completion')
+    print('Result: #s\n\n', pf)
+
+
 def test_prod_cost_from_vertices():
     from local_asset_model import LocalAssetModel
+    from market import Market
 
     # TEST_PROD_COST_FROM_VERTICES - tests function prod_cost_from_vertices()
     print('Running test_prod_cost_from_vertices()')
@@ -334,6 +574,7 @@ def test_prod_cost_from_vertices():
     ## CASE: One vertex (inelastic case, a constant)
     test_object.activeVertices = [
         IntervalValue(test_object, ti, test_market, MeasurementType.ActiveVertex, av[0])]
+    invalidate_vertices(test_object, ti)
 
     #pc[i] = prod_cost_from_vertices(test_object, ti, test_powers[i])
     pc = []
@@ -350,6 +591,7 @@ def test_prod_cost_from_vertices():
 
     ## CASE: No active vertices (error case):
     test_object.activeVertices = []
+    invalidate_vertices(test_object, ti)
 
     #print('off', 'all')
     try:
@@ -497,6 +739,10 @@ if __name__ == "__main__":
     # test_is_hlh()
     # test_order_vertices()
     # test_production()
+    test_cached_vertices()
+    test_aligned_values()
+    test_interval_key()
     # test_prod_cost_from_formula()
+    # test_prod_cost_from_rows()
     # test_prod_cost_from_vertices()
     test_are_different2()
@@ -80,6 +80,7 @@ def test_all():
     test_engagement_cost()  # Missing - low priority
     test_schedule_engagement()  # Done - low priority
     test_schedule_power()  # Done - high priority  
+    test_update_costs_batched()
     test_update_dual_costs()  # Missing - high priority
     test_update_production_costs()  # Missing - high priority
     test_update_vertices()  # Missing - high priority
@@ -432,6 +433,96 @@ def test_schedule_power():
     print('\nResult: #s\n\n', pf)
 
 
+def test_update_costs_batched():
+    # TEST_UPDATE_COSTS_BATCHED() - test that methods update_production_costs()
+    # and update_dual_costs() calculate the costs of all active time intervals
+    # together, and that a subclass that redefines production_cost() is used
+    # one time interval at a time.
+    print('Running LocalAssetModel.test_update_costs_batched()')
+    pf = 'pass'
+
+    #   Create a test Market object with four active time intervals.
+    test_market = Market()
+    dt = datetime(2018, 1, 1, 12)
+    dur = timedelta(hours=1)
+    time_intervals = [TimeInterval(dt, dur, test_market, dt, dt + i * dur) for i in range(4)]
+    test_market.timeIntervals = time_intervals
+    test_market.marginalPrices = [
+        IntervalValue(test_market, x, test_market, MeasurementType.MarginalPrice, 0.1 + 0.02 * i)
+        for i, x in enumerate(time_intervals)]
+
+    #   Create a test LocalAssetModel object with the same supply curve and a
+    #   different scheduled power in each time interval, and a transition cost
+    #   in one of them.
+    test_model = LocalAssetModel()
+    test_model.scheduledPowers = [
+        IntervalValue(test_model, x, test_market, MeasurementType.ScheduledPower, 40.0 * i)
+        for i, x in enumerate(time_intervals)]
+    test_model.activeVertices = [
+        IntervalValue(test_model, x, test_market, MeasurementType.ActiveVertex, v)
+        for x in time_intervals for v in [Vertex(0.1, 1000, 0), Vertex(0.2, 1015, 100)]]
+    test_model.transitionCosts = [
+        IntervalValue(test_model, time_intervals[2], test_market, MeasurementType.TransitionCost, 5.0)]
+
+    # TEST 1
+    print('- Test 1: Batched production and dual costs')
+
+    test_model.update_production_costs(test_market)
+    test_model.update_dual_costs(test_market)
+
+    expected_pc = [prod_cost_from_vertices(test_model, x, 40.0 * i) for i, x in enumerate(time_intervals)][1:]
+    expected_pc[1] = expected_pc[1] + 5.0
+    expected_dc = [expected_pc[i - 1] - (0.1 + 0.02 * i) * 40.0 * i for i in range(1, 4)]
+
+    pc = [find_obj_by_ti(test_model.productionCosts, x).value for x in time_intervals[1:]]
+    dc = [find_obj_by_ti(test_model.dualCosts, x).value for x in time_intervals[1:]]
+
+    if len(test_model.productionCosts) != 3 or not all([abs(pc[i] - expected_pc[i]) < 1e-9 for i in range(3)]):
+        pf = 'fail'
+        raise Exception('  - the production costs were not as expected')
+    else:
+        print('  - the production costs were as expected')
+
+    if len(test_model.dualCosts) != 3 or not all([abs(dc[i] - expected_dc[i]) < 1e-9 for i in range(3)]):
+        pf = 'fail'
+        raise Exception('  - the dual costs were not as expected')
+    else:
+        print('  - the dual costs were as expected')
+
+    # TEST 2
+    print('- Test 2: Costs are reassigned, not appended')
+
+    first_value = test_model.productionCosts[0]
+    test_model.update_production_costs(test_market)
+
+    if len(test_model.productionCosts) != 3 or test_model.productionCosts[0] is not first_value:
+        pf = 'fail'
+        raise Exception('  - the production costs were not reassigned')
+    else:
+        print('  - the production costs were reassigned')
+
+    # TEST 3
+    print('- Test 3: A subclass redefines the production cost')
+
+    class FlatCostModel(LocalAssetModel):
+        def production_cost(self, ti, sp):
+            return 2.0 * sp
+
+    test_model.__class__ = FlatCostModel
+    test_model.update_production_costs(test_market)
+
+    pc = [find_obj_by_ti(test_model.productionCosts, x).value for x in time_intervals[1:]]
+    if pc != [80.0, 165.0, 240.0]:
+        pf = 'fail'
+        raise Exception('  - the subclass production costs were not used')
+    else:
+        print('  - the subclass production costs were used')
+
+    # Success.
+    print('- the test ran to completion')
+    print('\nResult: #s\n\n', pf)
+
+
 def test_update_dual_costs():
     # TEST_UPDATE_DUAL_COSTS() - test method update_dual_costs() that creates
     # or revises the dual costs in active time intervals using active vertices,
@@ -58,6 +58,8 @@
 
 
 
+import os
+import csv
 from datetime import datetime, timedelta
 
 from model import Model
@@ -75,18 +77,31 @@ from neighbor_model import NeighborModel
 from local_asset import LocalAsset
 from local_asset_model import LocalAssetModel
 from myTransactiveNode import myTransactiveNode
+from timer import Timer
 
 
 def test_all():
     print('Running Market.test_all()')
     test_assign_system_vertices()  # High priority - test not complete
     test_balance()  # High priorty - test not completed
+    test_balance_allocations()
+    test_balance_decomposed()
+    test_bisect_marginal_price()
+    test_bisect_marginal_prices()
     test_calculate_blended_prices()  # Low priority - FUTURE
+    test_campus_scaling()
     test_check_intervals()  # High priorty - test not completed
     test_check_marginal_prices()  # High priorty - test not completed
+    test_find_interval()
+    test_horizon_steps()
+    test_profiler()
+    test_prune()
+    test_save_solution()
     test_schedule()  # High priorty - test not completed
     test_sum_vertices()  # High priorty - test not completed
+    test_sum_vertices_vectorized()
     test_update_costs()  # High priorty - test not completed
+    test_update_subgradient_step()
     test_update_supply_demand()  # High priorty - test not completed
     #test_view_net_curve()  # High priorty - test not completed
     #test_view_marginal_prices()  # High priority - test completed
@@ -110,6 +125,308 @@ def test_balance():
     print('Result: #s\n\n', pf)
 
 
+def test_balance_allocations():
+    print('Running Market.test_balance_allocations()')
+    pf = 'pass'
+
+    import gc
+    import sys
+    import time
+    import tracemalloc
+
+    ## Case 1
+    print('- Case 1: The hot value types have no instance dictionaries')
+
+    dt = datetime(2018, 1, 1, 12)
+    ti = TimeInterval(dt, timedelta(hours=1), None, dt, dt)
+    objs = [IntervalValue(Market(), ti, None, MeasurementType.MarginalPrice, 0.05),
+            Vertex(0.05, 1.0, 100.0),
+            TransactiveRecord(ti, 0, 0.05, 100.0)]
+
+    if any([hasattr(x, '__dict__') for x in objs]):
+        pf = 'fail'
+        raise Exception('  - an instance had a dictionary')
+    else:
+        print('  - sizes [B]: %s' % [sys.getsizeof(x) for x in objs])
+
+    if objs[0].associatedObject != 'Market':
+        pf = 'fail'
+        raise Exception('  - the associated object name was not as expected')
+
+    ## Case 2
+    print('- Case 2: Measure allocation and garbage collection in balances')
+
+    # Balance a recorded node on a simulated clock, hour after hour.
+    Timer.simulation = True
+    Timer.created_time = datetime.now()
+
+    test_node = myTransactiveNode()
+    test_market = Market()
+    test_market.method = 3
+    test_market.futureHorizon = timedelta(hours=24)
+    test_node.markets = [test_market]
+
+    test_neighbor = Neighbor()
+    test_neighbor.maximumPower = 200
+    test_neighbor_model = NeighborModel()
+    test_neighbor_model.defaultVertices = [Vertex(0.045, 0, 0), Vertex(0.05, 0, 200)]
+    test_neighbor.model = test_neighbor_model
+    test_neighbor_model.object = test_neighbor
+    test_node.neighbors = [test_neighbor]
+
+    test_asset = LocalAsset()
+    test_asset.maximumPower = 0
+    test_asset.minimumPower = -100
+    test_asset_model = LocalAssetModel()
+    test_asset_model.defaultPower = -100
+    test_asset.model = test_asset_model
+    test_asset_model.object = test_asset
+    test_node.localAssets = [test_asset]
+
+    collections = [0]
+
+    def count_collections(phase, info):
+        if phase == 'start':
+            collections[0] += 1
+
+    gc.collect()
+    gc.callbacks.append(count_collections)
+    tracemalloc.start()
+    t0 = time.time()
+    try:
+        for h in range(48):
+            Timer.sim_start_time = datetime(2018, 1, 1, 0, 30) + timedelta(hours=h)
+            test_market.balance(test_node)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        gc.callbacks.remove(count_collections)
+        Timer.simulation = False
+
+    print('  - 48 balances took %.3f s, peak traced memory %.1f kB, %d collections'
+          % (time.time() - t0, peak / 1024.0, collections[0]))
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_balance_decomposed():
+    print('Running Market.test_balance_decomposed()')
+    pf = 'pass'
+
+    # A node whose inelastic load is supplied by a neighbor at $0.045/kWh to
+    # $0.05/kWh. Its time intervals are independent.
+    def decomposable_node():
+        test_node = myTransactiveNode()
+        test_market = Market()
+        test_market.method = 4
+        test_market.futureHorizon = timedelta(hours=24)
+        test_node.markets = [test_market]
+
+        test_neighbor = Neighbor()
+        test_neighbor.maximumPower = 200
+        test_neighbor_model = NeighborModel()
+        test_neighbor_model.defaultVertices = [Vertex(0.045, 0, 0), Vertex(0.05, 0, 200)]
+        test_neighbor.model = test_neighbor_model
+        test_neighbor_model.object = test_neighbor
+        test_node.neighbors = [test_neighbor]
+
+        test_asset = LocalAsset()
+        test_asset.maximumPower = 0
+        test_asset.minimumPower = -100
+        test_asset_model = LocalAssetModel()
+        test_asset_model.defaultPower = -100
+        test_asset.model = test_asset_model
+        test_asset_model.object = test_asset
+        test_node.localAssets = [test_asset]
+
+        return test_node, test_market
+
+    Timer.simulation = True
+    Timer.created_time = datetime.now()
+    Timer.sim_start_time = datetime(2018, 1, 1, 0, 30)
+
+    try:
+        ## Case 1
+        print('- Case 1: The duality gap is within its threshold')
+
+        test_node, test_market = decomposable_node()
+        test_market.balance(test_node)
+
+        if not test_market.converged or len(test_market.dualityGaps) != 1:
+            pf = 'fail'
+            raise Exception('  - the decomposed balance should have converged without iterations')
+
+        if any([abs(x.value - 0.0475) > 2 * test_market.bisectionTolerance for x in test_market.marginalPrices]):
+            pf = 'fail'
+            raise Exception('  - the marginal prices were not as expected')
+        else:
+            print('  - the decomposed balance converged')
+
+        ## Case 2
+        print('- Case 2: The duality gap is above its threshold')
+
+        test_node, test_market = decomposable_node()
+        test_market.dualityGapThreshold = -1
+        test_market.balance(test_node)
+
+        if len(test_market.dualityGaps) < 2:
+            pf = 'fail'
+            raise Exception('  - the balance should have continued with iterations')
+
+        if not test_market.converged:
+            pf = 'fail'
+            raise Exception('  - the iterations should have converged by bisection')
+        else:
+            print('  - the balance continued with iterations and converged')
+
+    finally:
+        Timer.simulation = False
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_bisect_marginal_price():
+    print('Running Market.test_bisect_marginal_price()')
+    pf = 'pass'
+
+    # Create a test myTransactiveNode object and a test Market object.
+    test_node = myTransactiveNode()
+    test_market = Market()
+    test_market.method = 3
+    test_node.markets = [test_market]
+
+    # Create and store a time interval to work with.
+    dt = datetime.now()
+    dur = timedelta(hours=1)
+    time_interval = TimeInterval(dt, dur, test_market, dt, dt)
+    test_market.timeIntervals = [time_interval]
+    test_market.marginalPrices = [
+        IntervalValue(test_market, time_interval, test_market, MeasurementType.MarginalPrice, 0.05)]
+
+    # Create a test asset that consumes 110 kW below and 90 kW above $0.2/kWh.
+    test_asset = LocalAsset()
+    test_asset_model = LocalAssetModel()
+    test_asset.model = test_asset_model
+    test_asset_model.object = test_asset
+    test_asset_model.activeVertices = [
+        IntervalValue(test_node, time_interval, test_market, MeasurementType.ActiveVertex, Vertex(0.2, 0, -110)),
+        IntervalValue(test_node, time_interval, test_market, MeasurementType.ActiveVertex, Vertex(0.2, 0, -90))
+    ]
+
+    # Create a test neighbor that supplies 0 kW at $0.1/kWh to 200 kW at $0.3/kWh.
+    test_neighbor = Neighbor()
+    test_neighbor_model = NeighborModel()
+    test_neighbor.model = test_neighbor_model
+    test_neighbor_model.object = test_neighbor
+    test_neighbor_model.activeVertices = [
+        IntervalValue(test_node, time_interval, test_market, MeasurementType.ActiveVertex, Vertex(0.1, 0, 0)),
+        IntervalValue(test_node, time_interval, test_market, MeasurementType.ActiveVertex, Vertex(0.3, 0, 200))
+    ]
+
+    test_node.localAssets = [test_asset]
+    test_node.neighbors = [test_neighbor]
+
+    ## Case 1
+    print('- Case 1: Balance point lies on a vertical step of the net curve')
+
+    price = test_market.bisect_marginal_price(test_node, time_interval)
+
+    if abs(price - 0.2) > 2 * test_market.bisectionTolerance:
+        pf = 'fail'
+        raise Exception('  - the balance price was not as expected')
+    else:
+        print('  - the balance price was as expected')
+
+    ## Case 2
+    print('- Case 2: Balance point lies within a sloped segment of the net curve')
+
+    test_asset_model.activeVertices = [
+        IntervalValue(test_node, time_interval, test_market, MeasurementType.ActiveVertex, Vertex(float("inf"), 0, -50))
+    ]
+    invalidate_vertices(test_asset_model)
+
+    price = test_market.bisect_marginal_price(test_node, time_interval)
+
+    if abs(price - 0.15) > 2 * test_market.bisectionTolerance:
+        pf = 'fail'
+        raise Exception('  - the balance price was not as expected')
+    else:
+        print('  - the balance price was as expected')
+
+    ## Case 3
+    print('- Case 3: Net power cannot be balanced')
+
+    test_asset_model.activeVertices = [
+        IntervalValue(test_node, time_interval, test_market, MeasurementType.ActiveVertex, Vertex(float("inf"), 0, -500))
+    ]
+    invalidate_vertices(test_asset_model)
+
+    price = test_market.bisect_marginal_price(test_node, time_interval)
+
+    if price != 0.3:
+        pf = 'fail'
+        raise Exception('  - the greatest vertex price should have been returned')
+    else:
+        print('  - the greatest vertex price was returned')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_bisect_marginal_prices():
+    print('Running Market.test_bisect_marginal_prices()')
+    pf = 'pass'
+
+    test_node, test_market, time_intervals, tcc_model, test_neighbor_model = recorded_test_node()
+    test_market.marginalPrices = [
+        IntervalValue(test_market, ti, test_market, MeasurementType.MarginalPrice, 0.05) for ti in time_intervals]
+    load_model = test_node.localAssets[1].model
+
+    for load in [0.0, -50.0, -100.0, 100.0]:
+        print('- Case: Inelastic load offset of {} kW'.format(load))
+
+        for iv in load_model.activeVertices:
+            iv.value.power = load - time_intervals.index(iv.timeInterval)
+        invalidate_vertices(load_model)
+
+        expected = [test_market.bisect_marginal_price(test_node, ti) for ti in time_intervals]
+        actual = test_market.bisect_marginal_prices(test_node, time_intervals)
+
+        if len(actual) != len(expected):
+            pf = 'fail'
+            raise Exception('  - an unexpected number of prices was returned')
+
+        if any([abs(e - a) > 1e-12 for e, a in zip(expected, actual)]):
+            pf = 'fail'
+            raise Exception('  - the prices differ from those of bisect_marginal_price()')
+
+    print('  - the prices were the same as those of bisect_marginal_price()')
+
+    ## Coupled models
+    print('- Case: A model that couples the time intervals')
+
+    if not test_market.is_decomposable(test_node):
+        pf = 'fail'
+        raise Exception('  - independent time intervals were not decomposable')
+
+    test_neighbor_model.intervalCoupled = True
+
+    if test_market.is_decomposable(test_node):
+        pf = 'fail'
+        raise Exception('  - coupled time intervals were decomposable')
+    else:
+        print('  - coupled time intervals were not decomposable')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
 def test_calculate_blended_prices():
     print('Running Market.test_calculate_blended_prices()')
     pf = 'test is not complete'
@@ -119,9 +436,187 @@ def test_calculate_blended_prices():
     print('Result: #s\n\n', pf)
 
 
+def test_campus_scaling():
+    print('Running Market.test_campus_scaling()')
+    pf = 'pass'
+
+    import time
+
+    # A synthetic campus node: a city supplier, and many transactive
+    # buildings that have each sent a demand curve in every time interval.
+    def campus(building_count):
+        test_node = myTransactiveNode()
+        test_market = Market()
+        test_market.method = 2
+        test_market.futureHorizon = timedelta(hours=24)
+        test_node.markets = [test_market]
+
+        test_city = Neighbor()
+        test_city.name = 'CoR'
+        test_city.maximumPower = 200.0 * building_count
+        test_city_model = NeighborModel()
+        test_city_model.defaultVertices = [Vertex(0.046, 160, 0, True),
+                                           Vertex(0.048, 1000, test_city.maximumPower, True)]
+        test_city.model = test_city_model
+        test_city_model.object = test_city
+        test_node.neighbors = [test_city]
+
+        for i in range(building_count):
+            test_building = Neighbor()
+            test_building.name = 'Building%d' % i
+            test_building.maximumPower = 0.0
+            test_building.minimumPower = -120.0
+            test_building_model = NeighborModel()
+            test_building_model.transactive = True
+            test_building_model.friend = True
+            test_building_model.defaultPower = -60.0
+            test_building_model.defaultVertices = [Vertex(float('inf'), 0, -60.0, True)]
+            test_building.model = test_building_model
+            test_building_model.object = test_building
+            test_node.neighbors.append(test_building)
+
+        return test_node, test_market
+
+    def balance_time(building_count):
+        test_node, test_market = campus(building_count)
+        test_market.balance(test_node)
+
+        # Each building's curve has a balance point and two flex records.
+        for x in test_node.neighbors[1:]:
+            x.model.receivedSignal = [TransactiveRecord(ti, r, 0.045 + 0.002 * r, -100.0 + 40.0 * r)
+                                      for ti in test_market.timeIntervals for r in range(3)]
+
+        t0 = time.time()
+        test_market.balance(test_node)
+        seconds = time.time() - t0
+
+        if not test_market.converged:
+            raise Exception('  - the campus of {} buildings did not balance'.format(building_count))
+
+        return seconds
+
+    Timer.simulation = True
+    Timer.created_time = datetime.now()
+    Timer.sim_start_time = datetime(2018, 1, 1, 0, 30)
+
+    try:
+        ## Case 1
+        print('- Case 1: Balance campuses of 50 and 500 buildings')
+        times = dict([(x, balance_time(x)) for x in [50, 500]])
+    finally:
+        Timer.simulation = False
+
+    for x in sorted(times):
+        print('  - {} buildings: {:.3f} s, {:.2f} ms per building'.format(x, times[x], 1000 * times[x] / x))
+
+    # Balance time should grow near-linearly with the number of buildings.
+    # Allow for timing noise, but not for quadratic growth.
+    if times[500] / 500 > 3 * times[50] / 50:
+        pf = 'fail'
+        raise Exception('  - the balance time grew faster than linearly')
+    else:
+        print('  - the balance time grew near-linearly')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
 def test_check_intervals():
     print('Running Market.test_check_intervals()')
-    pf = 'test is not complete'
+    pf = 'pass'
+
+    # Run the market on a simulated clock.
+    Timer.simulation = True
+    Timer.created_time = datetime.now()
+    Timer.sim_start_time = datetime(2018, 1, 1, 12, 30)
+
+    # Create a test node with a market, a neighbor, and a local asset.
+    test_node = myTransactiveNode()
+    test_market = Market()
+    test_market.futureHorizon = timedelta(hours=4)
+    test_node.markets = [test_market]
+
+    test_neighbor = Neighbor()
+    test_neighbor_model = NeighborModel()
+    test_neighbor.model = test_neighbor_model
+    test_neighbor_model.object = test_neighbor
+    test_node.neighbors = [test_neighbor]
+
+    test_asset = LocalAsset()
+    test_asset_model = LocalAssetModel()
+    test_asset.model = test_asset_model
+    test_asset_model.object = test_asset
+    test_node.localAssets = [test_asset]
+
+    ## Case 1
+    print('- Case 1: Create the time intervals of a new horizon')
+
+    test_market.check_intervals(test_node)
+
+    sts = [x.startTime for x in test_market.timeIntervals]
+    if sts != [datetime(2018, 1, 1, 12) + timedelta(hours=i) for i in range(5)]:
+        pf = 'fail'
+        raise Exception('  - the time intervals were not as expected')
+    else:
+        print('  - the time intervals were as expected')
+
+    # Give the models some values in every active time interval.
+    for ti in test_market.timeIntervals:
+        test_asset_model.scheduledPowers.append(
+            IntervalValue(test_asset_model, ti, test_market, MeasurementType.ScheduledPower, 10))
+        test_asset_model.engagementSchedule.append(
+            IntervalValue(test_asset_model, ti, test_market, MeasurementType.EngagementValue, True))
+        test_neighbor_model.convergenceFlags.append(
+            IntervalValue(test_neighbor_model, ti, test_market, MeasurementType.ConvergenceFlag, True))
+    first_ti = test_market.timeIntervals[0]
+    active_tis = test_market.timeIntervals
+    kept_ti = test_market.timeIntervals[2]
+
+    ## Case 2
+    print('- Case 2: Roll the horizon forward by two hours')
+
+    Timer.sim_start_time = datetime(2018, 1, 1, 14, 30)
+    test_market.check_intervals(test_node)
+
+    sts = [x.startTime for x in test_market.timeIntervals]
+    if sts != [datetime(2018, 1, 1, 14) + timedelta(hours=i) for i in range(5)]:
+        pf = 'fail'
+        raise Exception('  - the time intervals were not as expected')
+    else:
+        print('  - the time intervals were as expected')
+
+    if first_ti in test_market.timeIntervals and test_market.timeIntervals[0] is not first_ti:
+        pf = 'fail'
+        raise Exception('  - the existing time intervals were not kept')
+
+    if test_market.timeIntervals is not active_tis or test_market.timeIntervals[0] is not kept_ti:
+        pf = 'fail'
+        raise Exception('  - the time intervals were rebuilt, not rolled')
+    else:
+        print('  - the time intervals were rolled in place')
+
+    if len(test_asset_model.scheduledPowers) != 3 or len(test_asset_model.engagementSchedule) != 3 \
+            or len(test_neighbor_model.convergenceFlags) != 3:
+        pf = 'fail'
+        raise Exception('  - the models did not prune the expired time intervals')
+    else:
+        print('  - the models pruned the expired time intervals')
+
+    ## Case 3
+    print('- Case 3: Time intervals assigned as an unordered list with a duplicate')
+
+    tis = list(test_market.timeIntervals)
+    test_market.timeIntervals = [tis[2], tis[0], tis[1], tis[0]]
+    test_market.check_intervals()
+
+    if list(test_market.timeIntervals)[:3] != tis[:3] or [x.startTime for x in test_market.timeIntervals] != sts:
+        pf = 'fail'
+        raise Exception('  - the time intervals were not ordered and made unique')
+    else:
+        print('  - the time intervals were ordered and made unique')
+
+    Timer.simulation = False
 
     # Success
     print('- the test ran to completion')
@@ -137,6 +632,518 @@ def test_check_marginal_prices():
     print('Result: #s\n\n', pf)
 
 
+def test_find_interval():
+    print('Running Market.test_find_interval()')
+    pf = 'pass'
+
+    # Create a test Market object with three active time intervals.
+    test_market = Market()
+    dt = datetime(2018, 1, 1, 12)
+    dur = timedelta(hours=1)
+    time_intervals = [TimeInterval(dt, dur, test_market, dt, dt + i * dur) for i in range(3)]
+    test_market.timeIntervals = time_intervals
+
+    ## Case 1
+    print('- Case 1: Find the time intervals by name')
+
+    if any([test_market.find_interval(x.name) is not x for x in time_intervals]):
+        pf = 'fail'
+        raise Exception('  - the time intervals were not found by name')
+    else:
+        print('  - the time intervals were found by name')
+
+    if test_market.find_interval('20180101T150000') is not None:
+        pf = 'fail'
+        raise Exception('  - an inactive time interval was found')
+    else:
+        print('  - an inactive time interval was not found')
+
+    ## Case 2
+    print('- Case 2: Time intervals are replaced')
+
+    test_market.timeIntervals = time_intervals[1:]
+
+    if test_market.find_interval(time_intervals[0].name) is not None:
+        pf = 'fail'
+        raise Exception('  - a replaced time interval was found')
+    else:
+        print('  - a replaced time interval was not found')
+
+    ## Case 3
+    print('- Case 3: Time intervals are replaced by as many time intervals')
+
+    new_intervals = [TimeInterval(dt, dur, test_market, dt, x.startTime) for x in test_market.timeIntervals]
+    test_market.timeIntervals = new_intervals
+
+    if any([test_market.find_interval(x.name) is not x for x in new_intervals]):
+        pf = 'fail'
+        raise Exception('  - stale time intervals were found')
+    else:
+        print('  - the new time intervals were found')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_horizon_steps():
+    print('Running Market.test_horizon_steps()')
+    pf = 'pass'
+
+    # Run the market on a simulated clock.
+    Timer.simulation = True
+    Timer.created_time = datetime.now()
+    Timer.sim_start_time = datetime(2018, 1, 1, 12, 5)
+
+    # Create a test node whose market has 15-minute intervals for two hours
+    # and hourly intervals for 22 hours after that.
+    test_node = myTransactiveNode()
+    test_market = Market()
+    test_market.horizonSchedule = [(timedelta(hours=2), timedelta(minutes=15)),
+                                   (timedelta(hours=22), timedelta(hours=1))]
+    test_node.markets = [test_market]
+
+    test_asset = LocalAsset()
+    test_asset_model = LocalAssetModel()
+    test_asset.model = test_asset_model
+    test_asset_model.object = test_asset
+    test_node.localAssets = [test_asset]
+
+    ## Case 1
+    print('- Case 1: Create the time intervals of a non-uniform horizon')
+
+    test_market.check_intervals(test_node)
+    tis = list(test_market.timeIntervals)
+
+    if len(tis) != 30 or [x.duration for x in tis[7:9]] != [timedelta(minutes=15), timedelta(hours=1)] \
+            or any([tis[i].startTime + tis[i].duration != tis[i + 1].startTime for i in range(len(tis) - 1)]):
+        pf = 'fail'
+        raise Exception('  - the time intervals were not as expected')
+    else:
+        print('  - the time intervals were as expected')
+
+    if get_duration_in_hour(tis[0].duration) != 0.25:
+        pf = 'fail'
+        raise Exception('  - the duration of a 15-minute interval was not 0.25 h')
+
+    # Give the asset a scheduled power in every time interval.
+    for ti in tis:
+        test_asset_model.scheduledPowers.append(
+            IntervalValue(test_asset_model, ti, test_market, MeasurementType.ScheduledPower, 10))
+    hourly_ti = tis[8]  # 14:00-15:00
+    later_ti = tis[9]  # 15:00-16:00
+
+    ## Case 2
+    print('- Case 2: Roll the horizon forward by an hour')
+
+    Timer.sim_start_time = datetime(2018, 1, 1, 13, 5)
+    test_market.check_intervals(test_node)
+    tis = list(test_market.timeIntervals)
+
+    if len(tis) != 30 or tis[0].startTime != datetime(2018, 1, 1, 13) \
+            or any([tis[i].startTime + tis[i].duration != tis[i + 1].startTime for i in range(len(tis) - 1)]):
+        pf = 'fail'
+        raise Exception('  - the time intervals were not as expected')
+    else:
+        print('  - the time intervals were as expected')
+
+    if hourly_ti in tis or [x.duration for x in tis[4:8]] != [timedelta(minutes=15)] * 4:
+        pf = 'fail'
+        raise Exception('  - the nearing hourly interval was not divided')
+    else:
+        print('  - the nearing hourly interval was divided')
+
+    if tis[8] is not later_ti:
+        pf = 'fail'
+        raise Exception('  - the later hourly interval was not kept')
+
+    if len(test_asset_model.scheduledPowers) != 25:
+        pf = 'fail'
+        raise Exception('  - the model did not prune the expired time intervals')
+    else:
+        print('  - the model pruned the expired time intervals')
+
+    Timer.simulation = False
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_profiler():
+    print('Running Market.test_profiler()')
+    pf = 'pass'
+
+    import json
+    import tempfile
+    from balance_profiler import BalanceProfiler
+
+    # Run the market on a simulated clock.
+    Timer.simulation = True
+    Timer.created_time = datetime.now()
+    Timer.sim_start_time = datetime(2018, 1, 1, 0, 30)
+
+    # Create a test node with a market, a non-transactive neighbor, and a
+    # local asset.
+    test_node = myTransactiveNode()
+    test_market = Market()
+    test_market.name = 'test'
+    test_market.method = 3
+    test_market.futureHorizon = timedelta(hours=4)
+    test_node.markets = [test_market]
+
+    test_neighbor = Neighbor()
+    test_neighbor.maximumPower = 200
+    test_neighbor_model = NeighborModel()
+    test_neighbor_model.defaultVertices = [Vertex(0.045, 0, 0), Vertex(0.05, 0, 200)]
+    test_neighbor.model = test_neighbor_model
+    test_neighbor_model.object = test_neighbor
+    test_node.neighbors = [test_neighbor]
+
+    test_asset = LocalAsset()
+    test_asset.maximumPower = 0
+    test_asset.minimumPower = -100
+    test_asset_model = LocalAssetModel()
+    test_asset_model.defaultPower = -100
+    test_asset.model = test_asset_model
+    test_asset_model.object = test_asset
+    test_node.localAssets = [test_asset]
+
+    ## Case 1
+    print('- Case 1: Profile balances as JSON lines')
+
+    path = tempfile.mktemp(suffix='.json')
+    test_market.profiler = BalanceProfiler(path)
+
+    try:
+        test_market.balance(test_node)
+        Timer.sim_start_time = datetime(2018, 1, 1, 1, 30)
+        test_market.balance(test_node)
+
+        with open(path) as f:
+            profiles = [json.loads(x) for x in f]
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+    if len(profiles) != 2 or profiles[1]['market'] != 'test':
+        pf = 'fail'
+        raise Exception('  - a profile was not exported after each balance')
+    else:
+        print('  - a profile was exported after each balance')
+
+    phases = ['check_intervals', 'schedule', 'update_costs', 'update_supply_demand', 'update_prices']
+    if not all([x in profiles[1]['phases'] for x in phases]) \
+            or 'LocalAssetModel.schedule' not in profiles[1]['models'] \
+            or 'NeighborModel.update_costs' not in profiles[1]['models']:
+        pf = 'fail'
+        raise Exception('  - the phases and models were not timed')
+    else:
+        print('  - the phases and models were timed')
+
+    trace = profiles[1]['trace']
+    if len(trace) == 0 or trace[-1][6] is not True or [x[0] for x in trace] != list(range(1, len(trace) + 1)):
+        pf = 'fail'
+        raise Exception('  - the iterations were not traced')
+    else:
+        print('  - the iterations were traced')
+
+    ## Case 2
+    print('- Case 2: Profile a balance as CSV rows')
+
+    path = tempfile.mktemp(suffix='.csv')
+    test_market.profiler = BalanceProfiler(path, 'csv')
+
+    try:
+        Timer.sim_start_time = datetime(2018, 1, 1, 2, 30)
+        test_market.balance(test_node)
+
+        with open(path) as f:
+            rows = list(csv.reader(f))
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        Timer.simulation = False
+
+    kinds = set([x[2] for x in rows])
+    if kinds != set(['balance', 'phase', 'model', 'iteration']):
+        pf = 'fail'
+        raise Exception('  - the CSV rows were not as expected')
+    else:
+        print('  - the CSV rows were as expected')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_prune():
+    print('Running Market.test_prune()')
+    pf = 'pass'
+
+    import time
+
+    # Run the market on a simulated clock.
+    Timer.simulation = True
+    Timer.created_time = datetime.now()
+    Timer.sim_start_time = datetime(2018, 1, 1, 0, 30)
+
+    # Create a test node with a market, a non-transactive neighbor, and a
+    # local asset.
+    test_node = myTransactiveNode()
+    test_market = Market()
+    test_market.method = 3
+    test_market.futureHorizon = timedelta(hours=24)
+    test_node.markets = [test_market]
+
+    test_neighbor = Neighbor()
+    test_neighbor.maximumPower = 200
+    test_neighbor_model = NeighborModel()
+    test_neighbor_model.defaultVertices = [Vertex(0.045, 0, 0), Vertex(0.05, 0, 200)]
+    test_neighbor.model = test_neighbor_model
+    test_neighbor_model.object = test_neighbor
+    test_node.neighbors = [test_neighbor]
+
+    test_asset = LocalAsset()
+    test_asset.maximumPower = 0
+    test_asset.minimumPower = -100
+    test_asset_model = LocalAssetModel()
+    test_asset_model.defaultPower = -100
+    test_asset.model = test_asset_model
+    test_asset_model.object = test_asset
+    test_node.localAssets = [test_asset]
+
+    ## Case 1
+    print('- Case 1: Balance the market hourly for 200 hours')
+
+    durations = []
+    for h in range(200):
+        Timer.sim_start_time = datetime(2018, 1, 1, 0, 30) + timedelta(hours=h)
+        t0 = time.time()
+        test_market.balance(test_node)
+        durations.append(time.time() - t0)
+
+    Timer.simulation = False
+
+    n = len(test_market.timeIntervals)
+    lists = [test_market.activeVertices, test_market.marginalPrices, test_market.netPowers,
+             test_market.totalDemand, test_market.totalGeneration,
+             test_asset_model.scheduledPowers, test_asset_model.engagementSchedule,
+             test_neighbor_model.scheduledPowers, test_neighbor_model.dualCosts,
+             test_neighbor_model.productionCosts]
+    if any([len(set([x.timeInterval.startTime for x in y])) > n for y in lists]):
+        pf = 'fail'
+        raise Exception('  - the lists retained expired time intervals')
+    else:
+        print('  - the lists retained only the active time intervals')
+
+    if len(test_neighbor_model.activeVertices) > 2 * n:
+        pf = 'fail'
+        raise Exception('  - the active vertices were not bounded')
+    else:
+        print('  - the active vertices were bounded')
+
+    early = sorted(durations[10:50])[20]
+    late = sorted(durations[-40:])[20]
+    if late > 3 * early + 0.01:
+        pf = 'fail'
+        raise Exception('  - the balance duration grew from %f to %f s' % (early, late))
+    else:
+        print('  - the balance duration did not grow')
+
+    ## Case 2
+    print('- Case 2: Retain a window of expired time intervals')
+
+    # Add values and records of two expired time intervals, one inside and one
+    # outside the retention window.
+    test_market.retentionWindow = timedelta(hours=2)
+    first = min([x.startTime for x in test_market.timeIntervals])
+    dur = timedelta(hours=1)
+    inside = TimeInterval(first, dur, test_market, first, first - dur)
+    outside = TimeInterval(first, dur, test_market, first, first - 3 * dur)
+
+    for ti in [inside, outside]:
+        test_market.netPowers.append(IntervalValue(test_market, ti, test_market, MeasurementType.NetPower, 0.0))
+        test_neighbor_model.scheduledPowers.append(
+            IntervalValue(test_neighbor_model, ti, test_market, MeasurementType.ScheduledPower, 0.0))
+        test_neighbor_model.receivedSignal.append(TransactiveRecord(ti, 0, 0.05, 0.0))
+
+    test_market.prune(test_node)
+
+    sts = set([x.timeInterval.startTime for x in test_market.marginalPrices])
+    if len(sts) != n:
+        pf = 'fail'
+        raise Exception('  - the retention window discarded active time intervals')
+    else:
+        print('  - the retention window kept the active time intervals')
+
+    sts = [set([x.timeInterval.startTime for x in y])
+           for y in [test_market.netPowers, test_neighbor_model.scheduledPowers]]
+    names = set([x.timeInterval for x in test_neighbor_model.receivedSignal])
+    if any([inside.startTime not in x for x in sts]) or inside.name not in names:
+        pf = 'fail'
+        raise Exception('  - the values inside the retention window were discarded')
+    else:
+        print('  - the values inside the retention window were kept')
+
+    if any([outside.startTime in x for x in sts]) or outside.name in names:
+        pf = 'fail'
+        raise Exception('  - the values outside the retention window were kept')
+    else:
+        print('  - the values outside the retention window were discarded')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_save_solution():
+    print('Running Market.test_save_solution()')
+    pf = 'pass'
+
+    # Create a test Market object with two active time intervals.
+    test_market = Market()
+    dt = datetime(2018, 1, 1, 12)
+    dur = timedelta(hours=1)
+    time_intervals = [TimeInterval(dt, dur, test_market, dt, dt + i * dur) for i in range(2)]
+    test_market.timeIntervals = time_intervals
+
+    test_market.marginalPrices = [
+        IntervalValue(test_market, time_intervals[0], test_market, MeasurementType.MarginalPrice, 0.021),
+        IntervalValue(test_market, time_intervals[1], test_market, MeasurementType.MarginalPrice, 0.037)
+    ]
+    test_market.activeVertices = [
+        IntervalValue(test_market, time_intervals[1], test_market, MeasurementType.SystemVertex, Vertex(0.03, 0, -10)),
+        IntervalValue(test_market, time_intervals[1], test_market, MeasurementType.SystemVertex, Vertex(0.04, 0, 10))
+    ]
+
+    ## Case 1
+    print('- Case 1: Save the solution of the active time intervals')
+
+    test_market.save_solution()
+
+    if test_market.solutionPrices != {dt: 0.021, dt + dur: 0.037}:
+        pf = 'fail'
+        raise Exception('  - the marginal prices were not saved as expected')
+    else:
+        print('  - the marginal prices were saved as expected')
+
+    if len(test_market.solutionVertices.get(dt + dur, [])) != 2 or dt in test_market.solutionVertices:
+        pf = 'fail'
+        raise Exception('  - the system vertices were not saved as expected')
+    else:
+        print('  - the system vertices were saved as expected')
+
+    ## Case 2
+    print('- Case 2: Warm-start a new, overlapping horizon')
+
+    # The horizon moves on by one interval. Its time intervals are new objects.
+    time_intervals = [TimeInterval(dt, dur, test_market, dt, dt + i * dur) for i in range(1, 3)]
+    test_market.timeIntervals = time_intervals
+    test_market.check_marginal_prices()
+
+    mps = [find_obj_by_ti(test_market.marginalPrices, x).value for x in time_intervals]
+
+    if mps != [0.037, 0.037]:
+        pf = 'fail'
+        raise Exception('  - the new marginal prices were not warm-started as expected')
+    else:
+        print('  - the new marginal prices were warm-started as expected')
+
+    test_market.save_solution()
+
+    if dt in test_market.solutionPrices:
+        pf = 'fail'
+        raise Exception('  - the solution of the expired time interval was not removed')
+    else:
+        print('  - the solution of the expired time interval was removed')
+
+    ## Case 3
+    print('- Case 3: A rolled horizon balances in fewer iterations than a cold start')
+
+    # A node whose inelastic load is supplied by a neighbor at $0.045/kWh to
+    # $0.05/kWh.
+    def balanced_node():
+        test_node = myTransactiveNode()
+        test_market = Market()
+        test_market.method = 2
+        test_market.futureHorizon = timedelta(hours=24)
+        test_node.markets = [test_market]
+
+        test_neighbor = Neighbor()
+        test_neighbor.maximumPower = 200
+        test_neighbor_model = NeighborModel()
+        test_neighbor_model.defaultVertices = [Vertex(0.045, 0, 0), Vertex(0.05, 0, 200)]
+        test_neighbor.model = test_neighbor_model
+        test_neighbor_model.object = test_neighbor
+        test_node.neighbors = [test_neighbor]
+
+        test_asset = LocalAsset()
+        test_asset.maximumPower = 0
+        test_asset.minimumPower = -100
+        test_asset_model = LocalAssetModel()
+        test_asset_model.defaultPower = -100
+        test_asset.model = test_asset_model
+        test_asset_model.object = test_asset
+        test_node.localAssets = [test_asset]
+
+        return test_node, test_market
+
+    Timer.simulation = True
+    Timer.created_time = datetime.now()
+
+    try:
+        Timer.sim_start_time = datetime(2018, 1, 1, 1, 30)
+        test_node, test_market = balanced_node()
+        test_market.balance(test_node)
+        cold = len(test_market.dualityGaps)
+
+        test_node, test_market = balanced_node()
+        Timer.sim_start_time = datetime(2018, 1, 1, 0, 30)
+        test_market.balance(test_node)
+        Timer.sim_start_time = datetime(2018, 1, 1, 1, 30)
+        test_market.balance(test_node)
+        warm = len(test_market.dualityGaps)
+
+        if not test_market.converged or warm >= cold:
+            pf = 'fail'
+            raise Exception('  - the rolled horizon took %d iterations, a cold start %d' % (warm, cold))
+        else:
+            print('  - the rolled horizon took %d iterations, a cold start %d' % (warm, cold))
+
+        mps = [x.value for x in test_market.marginalPrices]
+        if abs(mps[-1] - mps[-2]) > 1e-9:
+            pf = 'fail'
+            raise Exception('  - the new time interval was not seeded from its predecessor')
+
+        ## Case 4
+        print('- Case 4: Save the solution of an interrupted balance')
+
+        test_node, test_market = balanced_node()
+
+        # New data arrives while the models are scheduled.
+        def interrupted_schedule(mtn):
+            Market.schedule(test_market, mtn)
+            test_market.new_data_signal = True
+        test_market.schedule = interrupted_schedule
+
+        test_market.balance(test_node)
+
+        sts = [x.startTime for x in test_market.timeIntervals]
+        if test_market.converged or sorted(test_market.solutionPrices.keys()) != sts:
+            pf = 'fail'
+            raise Exception('  - the solution of the interrupted balance was not saved')
+        else:
+            print('  - the solution of the interrupted balance was saved')
+
+    finally:
+        Timer.simulation = False
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
 def test_schedule():
     print('Running Market.test_schedule()')
     print('WARNING: This test may be affected by NeighborModel.schedule()')
@@ -358,6 +1365,7 @@ def test_sum_vertices():
     # not introduce a net vertex at a constant's marginal price. Marginal
     # price is NOT meaningful for an inelastic device.
     test_asset_model.activeVertices = [interval_values[0]]
+    invalidate_vertices(test_asset_model)
 
     # Run the test.
     try:
@@ -410,6 +1418,7 @@ def test_sum_vertices():
         IntervalValue(test_node, time_interval, test_market, MeasurementType.ActiveVertex, test_vertex[1])
     ]
     test_asset_model.activeVertices = [interval_values[0], interval_values[1]]  # interval_value(1:2)
+    invalidate_vertices(test_asset_model)
 
     # Run the test.
     try:
@@ -448,6 +1457,110 @@ def test_sum_vertices():
     print('Result: #s\n\n', pf)
 
 
+def recorded_test_node():
+    # Create a test node whose models follow recorded curves in 25 time
+    # intervals: a price-responsive asset, an inelastic asset that is
+    # represented by a lone vertex, and a neighbor.
+    test_data = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_data')
+
+    # Read the building demand curves that were recorded from an EnergyPlus
+    # mix-market simulation. Each curve is a pair of (quantity, price) points.
+    curves = []
+    with open(os.path.join(test_data, 'energyplus.txt'), 'r') as fh:
+        for line in fh:
+            if "mixmarket DEBUG: Curves: " in line:
+                curves = eval(line[line.find('['):])
+                break
+    curves = [x for x in curves if x is not None]
+
+    # Read the transactive records that were recorded for a neighbor.
+    with open(os.path.join(test_data, 'PnnlC-SebBl.txt'), 'r') as fh:
+        records = [(float(r['MarginalPrice']), float(r['Power'])) for r in csv.DictReader(fh)]
+
+    # Create a test myTransactiveNode object and a test Market object.
+    test_node = myTransactiveNode()
+    test_market = Market()
+    test_node.markets = [test_market]
+
+    # Create a time interval for each recorded demand curve.
+    dt = datetime.now()
+    dur = timedelta(hours=1)
+    time_intervals = [TimeInterval(dt, dur, test_market, dt, dt + i * dur) for i in range(len(curves))]
+    test_market.timeIntervals = time_intervals
+
+    # A price-responsive asset that follows the recorded demand curves
+    tcc_asset = LocalAsset()
+    tcc_model = LocalAssetModel()
+    tcc_model.name = 'TccModel'
+    tcc_asset.model = tcc_model
+    tcc_model.object = tcc_asset
+
+    # An inelastic asset that is represented by a lone vertex
+    load_asset = LocalAsset()
+    load_model = LocalAssetModel()
+    load_model.name = 'InelasticModel'
+    load_asset.model = load_model
+    load_model.object = load_asset
+
+    # A neighbor that is represented by its recorded transactive records
+    test_neighbor = Neighbor()
+    test_neighbor_model = NeighborModel()
+    test_neighbor_model.name = 'NeighborModel'
+    test_neighbor.model = test_neighbor_model
+    test_neighbor_model.object = test_neighbor
+
+    test_node.localAssets = [tcc_asset, load_asset]
+    test_node.neighbors = [test_neighbor]
+
+    for i in range(len(time_intervals)):
+        ti = time_intervals[i]
+        tcc_model.activeVertices.extend([
+            IntervalValue(tcc_model, ti, test_market, MeasurementType.ActiveVertex,
+                          Vertex(p, 0.01 * i, -q)) for (q, p) in curves[i]])
+        load_model.activeVertices.append(
+            IntervalValue(load_model, ti, test_market, MeasurementType.ActiveVertex,
+                          Vertex(float("inf"), 0, -100.0 - i)))
+        test_neighbor_model.activeVertices.extend([
+            IntervalValue(test_neighbor_model, ti, test_market, MeasurementType.ActiveVertex,
+                          Vertex(mp, 1.0 + mp * max(p, 0), 0.5 * p + 50.0 * i)) for (mp, p) in records])
+
+    return test_node, test_market, time_intervals, tcc_model, test_neighbor_model
+
+
+def test_sum_vertices_vectorized():
+    print('Running Market.test_sum_vertices_vectorized()')
+    pf = 'pass'
+
+    test_node, test_market, time_intervals, tcc_model, test_neighbor_model = recorded_test_node()
+
+    for ote in [None, test_neighbor_model, tcc_model]:
+        if ote is None:
+            print('- Case 1: All neighbor and local asset models')
+        else:
+            print('- Case: Exclude {}'.format(ote.name))
+
+        for ti in time_intervals:
+            expected = test_market.sum_vertices(test_node, ti, ote)
+            actual = test_market.sum_vertices_vectorized(test_node, ti, ote)
+
+            if len(actual) != len(expected):
+                pf = 'fail'
+                raise Exception('  - an unexpected number of vertices was returned')
+
+            for e, a in zip(expected, actual):
+                if e.marginalPrice != a.marginalPrice \
+                        or abs(e.power - a.power) > 1e-9 \
+                        or abs(e.cost - a.cost) > 1e-9:
+                    pf = 'fail'
+                    raise Exception('  - the vertices differ from those of sum_vertices()')
+
+    print('  - the vertices were the same as those of sum_vertices()')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
 def test_update_costs():
     print('Running Market.test_update_costs()')
     pf = 'test is not complete'
@@ -457,6 +1570,53 @@ def test_update_costs():
     print('Result: #s\n\n', pf)
 
 
+def test_update_subgradient_step():
+    print('Running Market.test_update_subgradient_step()')
+    pf = 'pass'
+
+    test_market = Market()
+    step = test_market.subgradientStep
+
+    ## Case 1
+    print('- Case 1: Duality gap shrinks steadily')
+    test_market.dualityGaps = [0.1, 0.2]
+    test_market.update_subgradient_step()
+
+    if test_market.subgradientStep <= step:
+        pf = 'fail'
+        raise Exception('  - the step was not enlarged')
+    else:
+        print('  - the step was enlarged')
+
+    ## Case 2
+    print('- Case 2: Duality gap changes sign')
+    step = test_market.subgradientStep
+    test_market.dualityGaps = [-0.05, 0.1]
+    test_market.update_subgradient_step()
+
+    if test_market.subgradientStep >= step:
+        pf = 'fail'
+        raise Exception('  - the step was not reduced')
+    else:
+        print('  - the step was reduced')
+
+    ## Case 3
+    print('- Case 3: The step is bounded')
+    for i in range(50):
+        test_market.dualityGaps = [0.1, -0.1]
+        test_market.update_subgradient_step()
+
+    if test_market.subgradientStep != test_market.minSubgradientStep:
+        pf = 'fail'
+        raise Exception('  - the step was not bounded')
+    else:
+        print('  - the step was bounded')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
 def test_update_supply_demand():
     print('Running Market.test_update_supply_demand()')
     pf = 'test is not complete'
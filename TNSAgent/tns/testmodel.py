@@ -68,12 +68,15 @@ from neighbor import Neighbor
 from local_asset import LocalAsset
 from interval_value import IntervalValue
 from measurement_type import MeasurementType
+from model_dependency import ModelDependency
+from myTransactiveNode import myTransactiveNode
 
 
 def test_all():
     # TEST_ALL - test the sealed AbstractModel methods
     print('Running AbstractModel.test_all()')
     test_schedule()
+    test_needs_update()
     test_update_costs()
 
 
@@ -171,6 +174,91 @@ def test_schedule():
     print('Result: %s', pf)
 
 
+def test_needs_update():
+    print('Running AbstractModel.test_needs_update()')
+    pf = 'pass'
+
+    #   Create a test market with two time intervals
+    test_mkt = Market()
+    dt = datetime.now()
+    dur = timedelta(hours=1)
+    tis = [TimeInterval(dt, dur, test_mkt, dt, dt + i * dur) for i in range(2)]
+    test_mkt.timeIntervals = tis
+    test_mkt.check_marginal_prices()
+
+    #   Create a test node with a static local asset
+    test_node = myTransactiveNode()
+    test_obj = LocalAsset()
+    test_obj.maximumPower = 100
+    test_mdl = LocalAssetModel()
+    test_obj.model = test_mdl
+    test_mdl.object = test_obj
+    test_node.localAssets = [test_obj]
+
+    if test_mdl.dependency != ModelDependency.PriceDependent:
+        pf = 'fail'
+        raise Exception('  - a LocalAssetModel should be price-dependent')
+
+    test_mdl.dependency = ModelDependency.Static
+
+    print('- a static model that has not been scheduled:')
+
+    if not test_mdl.needs_update(test_mkt):
+        pf = 'fail'
+        raise Exception('  - the model should have needed an update')
+
+    test_mkt.schedule(test_node)
+    test_mkt.update_costs(test_node)
+
+    # (Production costs are not calculated in the current time interval.)
+    if len(test_mdl.scheduledPowers) != 2 or len(test_mdl.productionCosts) != 1:
+        pf = 'fail'
+        raise Exception('  - the model was not scheduled')
+    else:
+        print('  - the model was scheduled')
+
+    print('- a static model whose inputs have not changed:')
+
+    if test_mdl.needs_update(test_mkt):
+        pf = 'fail'
+        raise Exception('  - the model should not have needed an update')
+
+    test_mdl.defaultPower = -50
+    test_mkt.schedule(test_node)
+
+    if test_mdl.scheduledPowers[0].value == -50:
+        pf = 'fail'
+        raise Exception('  - the model should have been skipped')
+    else:
+        print('  - the model was skipped')
+
+    print('- a static model that is marked dirty:')
+
+    test_mdl.mark_dirty()
+    test_mkt.schedule(test_node)
+    test_mkt.update_costs(test_node)
+
+    if [x.value for x in test_mdl.scheduledPowers] != [-50, -50] or test_mdl.isDirty:
+        pf = 'fail'
+        raise Exception('  - the model was not recalculated')
+    else:
+        print('  - the model was recalculated')
+
+    print('- a price-dependent model:')
+
+    test_mdl.dependency = ModelDependency.PriceDependent
+
+    if not test_mdl.needs_update(test_mkt):
+        pf = 'fail'
+        raise Exception('  - the model should always need an update')
+    else:
+        print('  - the model always needs an update')
+
+    #   Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
 def test_update_costs():
     print('Running AbstractModel.test_update_costs()')
 
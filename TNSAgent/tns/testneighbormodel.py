@@ -57,6 +57,7 @@
 # }}}
 
 
+import json
 from datetime import datetime, timedelta, date, time
 from dateutil import relativedelta
 
@@ -83,16 +84,21 @@ def test_all():
 
     test_calculate_reserve_margin()
     test_check_for_convergence()
+    test_check_for_convergence_incremental()
+    test_signal_damping()
     test_marginal_price_from_vertices()
     test_prep_transactive_signal()
     test_receive_transactive_signal()
     test_schedule_engagement()
     test_schedule_power()
     test_send_transactive_signal()
+    test_transactive_signal_codec()
+    test_transactive_signal_delta()
     test_update_dc_threshold()
     test_update_dual_costs()
     test_update_production_costs()
     test_update_vertices()
+    test_update_vertices_vectorized()
 
 
 def test_calculate_reserve_margin():
@@ -450,6 +456,217 @@ def test_check_for_convergence():
     print('\nResult: #s\n\n', pf)
 
 
+def test_check_for_convergence_incremental():
+    print('Running NeighborModel.test_check_for_convergence_incremental()')
+    pf = 'pass'
+
+    # Create a test market having three active time intervals.
+    test_market = Market()
+    dt = datetime(2018, 1, 1, 0, 0)
+    test_market.timeIntervals = [TimeInterval(dt, timedelta(hours=1), test_market, dt, dt + timedelta(hours=i))
+                                 for i in range(3)]
+    names = [x.name for x in test_market.timeIntervals]
+
+    test_model = NeighborModel()
+    test_model.transactive = True
+
+    # Count the time intervals whose convergence flags are evaluated.
+    evaluated = []
+    interval_converged = test_model.interval_converged
+
+    def counted(ti, *args, **kwargs):
+        evaluated.append(ti.name)
+        return interval_converged(ti, *args, **kwargs)
+
+    test_model.interval_converged = counted
+
+    ## TEST 1
+    print('- Test 1: Nothing has been sent')
+
+    test_model.mySignal = [TransactiveRecord(x, 0, 0.05, 100) for x in names]
+    test_model.check_for_convergence(test_market)
+
+    if test_model.converged or len(test_model.unconvergedIntervals) != 3 or len(evaluated) != 3:
+        pf = 'fail'
+        raise Exception('  - the model was not found unconverged')
+    else:
+        print('  - the model was unconverged')
+
+    ## TEST 2
+    print('- Test 2: The prepared signal has been sent')
+
+    test_model.sentSignal = test_model.mySignal
+    test_model.index_signal('sent')
+    test_model.check_for_convergence(test_market)
+
+    if not test_model.converged or not all([x.value for x in test_model.convergenceFlags]):
+        pf = 'fail'
+        raise Exception('  - the model was not found converged')
+    else:
+        print('  - the model was converged')
+
+    ## TEST 3
+    print('- Test 3: Nothing changed')
+
+    del evaluated[:]
+    test_model.check_for_convergence(test_market)
+
+    if evaluated != [] or not test_model.converged:
+        pf = 'fail'
+        raise Exception('  - convergence flags were evaluated again')
+    else:
+        print('  - no convergence flags were evaluated again')
+
+    ## TEST 4
+    print('- Test 4: A different signal is received in one time interval')
+
+    received = TransactiveRecord(names[1], 0, 0.05, -150)
+    received.timeStamp = test_model.sentSignal[1].timeStamp + timedelta(seconds=1)
+    test_model.receivedSignal = [received]
+    test_model.index_signal('received')
+    test_model.check_for_convergence(test_market)
+
+    if evaluated != [names[1]] or test_model.converged \
+            or test_model.unconvergedIntervals != set([names[1]]):
+        pf = 'fail'
+        raise Exception('  - only the changed time interval should have been evaluated')
+    else:
+        print('  - only the changed time interval was evaluated, and it was unconverged')
+
+    # Success.
+    print('- the test ran to completion')
+    print('\nResult: #s\n\n', pf)
+
+
+def test_signal_damping():
+    print('Running NeighborModel.test_signal_damping()')
+    pf = 'pass'
+
+    from transactive_record import encode_signal
+    from timer import Timer
+
+    # Create a test market having one active time interval.
+    test_market = Market()
+    dt = datetime(2018, 1, 1, 0, 0)
+    test_market.timeIntervals = [TimeInterval(dt, timedelta(hours=1), test_market, dt, dt)]
+    name = test_market.timeIntervals[0].name
+
+    def sent_model():
+        # A model that has sent its prepared signal of 100 kW.
+        test_model = NeighborModel()
+        test_model.transactive = True
+        test_model.mySignal = [TransactiveRecord(name, 0, 0.05, 100)]
+        test_model.sentSignal = test_model.mySignal
+        test_model.check_for_convergence(test_market)
+        return test_model
+
+    ## TEST 1
+    print('- Test 1: Hysteresis')
+
+    test_model = sent_model()
+    test_model.hysteresis = 0.1
+
+    # About 10# from the sent signal, which the threshold alone would not allow.
+    test_model.mySignal = [TransactiveRecord(name, 0, 0.05, 110)]
+    test_model.check_for_convergence(test_market)
+
+    if not test_model.converged or test_model.suppressedSends != 1:
+        pf = 'fail'
+        raise Exception('  - the hysteresis did not suppress the small change')
+    else:
+        print('  - the hysteresis suppressed the small change')
+
+    test_model.mySignal = [TransactiveRecord(name, 0, 0.05, 130)]
+    test_model.check_for_convergence(test_market)
+
+    if test_model.converged or test_model.suppressedSends != 1:
+        pf = 'fail'
+        raise Exception('  - the hysteresis suppressed the large change')
+    else:
+        print('  - the large change was not suppressed')
+
+    ## TEST 2
+    print('- Test 2: Power deadband')
+
+    test_model = sent_model()
+    test_model.powerDeadband = 20.0  # [avg.kW]
+
+    test_model.mySignal = [TransactiveRecord(name, 0, 0.05, 110)]
+    test_model.check_for_convergence(test_market)
+
+    if not test_model.converged or test_model.suppressedSends != 1:
+        pf = 'fail'
+        raise Exception('  - the deadband did not suppress the small change')
+    else:
+        print('  - the deadband suppressed the small change')
+
+    ## TEST 3
+    print('- Test 3: Minimum time between sends')
+
+    test_model = NeighborModel()
+    test_model.minimumSendInterval = timedelta(minutes=5)
+    test_model.lastSendTime = Timer.get_cur_time()
+
+    if test_model.send_due() or test_model.deferredSends != 1:
+        pf = 'fail'
+        raise Exception('  - the signal was not deferred')
+    else:
+        print('  - the signal was deferred')
+
+    test_model.lastSendTime = Timer.get_cur_time() - timedelta(minutes=10)
+
+    if not test_model.send_due():
+        pf = 'fail'
+        raise Exception('  - the signal was not due')
+    else:
+        print('  - the signal was due once the time had elapsed')
+
+    ## TEST 4
+    print('- Test 4: Smoothing of received prices')
+
+    test_mtn = myTransactiveNode()
+    test_model = NeighborModel()
+    test_model.transactive = True
+    test_model.priceSmoothing = 0.5
+
+    test_model.receive_transactive_signal(test_mtn, encode_signal([TransactiveRecord(name, 0, 0.05, 100)]))
+    first = test_model.receivedSignal[0]
+    test_model.receive_transactive_signal(test_mtn, encode_signal([TransactiveRecord(name, 0, 0.07, 100)]))
+
+    if abs(test_model.receivedSignal[0].marginalPrice - 0.06) > 1e-9 or first.marginalPrice != 0.05:
+        pf = 'fail'
+        raise Exception('  - the received price was not smoothed')
+    else:
+        print('  - the received price was smoothed')
+
+    ## TEST 5
+    print('- Test 5: A node damps the signals of its neighbor models')
+
+    test_mtn = myTransactiveNode()
+    test_model = NeighborModel()
+    test_mtn.damp_signals(test_model)
+
+    if test_model.damped() or test_model.minimumSendInterval != timedelta(0) or test_model.priceSmoothing != 0:
+        pf = 'fail'
+        raise Exception('  - the node defaults damped the signals')
+    else:
+        print('  - the node defaults did not damp the signals')
+
+    test_mtn.power_deadband = 20.0  # [avg.kW]
+    test_mtn.min_send_interval = 300  # [s]
+    test_mtn.damp_signals(test_model)
+
+    if test_model.powerDeadband != 20.0 or test_model.minimumSendInterval != timedelta(minutes=5):
+        pf = 'fail'
+        raise Exception('  - the node did not apply its damping')
+    else:
+        print('  - the node applied its damping')
+
+    # Success.
+    print('- the test ran to completion')
+    print('\nResult: #s\n\n', pf)
+
+
 def test_marginal_price_from_vertices():
     # TEST_MARGINAL_PRICE_FROM_VERTICES() - test method
     # marginal_price_from_vertices().
@@ -612,6 +829,7 @@ def test_prep_transactive_signal():
     test_object.maximumPower = -10
     test_object.minimumPower = -75
     test_asset_model.activeVertices = [interval_values[2], interval_values[4]]
+    invalidate_vertices(test_asset_model)
 
     test_model.prep_transactive_signal(test_market, test_myTransactiveNode)
     print('  - the method ran to completion without errors')
@@ -652,6 +870,7 @@ def test_prep_transactive_signal():
     test_object.maximumPower = 75
     test_object.minimumPower = 10
     test_asset_model.activeVertices = [interval_values[0], interval_values[2]]
+    invalidate_vertices(test_asset_model)
 
     test_model.prep_transactive_signal(test_market, test_myTransactiveNode)
     print('  - the method ran to completion without errors')
@@ -694,6 +913,7 @@ def test_prep_transactive_signal():
     test_asset_model.activeVertices = [interval_values[0],
                                        interval_values[1],  # an extra vertex in active flex range
                                        interval_values[2]]
+    invalidate_vertices(test_asset_model)
 
     test_model.prep_transactive_signal(test_market, test_myTransactiveNode)
     print('  - the method ran to completion without errors')
@@ -993,6 +1213,231 @@ def test_send_transactive_signal():
     # delete(expected_filename)
 
 
+def test_transactive_signal_codec():
+    print('Running NeighborModel.test_transactive_signal_codec()')
+    pf = 'pass'
+
+    from transactive_record import SIGNAL_VERSION
+
+    # The node publishes on a stand-in message bus that keeps the messages.
+    class TestPubSub(object):
+        def __init__(self):
+            self.messages = []
+
+        def publish(self, peer, topic, message):
+            self.messages.append(message)
+
+    class TestVip(object):
+        def __init__(self):
+            self.pubsub = TestPubSub()
+
+    test_mtn = myTransactiveNode()
+    test_mtn.vip = TestVip()
+
+    # Create a sending and a receiving transactive neighbor model.
+    test_sender = NeighborModel()
+    test_sender.transactive = True
+    test_sender.location = 'sender'
+    test_receiver = NeighborModel()
+    test_receiver.transactive = True
+
+    dt = datetime(2018, 1, 1, 0, 0)
+    time_interval = TimeInterval(dt, timedelta(hours=1), Market(), dt, dt)
+    test_sender.mySignal = [TransactiveRecord(time_interval, 0, 0.05, 100, cost=1.5),
+                            TransactiveRecord(time_interval, 1, 0.04, 50),
+                            TransactiveRecord(time_interval, 2, 0.06, 150, cost=4.0)]
+
+    ## TEST 1
+    print('- Test 1: Send a versioned signal')
+
+    test_sender.send_transactive_signal(test_mtn, 'topic')
+    curves = test_mtn.vip.pubsub.messages[-1]['curves']
+
+    if curves['version'] != SIGNAL_VERSION or len(curves['rows']) != 3 \
+            or any([len(x) != len(curves['fields']) for x in curves['rows']]):
+        pf = 'fail'
+        raise Exception('  - the signal was not encoded as expected')
+    else:
+        print('  - the signal was encoded as expected')
+
+    ## TEST 2
+    print('- Test 2: Receive the signal')
+
+    # The message is serialized once, by the bus.
+    test_receiver.receive_transactive_signal(test_mtn, json.loads(json.dumps(curves)))
+
+    sent = [(x.timeInterval, x.record, x.marginalPrice, x.power, x.cost) for x in test_sender.mySignal]
+    received = [(x.timeInterval, x.record, x.marginalPrice, x.power, x.cost) for x in test_receiver.receivedSignal]
+    if received != sent:
+        pf = 'fail'
+        raise Exception('  - the received records did not match those sent')
+    else:
+        print('  - the received records matched those sent')
+
+    # Receiving the same signal again is not a material change.
+    if test_receiver.receive_transactive_signal(test_mtn, json.loads(json.dumps(curves))):
+        pf = 'fail'
+        raise Exception('  - the repeated signal was found changed')
+    else:
+        print('  - the repeated signal was not found changed')
+
+    ## TEST 3
+    print('- Test 3: Receive a legacy signal')
+
+    legacy = [{'timeInterval': x[0], 'record': x[1], 'marginalPrice': x[2], 'power': x[3], 'cost': x[4]}
+              for x in sent]
+    test_receiver.receive_transactive_signal(test_mtn, legacy)
+
+    received = [(x.timeInterval, x.record, x.marginalPrice, x.power, x.cost) for x in test_receiver.receivedSignal]
+    if received != sent:
+        pf = 'fail'
+        raise Exception('  - the legacy records were not received')
+    else:
+        print('  - the legacy records were received')
+
+    ## TEST 4
+    print('- Test 4: Reject an unknown version')
+
+    received = test_receiver.receivedSignal
+    changed = test_receiver.receive_transactive_signal(test_mtn, dict(curves, version=SIGNAL_VERSION + 1))
+
+    if changed or test_receiver.receivedSignal is not received:
+        pf = 'fail'
+        raise Exception('  - an unknown version was accepted')
+    else:
+        print('  - an unknown version was rejected')
+
+    ## TEST 5
+    print('- Test 5: Build a message to publish with those of other neighbors')
+
+    published = len(test_mtn.vip.pubsub.messages)
+    test_sender.sentSignal = []
+    message = test_sender.transactive_message(start_of_cycle=True)
+
+    if len(test_mtn.vip.pubsub.messages) != published or message['source'] != 'sender' \
+            or not message['start_of_cycle'] or test_sender.sentSignal is not test_sender.mySignal:
+        pf = 'fail'
+        raise Exception('  - the message was not built as expected')
+    else:
+        print('  - the message was built, and the records saved as sent, without publishing')
+
+    # Success.
+    print('- the test ran to completion')
+    print('\nResult: #s\n\n', pf)
+
+
+def test_transactive_signal_delta():
+    print('Running NeighborModel.test_transactive_signal_delta()')
+    pf = 'pass'
+
+    # The node publishes on a stand-in message bus that keeps the messages.
+    class TestPubSub(object):
+        def __init__(self):
+            self.messages = []
+
+        def publish(self, peer, topic, message):
+            self.messages.append(message)
+
+    class TestVip(object):
+        def __init__(self):
+            self.pubsub = TestPubSub()
+
+    test_mtn = myTransactiveNode()
+    test_mtn.vip = TestVip()
+
+    # Create a sending and a receiving transactive neighbor model.
+    test_sender = NeighborModel()
+    test_sender.transactive = True
+    test_sender.snapshotInterval = 5
+    test_receiver = NeighborModel()
+    test_receiver.transactive = True
+
+    # Three time intervals, having a scheduled point and a flex record each.
+    names = ['20180101T000000', '20180101T010000', '20180101T020000']
+
+    def signal(powers):
+        return [TransactiveRecord(names[i], r, 0.05 + 0.01 * r, powers[i] + 10 * r)
+                for i in range(len(powers)) for r in range(2)]
+
+    def send(records, deliver=True):
+        test_sender.mySignal = records
+        test_sender.send_transactive_signal(test_mtn, 'topic')
+        curves = test_mtn.vip.pubsub.messages[-1]['curves']
+        if deliver:
+            test_receiver.receive_transactive_signal(test_mtn, json.loads(json.dumps(curves)))
+        return curves
+
+    def held(model):
+        return [(x.timeInterval, x.record, x.power) for x in model.receivedSignal]
+
+    def delivered():
+        return [(x.timeInterval, x.record, x.power)
+                for name in names if name in test_sender.deliveredSignal
+                for x in test_sender.deliveredSignal[name]]
+
+    ## TEST 1
+    print('- Test 1: The first signal is a full snapshot')
+
+    curves = send(signal([100, 200, 300]))
+
+    if not curves['full'] or len(curves['rows']) != 6 or held(test_receiver) != delivered():
+        pf = 'fail'
+        raise Exception('  - the first signal was not a full snapshot')
+    else:
+        print('  - the first signal was a full snapshot')
+
+    ## TEST 2
+    print('- Test 2: Only the changed time intervals are sent')
+
+    # The first interval changes by less than the threshold; the second, more.
+    curves = send(signal([101, 250, 300]))
+
+    if curves['full'] or set([x[0] for x in curves['rows']]) != set([names[1]]) \
+            or held(test_receiver) != delivered() \
+            or [x[2] for x in held(test_receiver) if x[1] == 0] != [100, 250, 300]:
+        pf = 'fail'
+        raise Exception('  - the delta was not as expected')
+    else:
+        print('  - the delta held only the changed time interval')
+
+    # Small changes accumulate against the delivered records, not the last
+    # calculated ones.
+    curves = send(signal([106, 250, 300]))
+
+    if set([x[0] for x in curves['rows']]) != set([names[0]]):
+        pf = 'fail'
+        raise Exception('  - small changes were not accumulated')
+    else:
+        print('  - small changes were accumulated until they were sent')
+
+    ## TEST 3
+    print('- Test 3: A missed delta is detected and a snapshot recovers')
+
+    send(signal([106, 250, 400]), deliver=False)
+
+    # The expired first time interval is dropped.
+    send(signal([106, 250, 400])[2:])
+
+    if test_receiver.signalGaps != 1 or held(test_receiver) != [(names[1], 0, 250), (names[1], 1, 260),
+                                                                  (names[2], 0, 300), (names[2], 1, 310)]:
+        pf = 'fail'
+        raise Exception('  - the gap was not detected')
+    else:
+        print('  - the gap was detected')
+
+    curves = send(signal([106, 250, 400])[2:])
+
+    if not curves['full'] or held(test_receiver) != delivered():
+        pf = 'fail'
+        raise Exception('  - the snapshot did not recover the full signal')
+    else:
+        print('  - the snapshot recovered the full signal')
+
+    # Success.
+    print('- the test ran to completion')
+    print('\nResult: #s\n\n', pf)
+
+
 def test_update_dc_threshold():
     print('Running NeighborModel.test_update_dc_threshold()')
     pf = 'pass'
@@ -1438,5 +1883,99 @@ def test_update_vertices():
     print('\nResult: #s\n\n', pf)
 
 
+
+def test_update_vertices_vectorized():
+    print('Running NeighborModel.test_update_vertices_vectorized()')
+    pf = 'pass'
+
+    import random
+
+    # Interpolating between infinite prices makes NaN prices, which are
+    # compared as text.
+    def vertices(model):
+        return [(x.timeInterval.startTime, repr(x.value.marginalPrice), x.value.cost, x.value.power,
+                 x.value.continuity) for x in model.activeVertices]
+
+    # Create a test market having six active time intervals.
+    test_market = Market()
+    dt = datetime(2018, 1, 1, 0, 0)
+    test_market.timeIntervals = [TimeInterval(dt, timedelta(hours=1), test_market, dt, dt + timedelta(hours=i))
+                                 for i in range(6)]
+
+    ## TEST 1
+    print('- Test 1: Non-transactive and defaulted time intervals')
+
+    test_models = []
+    for transactive in [False, True]:
+        test_model = NeighborModel()
+        test_model.transactive = transactive
+        test_model.defaultVertices = [Vertex(0.045, 0, 0), Vertex(0.05, 10, 200)]
+        test_object = Neighbor()
+        test_object.model = test_model
+        test_model.object = test_object
+        test_model.update_vertices_scalar(test_market)
+        test_models.append(vertices(test_model))
+        test_model.update_vertices_vectorized(test_market)
+        test_models.append(vertices(test_model))
+
+    if test_models[0] != test_models[1] or test_models[2] != test_models[3] or len(test_models[1]) != 12:
+        pf = 'fail'
+        raise Exception('  - the default vertices differed')
+    else:
+        print('  - the default vertices were the same')
+
+    ## TEST 2
+    print('- Test 2: Recorded signals, with losses and demand charges')
+
+    # Signals are recorded from a seeded generator, so the cases cover single
+    # records, balance points among flex records, ties, imports that exceed
+    # the demand-charge thresholds, and exports.
+    rng = random.Random(2018)
+    names = [x.name for x in test_market.timeIntervals]
+
+    for case in range(50):
+        signal = []
+        for name in names:
+            count = rng.choice([0, 1, 2, 3, 4, 5])
+            for r in range(count):
+                power = rng.choice([-1, 1]) * rng.choice([0, 50, 100, 150, 180, 200])
+                price = rng.choice([0.04, 0.045, 0.05, 0.055, float('inf')])
+                signal.append(TransactiveRecord(name, r, price, power, cost=rng.random()))
+
+        demand_threshold = rng.choice([50, 120, 1e9])  # [avg.kW]
+
+        results = []
+        for method in ['update_vertices_scalar', 'update_vertices_vectorized']:
+            test_model = NeighborModel()
+            test_model.transactive = True
+            test_model.demandRate = 4.5
+            test_model.demandThreshold = demand_threshold
+            test_model.defaultVertices = [Vertex(0.045, 0, 0), Vertex(0.05, 10, 200)]
+            test_model.receivedSignal = signal
+
+            # Scheduled powers are known for some of the early time intervals.
+            test_model.scheduledPowers = [
+                IntervalValue(test_model, x, test_market, MeasurementType.ScheduledPower, 40 + 30 * i)
+                for i, x in enumerate(test_market.timeIntervals[0:case % 4])]
+
+            test_object = Neighbor()
+            test_object.maximumPower = 200
+            test_object.lossFactor = 0.01 * (case % 3)
+            test_object.model = test_model
+            test_model.object = test_object
+
+            getattr(test_model, method)(test_market)
+            results.append(vertices(test_model))
+
+        if results[0] != results[1]:
+            pf = 'fail'
+            raise Exception('  - the vertices differed in case {}'.format(case))
+
+    print('  - the vertices were the same in all recorded cases')
+
+    # Success.
+    print('- the test ran to completion')
+    print('\nResult: #s\n\n', pf)
+
 if __name__ == '__main__':
     test_all()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2017, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+
+# }}}
+
+
+
+from datetime import datetime, timedelta
+
+from rebalance_scheduler import RebalanceScheduler
+
+
+class SimulatedClock(object):
+    # A clock that is advanced by the test, and a schedule that keeps the
+    # scheduled calls, as Agent.core.schedule() would.
+    def __init__(self):
+        self.now = datetime(2018, 1, 1, 12)
+        self.scheduled = []
+
+    def __call__(self):
+        return self.now
+
+    def schedule(self, deadline, function):
+        self.scheduled.append((deadline, function))
+
+    def advance(self, seconds):
+        # Advance the clock and make the calls that became due.
+        self.now = self.now + timedelta(seconds=seconds)
+        due = [x for x in self.scheduled if x[0] <= self.now]
+        self.scheduled = [x for x in self.scheduled if x[0] > self.now]
+        for deadline, function in due:
+            function()
+
+
+def test_all():
+    print('Running RebalanceScheduler.test_all()')
+    test_coalesce()
+    test_min_interval()
+    test_no_debounce()
+
+
+def test_coalesce():
+    print('Running RebalanceScheduler.test_coalesce()')
+    pf = 'pass'
+
+    clock = SimulatedClock()
+    runs = []
+    test_scheduler = RebalanceScheduler(runs.append, clock.schedule, timedelta(seconds=2), timedelta(seconds=10),
+                                        clock)
+
+    ## CASE: A burst of requests is coalesced into one rebalance
+    for i in range(5):
+        test_scheduler.request(neighbor=i)
+        clock.advance(0.1)
+
+    if len(runs) != 0 or len(clock.scheduled) != 1:
+        pf = 'fail'
+        raise Exception('- the rebalance was not debounced')
+    else:
+        print('- the rebalance was debounced')
+
+    clock.advance(2)
+
+    if len(runs) != 1 or [x['neighbor'] for x in runs[0]] != list(range(5)):
+        pf = 'fail'
+        raise Exception('- the requests were not coalesced')
+    else:
+        print('- the requests were coalesced into one rebalance')
+
+    if test_scheduler.requestCount != 5 or test_scheduler.runCount != 1 or test_scheduler.pending is not None:
+        pf = 'fail'
+        raise Exception('- the counts were not as expected')
+    else:
+        print('- the counts were as expected')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_min_interval():
+    print('Running RebalanceScheduler.test_min_interval()')
+    pf = 'pass'
+
+    clock = SimulatedClock()
+    runs = []
+    test_scheduler = RebalanceScheduler(runs.append, clock.schedule, timedelta(seconds=2), timedelta(seconds=10),
+                                        clock)
+
+    test_scheduler.request()
+    clock.advance(2)
+
+    ## CASE: The next rebalance waits for the minimum interval
+    clock.advance(1)
+    test_scheduler.request()
+
+    if clock.scheduled[0][0] != test_scheduler.lastRun + timedelta(seconds=10):
+        pf = 'fail'
+        raise Exception('- the rebalance was not limited by the minimum interval')
+    else:
+        print('- the rebalance was limited by the minimum interval')
+
+    clock.advance(8)
+    if len(runs) != 1:
+        pf = 'fail'
+        raise Exception('- the rebalance ran too soon')
+
+    clock.advance(1)
+    if len(runs) != 2:
+        pf = 'fail'
+        raise Exception('- the rebalance did not run')
+    else:
+        print('- the rebalance ran after the minimum interval')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_no_debounce():
+    print('Running RebalanceScheduler.test_no_debounce()')
+    pf = 'pass'
+
+    clock = SimulatedClock()
+    runs = []
+    test_scheduler = RebalanceScheduler(runs.append, clock.schedule, timedelta(0), timedelta(0), clock)
+
+    ## CASE: Without debounce or minimum interval, requests run immediately
+    test_scheduler.request()
+    test_scheduler.request()
+
+    if len(runs) != 2 or len(clock.scheduled) != 0:
+        pf = 'fail'
+        raise Exception('- the rebalances did not run immediately')
+    else:
+        print('- the rebalances ran immediately')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+if __name__ == '__main__':
+    test_all()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2017, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+
+# }}}
+
+
+from datetime import datetime, timedelta
+
+from event_clock import EventClock
+from simulation_harness import MemoryBus, Simulation, make_hierarchy
+from timer import Timer
+
+
+def test_all():
+    print('Running SimulationHarness.test_all()')
+    test_memory_bus()
+    test_hierarchy()
+
+
+def test_memory_bus():
+    print('Running SimulationHarness.test_memory_bus()')
+    pf = 'pass'
+
+    start = datetime(2018, 1, 1)
+    test_clock = EventClock(start)
+    test_bus = MemoryBus(test_clock, timedelta(seconds=1))
+    received = []
+
+    def callback(peer, sender, bus, topic, headers, message):
+        received.append((test_clock.now(), topic, message))
+
+    test_bus.subscribe(prefix='tns/campus/', callback=callback)
+
+    ## CASE: Messages are delivered by topic prefix, after the latency
+    test_bus.publish(topic='tns/campus/', message=1)
+    test_bus.publish(topic='tns/building0/', message=2)
+    test_bus.publish(topic='tns/campus/', message=3)
+
+    if len(received) != 0:
+        pf = 'fail'
+        raise Exception('- the messages were delivered without latency')
+
+    test_clock.run()
+
+    if [x[2] for x in received] != [1, 3] or received[0][0] != start + timedelta(seconds=1) \
+            or test_bus.messageCount != 3:
+        pf = 'fail'
+        raise Exception('- the messages were not delivered as expected')
+    else:
+        print('- the messages were delivered by topic, in order, after the latency')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_hierarchy():
+    print('Running SimulationHarness.test_hierarchy()')
+    pf = 'pass'
+
+    def simulate(method=None):
+        with Simulation() as simulation:
+            if Timer.clock is not simulation.clock:
+                raise Exception('- the simulation clock was not installed')
+
+            if method is not None:
+                simulation.marketMethod = method
+
+            city, campus, buildings = make_hierarchy(simulation, 3)
+            reports = simulation.run(2)
+            prices = [(x.timeInterval.name, x.value) for x in campus.markets[0].marginalPrices]
+            text = simulation.report()
+
+        return reports, prices, buildings, text
+
+    ## CASE: The city, campus, and buildings converge in each cycle
+    # The agents' default market method (2) is used.
+    reports, prices, buildings, text = simulate()
+
+    if Timer.clock is not None:
+        pf = 'fail'
+        raise Exception('- the simulation clock was not removed')
+
+    if not all([x['converged'] for x in reports]) or any([x['messages'] == 0 for x in reports]):
+        pf = 'fail'
+        raise Exception('- the nodes did not converge')
+    else:
+        print('- the nodes converged in each cycle')
+
+    if any([x.signalsReceived == 0 or x.signalsSent == 0 or x.balanceCount == 0 for x in buildings]):
+        pf = 'fail'
+        raise Exception('- the buildings did not exchange signals')
+    else:
+        print('- the buildings exchanged signals')
+
+    if len(text.splitlines()) != 3:
+        pf = 'fail'
+        raise Exception('- the timing report did not have a line per cycle')
+    else:
+        print('- the timing report was:')
+        print(text)
+
+    if any([x['nodes']['campus']['iterations'] < x['nodes']['campus']['balances'] for x in reports]):
+        pf = 'fail'
+        raise Exception('- the balance iterations were not counted')
+
+    ## CASE: The simulation is deterministic
+    # The faster decomposed market method (4) is used.
+    reports, prices = simulate(4)[:2]
+    again = simulate(4)
+    counts = [(x['messages'], x['events'], x['converge_seconds'],
+               sorted([(k, v['balances'], v['signals_sent']) for k, v in x['nodes'].items()])) for x in reports]
+    counts_again = [(x['messages'], x['events'], x['converge_seconds'],
+                     sorted([(k, v['balances'], v['signals_sent']) for k, v in x['nodes'].items()])) for x in again[0]]
+
+    if counts != counts_again or prices != again[1]:
+        pf = 'fail'
+        raise Exception('- the simulation was not deterministic')
+    else:
+        print('- the simulation was deterministic')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+if __name__ == '__main__':
+    test_all()
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2017, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+
+# }}}
+
+
+from datetime import datetime, timedelta
+
+from vertex import Vertex
+from vertex_set import VertexSet
+from helpers import *
+from measurement_type import MeasurementType
+from interval_value import IntervalValue
+from market import Market
+from time_interval import TimeInterval
+from local_asset_model import LocalAssetModel
+
+
+def test_all():
+    print('Running VertexSet.test_all()')
+    test_adapters()
+    test_for_interval()
+    test_merge()
+    test_sorted()
+
+
+def test_adapters():
+    print('Running VertexSet.test_adapters()')
+    pf = 'pass'
+
+    vertices = [Vertex(0.02, 5.0, 0.0), Vertex(0.025, 9.25, 200.0, continuity=False, power_uncertainty=0.1)]
+
+    ## CASE: Vertices are stored and iterated as Vertex objects
+    test_set = VertexSet.from_vertices(vertices)
+
+    found = [(x.marginalPrice, x.cost, x.power, x.powerUncertainty, x.continuity) for x in test_set]
+    expected = [(0.02, 5.0, 0.0, 0.0, True), (0.025, 9.25, 200.0, 0.1, False)]
+    if len(test_set) != 2 or found != expected:
+        pf = 'fail'
+        raise Exception('- the vertices were not iterated as expected')
+    else:
+        print('- the vertices were iterated as expected')
+
+    if test_set[1].power != 200.0 or not isinstance(test_set[0:1], VertexSet):
+        pf = 'fail'
+        raise Exception('- the vertices were not indexed as expected')
+    else:
+        print('- the vertices were indexed as expected')
+
+    ## CASE: Vertices are listed as interval values
+    test_object = LocalAssetModel()
+    test_market = Market()
+    dt = datetime(2018, 1, 1, 12)
+    ti = TimeInterval(dt, timedelta(hours=1), test_market, dt, dt)
+
+    test_set = VertexSet.from_arrays([0.02, 0.03], 0.0, [10.0, 20.0], keys=ti.key)
+    ivs = test_set.to_interval_values(test_object, [ti], test_market, MeasurementType.ActiveVertex)
+
+    if [x.timeInterval for x in ivs] != [ti, ti] or [x.value.power for x in ivs] != [10.0, 20.0]:
+        pf = 'fail'
+        raise Exception('- the interval values were not as expected')
+    else:
+        print('- the interval values were as expected')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_for_interval():
+    print('Running VertexSet.test_for_interval()')
+    pf = 'pass'
+
+    test_object = LocalAssetModel()
+    test_market = Market()
+    dt = datetime(2018, 1, 1, 12)
+    dur = timedelta(hours=1)
+    ti = [TimeInterval(dt, dur, test_market, dt, dt + i * dur) for i in range(2)]
+
+    test_object.activeVertices = [
+        IntervalValue(test_object, ti[0], test_market, MeasurementType.ActiveVertex, Vertex(0.02, 0, 10)),
+        IntervalValue(test_object, ti[1], test_market, MeasurementType.ActiveVertex, Vertex(0.03, 0, 20)),
+        IntervalValue(test_object, ti[0], test_market, MeasurementType.ActiveVertex, Vertex(0.04, 0, 30))]
+
+    test_set = VertexSet.from_interval_values(test_object.activeVertices)
+
+    if list(test_set.for_interval(ti[0]).powers) != [10.0, 30.0] \
+            or list(test_set.interval_keys()) != [ti[0].key, ti[1].key]:
+        pf = 'fail'
+        raise Exception('- the vertices of a time interval were not sliced')
+    else:
+        print('- the vertices of a time interval were sliced')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_merge():
+    print('Running VertexSet.test_merge()')
+    pf = 'pass'
+
+    test_sets = [VertexSet.from_arrays([0.02], 1.0, [10.0]),
+                 VertexSet(),
+                 VertexSet.from_arrays([0.03, 0.04], 2.0, [20.0, 30.0])]
+
+    merged = VertexSet.merge(test_sets)
+
+    if len(merged) != 3 or list(merged.costs) != [1.0, 2.0, 2.0] or len(VertexSet.merge([])) != 0:
+        pf = 'fail'
+        raise Exception('- the vertex sets were not merged')
+    else:
+        print('- the vertex sets were merged')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+def test_sorted():
+    print('Running VertexSet.test_sorted()')
+    pf = 'pass'
+
+    vertices = [Vertex(0.03, 0, 50), Vertex(0.02, 0, 100), Vertex(0.02, 0, 0), Vertex(float('inf'), 0, 200),
+                Vertex(0.025, 0, 75)]
+
+    test_set = VertexSet.from_vertices(vertices).sorted()
+    expected = order_vertices(vertices)
+
+    if [(x.marginalPrice, x.power) for x in test_set] != [(x.marginalPrice, x.power) for x in expected]:
+        pf = 'fail'
+        raise Exception('- the vertices were not ordered as by order_vertices()')
+    else:
+        print('- the vertices were ordered as by order_vertices()')
+
+    # Success
+    print('- the test ran to completion')
+    print('Result: #s\n\n', pf)
+
+
+if __name__ == '__main__':
+    test_all()
@@ -86,9 +86,12 @@ class TimeInterval:
         self.converged = False
 
         # DURATION - duration of interval[hr]
-        # Ensure that content is a duration [hr]
+        # Ensure that content is a duration [hr]. Horizons may mix durations
+        # (see Market.horizonSchedule), so every interval carries its own.
         if isinstance(duration, timedelta):
             self.duration = duration
+        else:
+            self.duration = timedelta(hours=duration)
 
         # MARKET - Market object that uses this TimeInterval
         self.market = market
@@ -103,6 +106,10 @@ class TimeInterval:
         # NAME
         self.name = helpers.format_ts(self.startTime)
 
+        # KEY - integer minutes of the start time since 1970 (see
+        #       helpers.interval_key()), for cheap comparisons and lookups
+        self.key = helpers.interval_key(self.startTime)
+
         # RECONCILED - reconciliation flag for possible future use
         self.reconciled = False
 
@@ -61,6 +61,7 @@ from datetime import datetime
 
 
 class Timer:
+    clock = None  # EventClock of a discrete-event simulation (see event_clock.py)
     created_time = None
     sim_one_hr_in_sec = 1200
     sim_start_time = None
@@ -72,6 +73,10 @@ class Timer:
         Calculate current time based on the amount of time has passed since this object is created
         :return:
         """
+        # A discrete-event simulation advances time from event to event.
+        if cls.clock is not None:
+            return cls.clock.now()
+
         cur_time = datetime.now()
         if cls.simulation:
             ratio = 3600 / cls.sim_one_hr_in_sec
@@ -81,6 +86,18 @@ class Timer:
 
         return cur_time
 
+    @classmethod
+    def get_schedule_time(cls):
+        """
+        The time that schedules are based upon: the simulated time of a discrete-event clock, otherwise the
+        wall-clock time, even in accelerated simulations
+        :return:
+        """
+        if cls.clock is not None:
+            return cls.clock.now()
+
+        return datetime.now()
+
 
 if __name__ == '__main__':
     from dateutil import parser
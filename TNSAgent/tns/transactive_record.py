@@ -60,10 +60,14 @@
 from datetime import datetime
 
 from time_interval import TimeInterval
-from helpers import format_ts
+from helpers import format_ts, records_by_interval
 
 
-class TransactiveRecord:
+class TransactiveRecord(object):
+    # Records are created for every time interval in every signal, so they
+    # have slots rather than dictionaries. See helpers.json_econder().
+    __slots__ = ('timeInterval', 'record', 'marginalPrice', 'power', 'cost', 'timeStamp')
+
     def __init__(self, ti, rn, mp, p, pu=0.0, cost=0.0, rp=0.0, rpu=0.0, v=0.0, vu=0.0):
         # NOTE: As of Feb 2018, ti is forced to be text, the time interval name,
         # not a TimeInterval object.
@@ -98,3 +102,93 @@ class TransactiveRecord:
 
         # Finally, create the timestamp that captures when the record is created.
         self.timeStamp = datetime.utcnow()
+
+
+# Transactive signals are sent as a versioned, columnar structure: the field
+# names are sent once, and each record is a row of field values. This
+# structure is published as is, so records are not serialized to JSON text
+# and parsed back before VIP serializes them again. Version 1 signals are the
+# legacy list of one dictionary per record.
+#
+# A signal may also be a delta: it then carries a sequence number, the names
+# of all the time intervals of the full signal, and the rows of only those
+# time intervals that changed since the previous signal. The receiver keeps
+# its previous records in the other time intervals (see merge_signal()).
+SIGNAL_VERSION = 2
+SIGNAL_FIELDS = ('timeInterval', 'record', 'marginalPrice', 'power', 'cost')
+
+
+def encode_signal(records, sequence=None, intervals=None):
+    # Encode transactive records as a versioned signal.
+    # INPUTS:
+    # records - list of TransactiveRecord objects
+    # sequence - sequence number of the signal, if it is sequenced
+    # intervals - names of all the time intervals of the full signal, if
+    #             records hold only the changed ones, i.e., the signal is a
+    #             delta. The signal is a full snapshot if this is None.
+    # OUTPUTS:
+    # signal - dictionary having a version, field names, and one row per record
+    signal = {'version': SIGNAL_VERSION,
+              'fields': list(SIGNAL_FIELDS),
+              'rows': [[x.timeInterval, x.record, x.marginalPrice, x.power, x.cost] for x in records]}
+
+    if sequence is not None:
+        signal['sequence'] = sequence
+        signal['full'] = intervals is None
+
+    if intervals is not None:
+        signal['intervals'] = list(intervals)
+
+    return signal
+
+
+def decode_signal(signal):
+    # Decode a received signal into transactive records.
+    # INPUTS:
+    # signal - versioned signal from encode_signal(), or a legacy (version 1)
+    #          list of record dictionaries
+    # OUTPUTS:
+    # records - list of TransactiveRecord objects. A delta signal decodes to
+    #           the records of its changed time intervals only.
+    if isinstance(signal, dict):
+        version = signal.get('version')
+        if version != SIGNAL_VERSION:
+            raise ValueError('Unsupported transactive signal version {}'.format(version))
+
+        # Rows are ordered like the sender's field names, which may differ
+        # from this receiver's.
+        fields = signal['fields']
+        rows = [dict(zip(fields, row)) for row in signal['rows']]
+    else:
+        rows = signal
+
+    return [TransactiveRecord(ti=row['timeInterval'],
+                              rn=int(row['record']),
+                              mp=float(row['marginalPrice']),
+                              p=float(row['power']),
+                              cost=float(row['cost']))
+            for row in rows]
+
+
+def is_delta_signal(signal):
+    # True if a received signal is a delta, rather than a full snapshot or a
+    # legacy list of records.
+    return isinstance(signal, dict) and signal.get('intervals') is not None
+
+
+def merge_signal(previous, changed, intervals):
+    # Rebuild a full signal from the previous full signal and a delta.
+    # INPUTS:
+    # previous - list of TransactiveRecord objects of the previous full signal
+    # changed - list of TransactiveRecord objects of the delta's changed time
+    #           intervals
+    # intervals - names of all the time intervals of the full signal
+    # OUTPUTS:
+    # records - list of TransactiveRecord objects, ordered by the time
+    #           intervals. Time intervals that are not named are dropped.
+    groups = records_by_interval(previous)
+
+    # The records of a changed time interval replace all its previous records.
+    groups.update(records_by_interval(changed))
+
+    return [x for name in intervals for x in groups.get(name, [])]
@@ -57,7 +57,11 @@
 # }}}
 
 
-class Vertex:
+class Vertex(object):
+    # Vertices are created in great numbers while markets balance, so they
+    # have slots rather than dictionaries.
+    __slots__ = ('cost', 'marginalPrice', 'power', 'powerUncertainty', 'continuity')
+
     def __init__(self, marginal_price, prod_cost, power, continuity=True, power_uncertainty=0.0):
         # Production cost. A dynamic representation of the delivered
         # cost. An ideal is that the cost of electricity using this price should be equivalent to
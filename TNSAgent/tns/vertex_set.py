@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2017, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+
+# }}}
+
+
+import numpy as np
+
+from vertex import Vertex
+from interval_value import IntervalValue
+
+
+class VertexSet(object):
+    """
+    A VertexSet holds many vertices (see class Vertex) in a numpy structured
+    array, one record per vertex, so that they may be created, merged, sorted,
+    and searched without Python loops. Each record also carries the key of its
+    time interval (see TimeInterval.key), which is 0 for vertices that are not
+    associated with a time interval.
+
+    A VertexSet may be iterated or indexed as Vertex objects, so that it can
+    be used where lists of vertices are still expected.
+    """
+
+    dtype = np.dtype([('timeInterval', np.int64),
+                      ('marginalPrice', float),  # [$/kWh]
+                      ('cost', float),  # [$]
+                      ('power', float),  # [avg.kW]
+                      ('powerUncertainty', float),  # [dimensionless]
+                      ('continuity', bool)])
+
+    def __init__(self, records=None):
+        if records is None:
+            records = np.zeros(0, dtype=VertexSet.dtype)
+        self.records = records
+
+    @classmethod
+    def from_arrays(cls, marginal_prices, costs, powers, power_uncertainties=0.0, continuity=True, keys=0):
+        # Create a VertexSet from arrays of vertex properties. Scalars are
+        # broadcast to the length of the marginal prices.
+        marginal_prices = np.asarray(marginal_prices, dtype=float)
+        records = np.zeros(marginal_prices.shape[0], dtype=cls.dtype)
+        records['timeInterval'] = keys
+        records['marginalPrice'] = marginal_prices
+        records['cost'] = costs
+        records['power'] = powers
+        records['powerUncertainty'] = power_uncertainties
+        records['continuity'] = continuity
+        return cls(records)
+
+    @classmethod
+    def from_vertices(cls, vertices, keys=0):
+        # Create a VertexSet from a list of Vertex objects.
+        vertices = list(vertices)
+        return cls.from_arrays([x.marginalPrice for x in vertices],
+                               [x.cost for x in vertices],
+                               [x.power for x in vertices],
+                               [x.powerUncertainty for x in vertices],
+                               [x.continuity for x in vertices],
+                               keys)
+
+    @classmethod
+    def from_interval_values(cls, interval_values):
+        # Create a VertexSet from IntervalValue objects whose values are
+        # vertices, e.g., a model's active vertices.
+        return cls.from_vertices([x.value for x in interval_values],
+                                 [x.timeInterval.key for x in interval_values])
+
+    @classmethod
+    def merge(cls, vertex_sets):
+        # Concatenate many VertexSets into one.
+        vertex_sets = list(vertex_sets)
+        if len(vertex_sets) == 0:
+            return cls()
+        return cls(np.concatenate([x.records for x in vertex_sets]))
+
+    def sorted(self):
+        # Order the vertices by time interval, then by increasing marginal
+        # price and power, as by helpers.order_vertices() in each interval.
+        # The sort is stable.
+        order = np.lexsort((self.records['power'], self.records['marginalPrice'], self.records['timeInterval']))
+        return VertexSet(self.records[order])
+
+    def for_interval(self, ti):
+        # Slice the vertices of a time interval (see class TimeInterval).
+        return VertexSet(self.records[self.records['timeInterval'] == ti.key])
+
+    def interval_keys(self):
+        # Find the distinct keys of the time intervals that have vertices.
+        return np.unique(self.records['timeInterval'])
+
+    @property
+    def marginalPrices(self):
+        return self.records['marginalPrice']  # [$/kWh]
+
+    @property
+    def costs(self):
+        return self.records['cost']  # [$]
+
+    @property
+    def powers(self):
+        return self.records['power']  # [avg.kW]
+
+    def __len__(self):
+        return self.records.shape[0]
+
+    def __getitem__(self, index):
+        # An integer index finds a Vertex object. Other indices (slices,
+        # masks, index arrays) find a VertexSet.
+        if isinstance(index, (int, np.integer)):
+            r = self.records[index]
+            return Vertex(float(r['marginalPrice']), float(r['cost']), float(r['power']),
+                          bool(r['continuity']), float(r['powerUncertainty']))
+        return VertexSet(self.records[index])
+
+    def __iter__(self):
+        # Iterate the vertices as Vertex objects.
+        for mp, cost, power, pu, continuity in zip(self.records['marginalPrice'].tolist(),
+                                                   self.records['cost'].tolist(),
+                                                   self.records['power'].tolist(),
+                                                   self.records['powerUncertainty'].tolist(),
+                                                   self.records['continuity'].tolist()):
+            yield Vertex(mp, cost, power, continuity, pu)
+
+    def to_vertices(self):
+        # List the vertices as Vertex objects.
+        return list(self)
+
+    def to_interval_values(self, calling_object, time_intervals, market, measurement_type):
+        # List the vertices as IntervalValue objects, e.g., as a model's active
+        # vertices. Vertices of time intervals not among time_intervals are
+        # omitted.
+        tis = dict([(x.key, x) for x in time_intervals])
+        return [IntervalValue(calling_object, tis[key], market, measurement_type, v)
+                for key, v in zip(self.records['timeInterval'].tolist(), self) if key in tis]